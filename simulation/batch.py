@@ -0,0 +1,370 @@
+"""
+Batch engine for the Green Grid Digital Twin.
+
+Computes the exogenous series of the whole horizon (sun angle, daily weather
+draws, cloud coverage, inverter failures, generation and load) as arrays and
+then runs only the battery/grid dispatch recurrence in a plain loop, without
+SimPy events or per-tick component calls. For the same seed it reproduces the
+metrics of system.Simulate.
+
+The exogenous series do not depend on the strategy, so one trace from
+build_exogenous can be replayed with SimulateTrace against every
+PRIORITY_OPTIONS strategy (common random numbers).
+"""
+
+import random
+from datetime import datetime, timedelta
+from time import perf_counter
+
+import numpy as np
+
+from config import PRIORITY_OPTIONS
+from settings import resolve
+from components.weather import Weather
+from telemetry import TRACER, INFO
+from recorder import to_minutes
+from load_profile import open_profile
+from weather_replay import derive_cloud, DAYLIGHT
+from solar import Sun
+from profiler import PROFILER
+from planner import DispatchPlanner, dispatch
+from reliability import OutageSchedule
+
+
+class BatchResult:
+    """End state of a batch run. Exposes the same counters as Inverter."""
+
+    def __init__(self, metrics, outages, is_failed, battery_level):
+        self.metrics = metrics
+        self.outages = outages
+        self.fail_count = outages["inverter"].count
+        self.total_downtime = outages["inverter"].downtime
+        self.is_failed = is_failed
+        self.battery_level = battery_level
+
+
+def solar_generation(sun, cloud, solar_peak, minutes_per_tick, irradiance=None):
+    """Panel output per tick (Wh), same formula as Panel.output."""
+    if irradiance is not None:
+        return np.maximum(0, solar_peak * irradiance / 1000) * minutes_per_tick / 60
+    return np.maximum(0, solar_peak * sun * (1 - cloud)) * minutes_per_tick / 60
+
+
+def build_exogenous(start_date, days, rng=random, cfg=None):
+    """
+    Pre-computes every series that does not depend on the dispatch.
+    Draws from `rng` in the same order as Simulate does (weather, then
+    component failures, once per day) so both engines see the same weather
+    and outages.
+    The trace keeps `cfg` so replays use the same tick size and sizing.
+    """
+    cfg = resolve(cfg)
+    tick = cfg.MINUTES_PER_TICK
+    h = tick / 60
+    until = days * 24
+    profile = PROFILER.enabled
+    if profile:
+        t = perf_counter()
+
+    # env.now is accumulated one timeout at a time, keep the same rounding.
+    steps = np.full(int(until / h) + 2, h)
+    steps[0] = 0.0
+    now = np.cumsum(steps)
+    now = now[now < until]
+    n = len(now)
+
+    minutes = np.arange(n, dtype=np.int64) * tick
+    day_starts = np.flatnonzero(minutes % (24 * 60) == 0)
+
+    start = datetime.strptime(start_date, "%d/%m/%Y")
+    weather = Weather(None, rng, cfg)
+    sun, horizontal = Sun(cfg).series(now, to_minutes(start))
+    if profile:
+        t = PROFILER.lap("exogenous.sun", t)
+    irradiance = None
+    if weather.replay is not None:
+        cloud, irradiance = weather.replay.window(to_minutes(start), n, tick)
+        if cloud is None:
+            # Derived in daylight, held through the night (as Weather.observe).
+            day = horizontal > DAYLIGHT
+            derived = np.zeros(n)
+            derived[day] = derive_cloud(irradiance[day], horizontal[day])
+            last = np.maximum.accumulate(np.where(day, np.arange(n), -1))
+            cloud = np.where(last >= 0, derived[last], float(weather.cloud_coverage))
+        if profile:
+            t = PROFILER.lap("exogenous.replay", t)
+    clouds = np.zeros(len(day_starts))
+    weather_types = []
+    month_days = np.zeros(len(day_starts), dtype=np.int64)
+    outages = OutageSchedule(n, h, cfg)
+    for i, s in enumerate(day_starts.tolist()):
+        dt = start + timedelta(minutes=s * tick)
+        weather.update(dt)
+        clouds[i] = cloud[s] if weather.replay is not None else weather.cloud_coverage
+        weather_types.append(weather.weather)
+        month_days[i] = dt.day
+        if TRACER.info:
+            TRACER.emit(INFO, float(now[s]), "weather", "update", weather=weather.weather, cloud=float(clouds[i]))
+
+        outages.day(s, rng, float(now[s]))
+
+    if profile:
+        t = PROFILER.lap("exogenous.days", t)
+
+    if weather.replay is None:
+        day_index = np.searchsorted(day_starts, np.arange(n), side="right") - 1
+        cloud = clouds[day_index]
+    generation = solar_generation(sun, cloud, cfg.SOLAR_PEAK, tick, irradiance)
+    if profile:
+        t = PROFILER.lap("exogenous.generation", t)
+    if cfg.LOAD_PROFILE:
+        load_profile = open_profile(cfg.LOAD_PROFILE, cfg.LOAD_PROFILE_CACHE_DIR, cfg.MINUTES_PER_TICK)
+        load = load_profile.window(to_minutes(start), n, tick)
+    else:
+        load = np.full(n, cfg.BASE_LOAD)
+    if profile:
+        PROFILER.lap("exogenous.load", t)
+
+    return {
+        "config": cfg,
+        "start": start,
+        "now": now,
+        "weather": weather_types,
+        "cloud": cloud,
+        "sun": sun,
+        "irradiance": irradiance,
+        "generation": generation,
+        "load": load,
+        "failed": outages.mask("inverter"),
+        "failed_after": outages.mask("inverter", repaired=True),
+        "battery_fault": outages.mask("battery"),
+        "grid_outage": outages.mask("grid"),
+        "outages": outages.outages,
+        "spans": outages.spans,
+        "day_starts": day_starts,
+        "month_days": month_days,
+    }
+
+
+def SimulateBatch(priority, start_date, days, bitacora=None, stats=None,
+                  capacity=None, initial_charge=0, rng=random, cfg=None):
+    """
+    Runs a full horizon with the batch engine. Fills `bitacora` and `stats`
+    like Simulate when they are given and returns a BatchResult.
+    """
+    trace = build_exogenous(start_date, days, rng, cfg)
+    return SimulateTrace(trace, priority, bitacora, stats, capacity, initial_charge)
+
+
+def SimulateTrace(exo, priority, bitacora=None, stats=None, capacity=None, initial_charge=0,
+                  solar_peak=None, clipping=None, cfg=None):
+    """
+    Runs the dispatch recurrence of one strategy over a pre-built exogenous
+    trace. Dispatch settings come from `cfg` (the trace's own by default);
+    `capacity`, `solar_peak` and `clipping` resize the installation without
+    rebuilding the trace.
+    """
+    cfg = cfg if cfg is not None else exo["config"]
+    profile = PROFILER.enabled
+    if profile:
+        t = perf_counter()
+    tick = exo["config"].MINUTES_PER_TICK
+    h = tick / 60
+    rte = cfg.ROUND_TRIP_EFFICIENCY
+    capacity = capacity if capacity is not None else cfg.BATTERY_CAPACITY
+    solar_peak = solar_peak if solar_peak is not None else cfg.SOLAR_PEAK
+    clipping = clipping if clipping is not None else cfg.INVERTER_CLIPPING
+
+    if solar_peak == exo["config"].SOLAR_PEAK:
+        gen_array = exo["generation"]
+    else:
+        gen_array = solar_generation(exo["sun"], exo["cloud"], solar_peak, tick, exo["irradiance"])
+    generation = gen_array.tolist()
+    load_series = exo["load"].tolist()
+    failed = exo["failed"].tolist()
+    failed_after = exo["failed_after"].tolist()
+    battery_fault = exo["battery_fault"].tolist()
+    grid_outage = exo["grid_outage"].tolist()
+    degraded = (exo["battery_fault"] | exo["grid_outage"]).tolist()
+    if profile:
+        t = PROFILER.lap("dispatch.prepare", t)
+    resets = {s for s, d in zip(exo["day_starts"].tolist(), exo["month_days"].tolist()) if d == 1}
+    planner = None
+    if priority == PRIORITY_OPTIONS.OPTIMAL:
+        planner = DispatchPlanner(capacity, solar_peak, clipping, cfg=cfg, forecast_cfg=exo["config"])
+        cloud_series = exo["cloud"].tolist()
+
+    level = initial_charge
+    export_level = 0
+    export_cap = cfg.GRID_CONSTRAINT
+
+    solar_gen = load_served = grid_export = grid_import = losses = 0.0
+    unmet_load_events = 0
+    full_hours = empty_hours = 0
+    unmet_events = 0
+    soc_history = []
+    grid_history = []
+    unmet_history = []
+
+    for k in range(len(generation)):
+        if k in resets and export_level > 0:
+            export_level -= export_level
+
+        generation_k = generation[k]
+        load = load_series[k]
+        shed = 0.0
+
+        if failed[k]:
+            unmet_load_events += 1
+            if grid_outage[k]:
+                shed = load
+                grid_flow = 0.0
+            else:
+                grid_import += load
+                grid_flow = -load
+        else:
+            fault = island = False
+            if degraded[k]:
+                fault, island = battery_fault[k], grid_outage[k]
+                if fault:
+                    # The dispatch sees an empty battery of size zero; the level is held.
+                    held, level, full = level, 0.0, capacity
+                    capacity = 0
+                if island:
+                    # No export allowance while islanded; the counter is left as it was.
+                    counted, export_level = export_level, export_cap
+            real_gen = min(generation_k, clipping)
+            solar_gen += real_gen
+            home_served = 0.0
+            grid_flow = 0.0
+            loss = 0.0
+
+            strategy = priority
+            if planner is not None and (fault or not planner.needed(k, export_cap - export_level)[0]):
+                strategy = PRIORITY_OPTIONS.LOAD
+
+            if strategy == PRIORITY_OPTIONS.OPTIMAL:
+                change = float(planner.step(k, [level], [export_cap - export_level], np.array([real_gen]),
+                                            np.array([load]), cloud_series[k])[0])
+                level += change
+                grid_flow, loss = dispatch(change, real_gen, load, export_cap - export_level, rte)
+                if grid_flow > 0:
+                    export_level += grid_flow
+                home_served = load
+
+            elif strategy == PRIORITY_OPTIONS.LOAD:
+                solar_to_home = min(load, real_gen)
+                home_served = solar_to_home
+                rem_gen = real_gen - solar_to_home
+                rem_load = load - solar_to_home
+
+                if rem_load > 0.001:
+                    sacar_de_batt = min(rem_load / rte, level)
+                    if sacar_de_batt > 0.001:
+                        level -= sacar_de_batt
+                        energia_util = sacar_de_batt * rte
+                        home_served += energia_util
+                        rem_load -= energia_util
+
+                if rem_load > 0.001:
+                    grid_flow -= rem_load
+                    home_served += rem_load
+
+                if rem_gen > 0.001:
+                    guardar_real = min(capacity - level, rem_gen * rte)
+                    if guardar_real > 0.001:
+                        level += guardar_real
+                        rem_gen -= guardar_real / rte
+
+                    if rem_gen > 0.001:
+                        export = min(export_cap - export_level, rem_gen)
+                        if export > 0:
+                            export_level += export
+                        grid_flow += export
+                        loss = rem_gen - export
+
+            elif strategy == PRIORITY_OPTIONS.CHARGE:
+                guardar_real = min(capacity - level, real_gen * rte)
+                if guardar_real > 0.001:
+                    level += guardar_real
+                    real_gen -= guardar_real / rte
+
+                solar_to_home = min(load, real_gen)
+                home_served = solar_to_home
+                rem_load = load - solar_to_home
+                if rem_load > 0.001:
+                    grid_flow -= rem_load
+                    home_served += rem_load
+
+            elif strategy == PRIORITY_OPTIONS.PRODUCE:
+                solar_to_grid = min(export_cap - export_level, real_gen)
+                grid_flow += solar_to_grid
+                rem_gen = real_gen - solar_to_grid
+
+                if rem_gen > 0.001:
+                    guardar_real = min(capacity - level, rem_gen * rte)
+                    if guardar_real > 0.001:
+                        level += guardar_real
+
+                solar_to_home = min(load, rem_gen)
+                rem_load = load
+                if solar_to_home > 0.001:
+                    home_served = solar_to_home
+                    rem_load = load - solar_to_home
+                grid_flow -= rem_load
+                home_served += rem_load
+
+            if fault:
+                level, capacity = held, full
+            if island:
+                export_level = counted
+                if grid_flow < 0:
+                    shed = -grid_flow
+                    home_served -= shed
+                    grid_flow = 0.0
+                    unmet_load_events += 1
+
+            load_served += home_served
+            if grid_flow > 0: grid_export += grid_flow
+            else: grid_import += abs(grid_flow)
+            losses += loss
+
+        soc = (level / capacity) * 100 if capacity > 0 else 0
+        soc_history.append(soc)
+        grid_history.append(grid_flow)
+        if soc >= 99.9: full_hours += h
+        if soc <= 0.1: empty_hours += h
+        unmet = load - (generation_k + level) if failed_after[k] else 0.0
+        if shed > unmet:
+            unmet = shed
+        if unmet > 0:
+            unmet_events += 1
+        else:
+            unmet = 0.0
+        unmet_history.append(unmet)
+
+    if profile:
+        t = PROFILER.lap("dispatch", t)
+
+    if stats is not None:
+        stats.extend(soc_history, exo["cloud"], exo["load"], grid_history, unmet_history)
+        stats.full_hours += full_hours
+        stats.empty_hours += empty_hours
+        stats.unmet_events += unmet_events
+    if profile:
+        t = PROFILER.lap("stats", t)
+
+    if bitacora is not None:
+        minutes = to_minutes(exo["start"]) + np.arange(len(generation), dtype=np.int64) * tick
+        bitacora.extend(minutes, gen_array, exo["load"], soc_history, grid_history,
+                        exo["cloud"], ~exo["failed_after"])
+        if profile:
+            PROFILER.lap("log.extend", t)
+
+    metrics = {
+        "total_solar_gen": solar_gen, "total_load_served": load_served,
+        "total_grid_export": grid_export, "total_grid_import": grid_import,
+        "total_losses": losses, "unmet_load_events": unmet_load_events
+    }
+    n = len(generation)
+    return BatchResult(metrics, exo["outages"], bool(n and failed_after[-1]), level)
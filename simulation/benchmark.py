@@ -0,0 +1,184 @@
+"""
+Benchmark suite for the Green Grid Digital Twin.
+
+Measures throughput (ticks per second, best of --repeat runs) and peak
+Python memory (tracemalloc, in a separate run so it does not slow the timed
+ones) of:
+
+- system.Simulate for every PRIORITY_OPTIONS strategy, over a matrix of
+  MINUTES_PER_TICK and SIMULATION_DAYS, with and without the CSV log
+- end-to-end sym_results.build_results with each engine
+
+Results are written as JSON. Saved as a baseline, a later run can be compared
+against it: a case is a regression when its throughput drops, or its peak
+memory grows, by more than the given fraction. The exit status is 1 when any
+case regresses, so the suite can gate a nightly job:
+
+    python benchmark.py --save benchmarks/baseline.json
+    python benchmark.py --baseline benchmarks/baseline.json --time-threshold 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import simpy
+
+SIM_DIR = Path(__file__).resolve().parent
+if str(SIM_DIR) not in sys.path:
+    sys.path.insert(0, str(SIM_DIR))
+
+import config
+from checkpoint import SimulationRun
+from recorder import Recorder
+from settings import SimulationConfig
+from sym_results import build_results, report_scenarios
+from telemetry import TRACER
+
+MATRICES = {
+    # (minutes per tick, days) pairs; every strategy runs with and without log.
+    "quick": [(60, 30), (15, 30)],
+    "full": [(60, 30), (60, 365), (15, 30), (15, 365), (1, 30)],
+}
+
+
+def simulate_case(priority, minutes_per_tick, days, log):
+    cfg = SimulationConfig(MINUTES_PER_TICK=minutes_per_tick, SIMULATION_DAYS=days)
+
+    def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            bitacora = Recorder(os.path.join(tmp, "log.csv"), cfg.LOG_CHUNK_ROWS) if log else None
+            sim = SimulationRun(priority, cfg, random.Random(42), days, bitacora).run()
+            if bitacora is not None:
+                bitacora.close()
+        return sim.stats.ticks
+
+    return run
+
+
+def build_results_case(engine, days):
+    # Without the results cache every repeat would be a lookup.
+    cfg = SimulationConfig(SIMULATION_DAYS=days, RESULTS_CACHE_DIR="")
+
+    def run():
+        build_results(seed=42, engine=engine, cfg=cfg)
+        # Distinct runs: the default run is the CHARGE_PRIORITY comparison run, simulated once.
+        runs = len(set(report_scenarios(cfg).values()))
+        return runs * days * 24 * 60 // cfg.MINUTES_PER_TICK
+
+    return run
+
+
+def cases(matrix):
+    for minutes_per_tick, days in MATRICES[matrix]:
+        for priority in config.PRIORITY_OPTIONS:
+            for log in (False, True):
+                name = f"simulate/{priority.name}/{minutes_per_tick}min/{days}d/{'log' if log else 'nolog'}"
+                yield name, simulate_case(priority, minutes_per_tick, days, log)
+    for engine in config.ENGINE_OPTIONS:
+        yield f"build_results/{engine.name}/30d", build_results_case(engine, 30)
+
+
+def measure(run, repeat, memory=True):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ticks = run()
+        best = min(best, time.perf_counter() - start)
+    result = {"ticks": ticks, "seconds": best, "ticks_per_s": ticks / best if best > 0 else 0.0}
+    if memory:
+        tracemalloc.start()
+        run()
+        result["peak_mib"] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result
+
+
+def run_suite(matrix="quick", repeat=3, memory=True, only=""):
+    TRACER.configure()
+    results = {}
+    for name, run in cases(matrix):
+        if only and only not in name:
+            continue
+        results[name] = measure(run, repeat, memory)
+        print(f"{name:<45} {results[name]['ticks_per_s']:>12,.0f} ticks/s"
+              + (f" {results[name]['peak_mib']:>9.2f} MiB" if memory else ""), file=sys.stderr)
+    return {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "numpy": np.__version__,
+            "simpy": simpy.__version__,
+            "matrix": matrix,
+            "repeat": repeat,
+        },
+        "cases": results,
+    }
+
+
+def compare(current, baseline, time_threshold=0.2, memory_threshold=0.2):
+    """
+    Per-case ratios against a baseline. A case regresses when its throughput
+    is below (1 - time_threshold) of the baseline or its peak memory above
+    (1 + memory_threshold) of it.
+    """
+    report = {}
+    for name, now in current["cases"].items():
+        base = baseline["cases"].get(name)
+        if base is None:
+            continue
+        entry = {"speed_ratio": now["ticks_per_s"] / base["ticks_per_s"] if base["ticks_per_s"] else None}
+        regressed = entry["speed_ratio"] is not None and entry["speed_ratio"] < 1 - time_threshold
+        if "peak_mib" in now and "peak_mib" in base and base["peak_mib"]:
+            entry["memory_ratio"] = now["peak_mib"] / base["peak_mib"]
+            regressed = regressed or entry["memory_ratio"] > 1 + memory_threshold
+        entry["regressed"] = regressed
+        report[name] = entry
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark simulation throughput and memory.')
+    parser.add_argument('--matrix', choices=list(MATRICES), default='quick', help='Tick/horizon matrix to run (default: quick)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per case, the best one is kept (default: 3)')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc peak-memory run')
+    parser.add_argument('--only', type=str, default='', help='Only run cases whose name contains this text')
+    parser.add_argument('--save', type=str, default='', help='Write the results as a baseline JSON file')
+    parser.add_argument('--baseline', type=str, default='', help='Compare against a baseline JSON file')
+    parser.add_argument('--time-threshold', type=float, default=0.2, help='Allowed throughput drop as a fraction (default: 0.2)')
+    parser.add_argument('--memory-threshold', type=float, default=0.2, help='Allowed peak-memory growth as a fraction (default: 0.2)')
+    args = parser.parse_args()
+
+    results = run_suite(args.matrix, args.repeat, not args.no_memory, args.only)
+    if args.save:
+        path = Path(args.save).expanduser().resolve()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(results, indent=2) + '\n', encoding='utf-8')
+        print(f'Baseline written to {path}', file=sys.stderr)
+
+    if not args.baseline:
+        print(json.dumps(results, indent=2))
+        return
+
+    baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+    report = compare(results, baseline, args.time_threshold, args.memory_threshold)
+    print(json.dumps({"results": results, "comparison": report}, indent=2))
+    regressions = [name for name, entry in report.items() if entry["regressed"]]
+    for name in regressions:
+        print(f"REGRESSION {name}: {report[name]}", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""
+Checkpoint, restore and fork for SimPy runs of the Green Grid Digital Twin.
+
+SimulationRun owns one SimPy environment and its components and can be
+advanced day by day. checkpoint() captures everything the rest of the run
+depends on: battery level, component outage states and counters, the export
+container, the weather of the day, the RNG state, the date of the next tick,
+the accumulated stats and the configuration. save()/load() keep it in a
+compressed .npz file, and restore()/fork() start new runs from it, optionally
+with another strategy or settings, without re-simulating the shared prefix:
+
+    base = SimulationRun(PRIORITY_OPTIONS.LOAD, rng=random.Random(1), days=365).run(180)
+    base.save("day180.npz")
+    charge = base.fork(PRIORITY_OPTIONS.CHARGE).run()
+
+The per-tick log is not part of a checkpoint; each branch writes its own.
+"""
+
+import argparse
+import json
+import random
+import sys
+from datetime import datetime
+from enum import Enum
+from pathlib import Path
+
+import numpy as np
+from simpy import Environment
+
+SIM_DIR = Path(__file__).resolve().parent
+if str(SIM_DIR) not in sys.path:
+    sys.path.insert(0, str(SIM_DIR))
+
+import config
+from components.battery import Battery
+from components.grid import Grid
+from components.home import Home
+from components.inverter import Inverter
+from components.panel import Panel
+from components.weather import Weather
+from online_stats import RunStats
+from settings import SimulationConfig, resolve
+from sym_results import scenario_metrics
+from system import Clock, Simulate
+
+INVERTER_STATE = ("is_failed", "downtime_remaining", "fail_count", "total_downtime", "last_grid_flow")
+
+
+def _encode(value):
+    if isinstance(value, Enum):
+        return {"enum": type(value).__name__, "name": value.name}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict) and set(value) == {"enum", "name"}:
+        return getattr(config, value["enum"])[value["name"]]
+    return value
+
+
+class SimulationRun:
+    def __init__(self, priority=None, cfg=None, rng=None, days=None, bitacora=None, state=None):
+        self.cfg = resolve(cfg)
+        self.priority = priority or self.cfg.CHARGE_PRIORITY
+        self.rng = rng if rng is not None else random.Random()
+        self.days = days or self.cfg.SIMULATION_DAYS
+        self.bitacora = bitacora
+        self.stats = RunStats(self.cfg)
+
+        if state is None:
+            self.clock = Clock(datetime.strptime(self.cfg.DATE_OF_SIMULATION, "%d/%m/%Y"), 0.0)
+        else:
+            self.clock = Clock(datetime.fromisoformat(state["clock"]["dt"]), state["clock"]["now"])
+        self.env = env = Environment(initial_time=self.clock.now)
+
+        level = 0
+        if state is not None:
+            level = min(state["battery_level"], self.cfg.BATTERY_CAPACITY)
+        self.battery = Battery(env, initial_charge=level, cfg=self.cfg)
+        self.weather = Weather(env, self.rng, self.cfg)
+        self.panel = Panel(env, self.battery, self.weather, self.cfg)
+        self.home = Home(env, self.cfg)
+        self.grid = Grid(env, self.cfg)
+        self.inverter = Inverter(env, self.panel, self.battery, self.home, self.grid, self.priority, self.rng, self.cfg)
+        if state is not None:
+            self._apply(state)
+
+        env.process(Simulate(env, self.weather, self.panel, self.home, self.inverter, self.battery, self.grid,
+                             self.bitacora, self.stats, self.cfg, self.days * 24, self.clock))
+
+    def _apply(self, state):
+        self.rng.setstate((state["rng"][0], tuple(state["rng"][1]), state["rng"][2]))
+        self.weather.weather = state["weather"]["weather"]
+        self.weather.cloud_coverage = state["weather"]["cloud_coverage"]
+        export = min(state["grid_export_level"], self.grid.exportLimit.capacity)
+        if export > 0:
+            self.grid.exportLimit.put(export)
+        for name in INVERTER_STATE:
+            setattr(self.inverter, name, state["inverter"][name])
+        for name, outage in state.get("outages", {}).items():
+            self.inverter.outages[name].load(outage)
+        self.inverter.metrics = dict(state["inverter"]["metrics"])
+        self.stats = RunStats.from_state(state["stats"], self.cfg)
+
+    @property
+    def day(self):
+        """Simulated days completed so far."""
+        return self.env.now / 24
+
+    @property
+    def finished(self):
+        return self.clock.now >= self.days * 24
+
+    def run(self, day=None):
+        """Advances to the start of `day` (the end of the horizon by default)."""
+        until = self.days * 24 if day is None else min(day, self.days) * 24
+        if until > self.env.now:
+            self.clock.stop = until
+            self.env.run(until=until)
+        return self
+
+    def metrics(self):
+        return scenario_metrics(self.inverter, self.stats, self.cfg)
+
+    def checkpoint(self):
+        """Full state of the run as plain Python values."""
+        rng = self.rng.getstate()
+        return {
+            "config": {name: _encode(value) for name, value in self.cfg.to_dict().items()},
+            "priority": self.priority.name,
+            "days": self.days,
+            "clock": {"dt": self.clock.dt.isoformat(), "now": self.clock.now},
+            "rng": [rng[0], list(rng[1]), rng[2]],
+            "battery_level": self.battery.level,
+            "grid_export_level": self.grid.exportLimit.level,
+            "weather": {"weather": self.weather.weather, "cloud_coverage": self.weather.cloud_coverage},
+            "inverter": {**{name: getattr(self.inverter, name) for name in INVERTER_STATE},
+                         "metrics": dict(self.inverter.metrics)},
+            "outages": {name: outage.state() for name, outage in self.inverter.outages.items() if name != "inverter"},
+            "stats": self.stats.state(),
+        }
+
+    def save(self, path):
+        """Writes the checkpoint to a compressed .npz file."""
+        np.savez_compressed(path, state=np.array(json.dumps(self.checkpoint())))
+
+    @staticmethod
+    def load(path):
+        """Reads a checkpoint written by save()."""
+        with np.load(path, allow_pickle=False) as data:
+            return json.loads(str(data["state"]))
+
+    @classmethod
+    def restore(cls, state, priority=None, bitacora=None, days=None, **changes):
+        """
+        New run continuing from `state`. `priority`, `days` and setting
+        overrides (e.g. BATTERY_CAPACITY=20000) apply from this point on.
+        """
+        cfg = SimulationConfig(**{name: _decode(value) for name, value in state["config"].items()}).replace(**changes)
+        priority = priority or config.PRIORITY_OPTIONS[state["priority"]]
+        return cls(priority, cfg, random.Random(), days or state["days"], bitacora, state)
+
+    def fork(self, priority=None, bitacora=None, days=None, **changes):
+        """What-if branch from the current point; this run is left untouched."""
+        return SimulationRun.restore(self.checkpoint(), priority, bitacora, days, **changes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a shared prefix once, then fork every strategy from it.')
+    parser.add_argument('--days', type=int, default=config.SIMULATION_DAYS, help='Days to simulate (default: config.SIMULATION_DAYS)')
+    parser.add_argument('--fork-day', type=int, default=None, help='Day the branches start from (default: half of --days)')
+    parser.add_argument('--strategy', choices=[p.name for p in config.PRIORITY_OPTIONS], default=config.CHARGE_PRIORITY.name, help='Strategy of the shared prefix (default: config.CHARGE_PRIORITY)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    parser.add_argument('--checkpoint', type=str, default='', help='Also save the fork-day checkpoint to this .npz file')
+    parser.add_argument('--resume', type=str, default='', help='Fork from a saved checkpoint instead of simulating the prefix')
+    args = parser.parse_args()
+
+    if args.resume:
+        state = SimulationRun.load(args.resume)
+    else:
+        fork_day = args.fork_day if args.fork_day is not None else args.days // 2
+        base = SimulationRun(config.PRIORITY_OPTIONS[args.strategy], rng=random.Random(args.seed), days=args.days)
+        base.run(fork_day)
+        if args.checkpoint:
+            base.save(args.checkpoint)
+        state = base.checkpoint()
+
+    branches = {p.name: SimulationRun.restore(state, p, days=args.days).run().metrics()
+                for p in config.PRIORITY_OPTIONS}
+    print(json.dumps({"fork_day": state["clock"]["now"] / 24, "days": args.days, "branches": branches}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,88 +1,104 @@
-import simpy
+import argparse
+
+import numpy as np
+
 from config import *
+from sym_results import member_seeds, build_trace, run_scenario as simulate
 
-from components.battery import Battery
-from components.panel import Panel
-from components.weather import Weather
-from components.inverter import Inverter
-from components.grid import Grid
-from components.home import Home
-from system import Simulate 
+STRATEGIES = [
+    ("LOAD PRIORITY", PRIORITY_OPTIONS.LOAD),
+    ("CHARGE PRIORITY", PRIORITY_OPTIONS.CHARGE),
+    ("PRODUCE PRIORITY", PRIORITY_OPTIONS.PRODUCE),
+    ("OPTIMAL PRIORITY", PRIORITY_OPTIONS.OPTIMAL),
+]
 
-def run_scenario(strategy_name, priority_enum):
+def run_scenario(strategy_name, priority_enum, trace):
     """
-    Runs a complete simulation for a specific energy management strategy.
+    Runs a complete simulation for a specific energy management strategy
+    over a shared exogenous trace, so every strategy sees the same weather
+    and inverter failures. Runs already in the results cache are not
+    simulated again.
     Returns a dictionary with key performance metrics.
     """
-    print(f"Running simulation for: {strategy_name}...")
-    
-    env = simpy.Environment()
-   
-    battery = Battery(env, initial_charge=0, capacity=BATTERY_CAPACITY)
-    weather = Weather(env)
-    panel = Panel(env, battery, weather)
-    home = Home(env)
-    grid = Grid()
-    
-    inverter = Inverter(env, panel, battery, home, grid, priority_enum)
-    
-    dummy_log = [] 
-    stats = {
-        "soc_history": [], "cloud_history": [], "load_history": [],
-        "full_hours": 0, "empty_hours": 0, "unmet_events": 0
-    }
-    
-    env.process(Simulate(env, weather, panel, home, inverter, battery, grid, dummy_log, stats))
-    env.run(until=SIMULATION_DAYS * 24)
-    
-    total_import_kwh = inverter.metrics['total_grid_import'] / 1000
-    total_export_kwh = inverter.metrics['total_grid_export'] / 1000
-    
-    cost = total_import_kwh * IMPORT_COST
-    revenue = total_export_kwh * EXPORT_COST
-    net_balance = revenue - cost
-    
+    result = simulate(priority_enum, trace['config'].DATE_OF_SIMULATION, log=False, trace=trace)
+
     return {
         "Strategy": strategy_name,
-        "Net_Balance": net_balance,
-        "Import_kWh": total_import_kwh,
-        "Export_kWh": total_export_kwh,
-        "Unmet_Events": stats['unmet_events'],
-        "Inverter_Failures": inverter.fail_count
+        "Net_Balance": result['net_balance'],
+        "Import_kWh": result['grid_import_kwh'],
+        "Export_kWh": result['grid_export_kwh'],
+        "Unmet_Events": result['unmet_events'],
+        "Inverter_Failures": result['inverter_failures']
     }
 
+def compare_members(seed, members):
+    """
+    Replays `members` independent traces against every strategy. Because the
+    strategies share each trace, the balance differences between them are
+    paired and the ranking settles with far fewer runs.
+    """
+    balances = np.zeros((members, len(STRATEGIES)))
+    for m, member_seed in enumerate(member_seeds(seed, members)):
+        trace = build_trace(DATE_OF_SIMULATION, member_seed)
+        for j, (name, priority) in enumerate(STRATEGIES):
+            balances[m, j] = run_scenario(name, priority, trace)["Net_Balance"]
+    return balances
+
 def main():
+    parser = argparse.ArgumentParser(description='Compare energy management strategies on shared weather.')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for the shared weather trace (default: 42)')
+    parser.add_argument('--members', type=int, default=1, help='Independent traces to compare over (default: 1)')
+    args = parser.parse_args()
+
     print("\n" + "="*80)
     print("   GREEN GRID - STRATEGY COST-EFFECTIVENESS ANALYSIS (SG1_TEAM5)")
     print("="*80 + "\n")
-    
+
+    if args.members > 1:
+        balances = compare_members(args.seed, args.members)
+        wins = np.bincount(balances.argmax(axis=1), minlength=len(STRATEGIES))
+
+        print("-"*80)
+        print(f"{'STRATEGY':<20} | {'MEAN BALANCE':<14} | {'STD':<10} | {'MEAN DIFF VS BEST':<18} | {'WINS'}")
+        print("-"*80)
+        best = int(balances.mean(axis=0).argmax())
+        for j, (name, _) in enumerate(STRATEGIES):
+            diff = balances[:, j] - balances[:, best]
+            print(f"{name:<20} | {balances[:, j].mean():<14.2f} | {balances[:, j].std(ddof=1):<10.2f} | "
+                  f"{diff.mean():<8.2f} ± {diff.std(ddof=1) / np.sqrt(args.members):<7.2f} | {wins[j]}/{args.members}")
+        print("-"*80)
+        print(f"\n>>> CONCLUSION: The most cost-effective strategy is {STRATEGIES[best][0]}")
+        print(f"    with a mean Net Balance of {balances[:, best].mean():.2f} cents over {args.members} traces.")
+        print("="*80)
+        return
+
+    # Weather and failures are generated once and replayed for every strategy.
+    trace = build_trace(DATE_OF_SIMULATION, args.seed)
+
     results = []
-    
-    results.append(run_scenario("LOAD PRIORITY", PRIORITY_OPTIONS.LOAD))
-    
-    results.append(run_scenario("CHARGE PRIORITY", PRIORITY_OPTIONS.CHARGE))
-    
-    results.append(run_scenario("PRODUCE PRIORITY", PRIORITY_OPTIONS.PRODUCE))
-    
+    for name, priority in STRATEGIES:
+        print(f"Running simulation for: {name}...")
+        results.append(run_scenario(name, priority, trace))
+
     print("\n" + "-"*100)
     print(f"{'STRATEGY':<20} | {'BALANCE (cents)':<18} | {'IMPORT (kWh)':<15} | {'EXPORT (kWh)':<15} | {'UNMET LOAD'}")
     print("-"*100)
-    
+
     best_strategy = ""
     best_balance = -float('inf')
-    
+
     for r in results:
         balance_str = f"{r['Net_Balance']:.2f}"
         print(f"{r['Strategy']:<20} | {balance_str:<18} | {r['Import_kWh']:<15.2f} | {r['Export_kWh']:<15.2f} | {r['Unmet_Events']}")
-        
+
         if r['Net_Balance'] > best_balance:
             best_balance = r['Net_Balance']
             best_strategy = r['Strategy']
-            
+
     print("-"*100)
     print(f"\n>>> CONCLUSION: The most cost-effective strategy is {best_strategy}")
     print(f"    with a Net Balance of {best_balance:.2f} cents.")
     print("="*100)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
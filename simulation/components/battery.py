@@ -1,23 +1,36 @@
-from simpy import Environment, Container
-from config import BATTERY_CAPACITY, BATTERY_FLOOR, MINUTES_PER_TICK
+from simpy import Environment
+from components.store import make_container
+from settings import resolve
+from reliability import Outage
+from telemetry import TRACER, DEBUG
 
 class Battery:
-    def __init__(self, env, initial_charge, capacity=BATTERY_CAPACITY):
+    def __init__(self, env, initial_charge, capacity=None, cfg=None):
         self.env: Environment = env
-        self.capacity = capacity
-        self.storage = Container(env, self.capacity, initial_charge)
+        self.cfg = resolve(cfg)
+        self.capacity = capacity if capacity is not None else self.cfg.BATTERY_CAPACITY
+        self.storage = make_container(env, self.capacity, initial_charge, self.cfg.STORAGE_BACKEND)
+        self.outage = Outage("battery", self.cfg)
     
     def update(self):
-        print(f"Battery update: {self.batteryPercentage:.2f}% | {self.storage.level:.2f} Wh")
+        if TRACER.debug:
+            TRACER.emit(DEBUG, self.env.now, "battery", "update", soc=self.batteryPercentage, level_wh=self.storage.level)
 
     @property
     def level(self):
         return self.storage.level
 
+    @property
+    def available(self):
+        """Energy the dispatch can draw (none while the battery is faulted)."""
+        return 0 if self.outage.is_down else self.storage.level
+
     @property
     def batteryPercentage(self):
         return (self.storage.level / self.capacity) * 100 if self.capacity > 0 else 0
     
     @property
     def remainingCharge(self):
+        if self.outage.is_down:
+            return 0
         return self.capacity - self.storage.level
\ No newline at end of file
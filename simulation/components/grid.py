@@ -1,9 +1,12 @@
-from config import GRID_CONSTRAINT
-from simpy import Container
+from settings import resolve
+from components.store import make_container
+from reliability import Outage
 
 class Grid:
-    def __init__(self, env):
-        self.exportLimit = Container(env, GRID_CONSTRAINT)
+    def __init__(self, env, cfg=None):
+        self.cfg = resolve(cfg)
+        self.exportLimit = make_container(env, self.cfg.GRID_CONSTRAINT, backend=self.cfg.STORAGE_BACKEND)
+        self.outage = Outage("grid", self.cfg)
 
     def update(self, day):
         if day == 1:
@@ -12,4 +15,6 @@ class Grid:
 
     @property
     def remainingExport(self):
+        if self.outage.is_down:
+            return 0
         return self.exportLimit.capacity - self.exportLimit.level
\ No newline at end of file
@@ -1,15 +1,38 @@
-from config import BASE_LOAD, MINUTES_PER_TICK
+from datetime import datetime
+from settings import resolve
+from telemetry import TRACER, DEBUG
+from load_profile import open_profile
+from recorder import to_minutes
+
+CHUNK_TICKS = 4096
 
 class Home:
-    def __init__(self, env) -> None:
+    def __init__(self, env, cfg=None) -> None:
         self.env = env
-        self.baseLoad = BASE_LOAD
+        self.cfg = resolve(cfg)
+        self.baseLoad = self.cfg.BASE_LOAD
 
         self.totalLoad = 0
 
-    def update(self):
-        self.totalLoad = self.baseLoad # + some random calculation
-        print(f"House update: load is now {self.totalLoad}")
+        # Recorded load profile, resampled to the tick a chunk at a time.
+        self.profile = open_profile(self.cfg.LOAD_PROFILE, self.cfg.LOAD_PROFILE_CACHE_DIR, self.cfg.MINUTES_PER_TICK) if self.cfg.LOAD_PROFILE else None
+        self.start = to_minutes(datetime.strptime(self.cfg.DATE_OF_SIMULATION, "%d/%m/%Y"))
+        self.chunk = None
+        self.chunk_start = 0
+
+    def update(self, now=None):
+        now = self.env.now if now is None else now
+        if self.profile is None:
+            self.totalLoad = self.baseLoad
+        else:
+            k = round(now * 60 / self.cfg.MINUTES_PER_TICK)
+            if self.chunk is None or not self.chunk_start <= k < self.chunk_start + len(self.chunk):
+                self.chunk_start = k
+                self.chunk = self.profile.window(self.start + k * self.cfg.MINUTES_PER_TICK, CHUNK_TICKS,
+                                                 self.cfg.MINUTES_PER_TICK).tolist()
+            self.totalLoad = self.chunk[k - self.chunk_start]
+        if TRACER.debug:
+            TRACER.emit(DEBUG, now, "home", "update", load_w=self.totalLoad)
 
     @property
     def load(self):
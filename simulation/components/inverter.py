@@ -1,46 +1,87 @@
 import random
+import numpy as np
 from components.grid import Grid
-from config import (PRIORITY_OPTIONS, GRID_CONSTRAINT, INVERTER_CLIPPING, 
-                    INVERTER_FAIL_PROB, MIN_INVERTER_FAIL_DURATION, MAX_INVERTER_FAIL_DURATION, ROUND_TRIP_EFFICIENCY, MINUTES_PER_TICK)
+from config import PRIORITY_OPTIONS
+from settings import resolve
+from planner import DispatchPlanner, dispatch
+from reliability import Outage
 
 class Inverter:
-    def __init__(self, env, panel, battery, home, grid: Grid, priority):
+    def __init__(self, env, panel, battery, home, grid: Grid, priority, rng=random, cfg=None):
         self.env = env
+        self.cfg = resolve(cfg)
         self.panel, self.battery, self.home, self.grid = panel, battery, home, grid
         self.priority = priority
+        self.rng = rng
         
-        self.is_failed = False
-        self.downtime_remaining = 0
-        self.fail_count = 0
-        self.total_downtime = 0
+        self.outage = Outage("inverter", self.cfg)
         
         self.last_grid_flow = 0.0
+        self.last_shed = 0.0
+        self.planner = None
+        if priority == PRIORITY_OPTIONS.OPTIMAL:
+            self.planner = DispatchPlanner(battery.capacity, self.cfg.SOLAR_PEAK, self.cfg.INVERTER_CLIPPING, cfg=self.cfg)
         self.metrics = {
             "total_solar_gen": 0.0, "total_load_served": 0.0,
             "total_grid_export": 0.0, "total_grid_import": 0.0,
             "total_losses": 0.0, "unmet_load_events": 0
         }
 
-    def updateCondition(self):
-        if not self.is_failed and random.random() < INVERTER_FAIL_PROB:
-            self.is_failed = True
-            self.fail_count += 1
-            self.downtime_remaining = random.randint(MIN_INVERTER_FAIL_DURATION, MAX_INVERTER_FAIL_DURATION)
-
-    def update(self, generation, load):
-        if self.is_failed:
-            self.total_downtime += MINUTES_PER_TICK / 60
-            self.downtime_remaining -= MINUTES_PER_TICK / 60
-            if self.downtime_remaining <= 0: 
-                self.is_failed = False
-                self.downtime_remaining = 0
-            
+    # Failure state lives in self.outage (see reliability.py); the old names stay for checkpoints.
+    @property
+    def is_failed(self):
+        return self.outage.is_down
+
+    @is_failed.setter
+    def is_failed(self, value):
+        self.outage.is_down = value
+
+    @property
+    def downtime_remaining(self):
+        return self.outage.remaining
+
+    @downtime_remaining.setter
+    def downtime_remaining(self, value):
+        self.outage.remaining = value
+
+    @property
+    def fail_count(self):
+        return self.outage.count
+
+    @fail_count.setter
+    def fail_count(self, value):
+        self.outage.count = value
+
+    @property
+    def total_downtime(self):
+        return self.outage.downtime
+
+    @total_downtime.setter
+    def total_downtime(self, value):
+        self.outage.downtime = value
+
+    @property
+    def outages(self):
+        return {"inverter": self.outage, "battery": self.battery.outage, "grid": self.grid.outage}
+
+    def bypass(self, load):
+        """Tick with the inverter down: the load comes from the grid (or is shed in a grid outage)."""
+        self.metrics["unmet_load_events"] += 1
+        if self.grid.outage.is_down:
+            self.last_shed = load
+            self.last_grid_flow = 0.0
+        else:
             self.metrics["total_grid_import"] += load
-            self.metrics["unmet_load_events"] += 1
+            self.last_shed = 0.0
             self.last_grid_flow = -load
+
+    def update(self, generation, load, now=None):
+        cfg = self.cfg
+        if self.outage.is_down:
+            self.bypass(load)
             return
 
-        real_gen = min(generation, INVERTER_CLIPPING)
+        real_gen = min(generation, cfg.INVERTER_CLIPPING)
         self.metrics["total_solar_gen"] += real_gen
         
         home_served = 0.0
@@ -48,19 +89,39 @@ class Inverter:
         grid_flow = 0.0
         loss = 0.0
 
-        if self.priority == PRIORITY_OPTIONS.LOAD:
+        strategy = self.priority
+        if strategy == PRIORITY_OPTIONS.OPTIMAL:
+            k = round((self.env.now if now is None else now) * 60 / cfg.MINUTES_PER_TICK)
+            if self.battery.outage.is_down or not self.planner.needed(k, self.grid.remainingExport)[0]:
+                # No export allowance left to plan for (or no battery): serving the load first is optimal.
+                strategy = PRIORITY_OPTIONS.LOAD
+
+        if strategy == PRIORITY_OPTIONS.OPTIMAL:
+            change = float(self.planner.step(k, [self.battery.level], [self.grid.remainingExport], np.array([real_gen]),
+                                             np.array([load]), self.panel.weather.cloud_coverage)[0])
+            if change > 0:
+                self.battery.storage.put(change)
+            elif change < 0:
+                self.battery.storage.get(-change)
+            batt_flow = change
+            grid_flow, loss = dispatch(change, real_gen, load, self.grid.remainingExport, cfg.ROUND_TRIP_EFFICIENCY)
+            if grid_flow > 0:
+                self.grid.exportLimit.put(grid_flow)
+            home_served = load
+
+        elif strategy == PRIORITY_OPTIONS.LOAD:
             solar_to_home = min(load, real_gen)
             home_served = solar_to_home
             rem_gen = real_gen - solar_to_home
             rem_load = load - solar_to_home
             
             if rem_load > 0.001:
-                necesidad_real = rem_load / ROUND_TRIP_EFFICIENCY
-                sacar_de_batt = min(necesidad_real, self.battery.level)
+                necesidad_real = rem_load / cfg.ROUND_TRIP_EFFICIENCY
+                sacar_de_batt = min(necesidad_real, self.battery.available)
                 
                 if sacar_de_batt > 0.001:
                     self.battery.storage.get(sacar_de_batt)
-                    energia_util = sacar_de_batt * ROUND_TRIP_EFFICIENCY
+                    energia_util = sacar_de_batt * cfg.ROUND_TRIP_EFFICIENCY
                     
                     batt_flow -= energia_util
                     home_served += energia_util
@@ -74,7 +135,7 @@ class Inverter:
             if rem_gen > 0.001:
                 espacio_libre = self.battery.remainingCharge 
         
-                energia_a_guardar = rem_gen * ROUND_TRIP_EFFICIENCY
+                energia_a_guardar = rem_gen * cfg.ROUND_TRIP_EFFICIENCY
                 
               
                 guardar_real = min(espacio_libre, energia_a_guardar)
@@ -82,7 +143,7 @@ class Inverter:
                 if guardar_real > 0.001:
                     self.battery.storage.put(guardar_real)
                    
-                    costo_panel = guardar_real / ROUND_TRIP_EFFICIENCY
+                    costo_panel = guardar_real / cfg.ROUND_TRIP_EFFICIENCY
                     batt_flow += guardar_real
                     rem_gen -= costo_panel 
 
@@ -94,14 +155,14 @@ class Inverter:
                     grid_flow += export
                     loss = rem_gen - export
        
-        elif self.priority == PRIORITY_OPTIONS.CHARGE:
+        elif strategy == PRIORITY_OPTIONS.CHARGE:
            
-            energia_a_guardar = real_gen * ROUND_TRIP_EFFICIENCY
+            energia_a_guardar = real_gen * cfg.ROUND_TRIP_EFFICIENCY
             guardar_real = min(self.battery.remainingCharge, energia_a_guardar)
             
             if guardar_real > 0.001:
                 self.battery.storage.put(guardar_real)
-                costo_panel = guardar_real / ROUND_TRIP_EFFICIENCY
+                costo_panel = guardar_real / cfg.ROUND_TRIP_EFFICIENCY
                 batt_flow += guardar_real
                 real_gen -= costo_panel 
 
@@ -114,15 +175,15 @@ class Inverter:
                 grid_flow -= rem_load
                 home_served += rem_load
 
-        elif self.priority == PRIORITY_OPTIONS.PRODUCE:
+        elif strategy == PRIORITY_OPTIONS.PRODUCE:
             solar_to_grid = min(self.grid.remainingExport, real_gen)
             grid_flow += solar_to_grid
             rem_gen = real_gen - solar_to_grid
             
-            export = min(GRID_CONSTRAINT, rem_gen)
+            export = min(cfg.GRID_CONSTRAINT, rem_gen)
             
             if rem_gen > 0.001:
-                energia_a_guardar = rem_gen * ROUND_TRIP_EFFICIENCY
+                energia_a_guardar = rem_gen * cfg.ROUND_TRIP_EFFICIENCY
                 guardar_real = min(self.battery.remainingCharge, energia_a_guardar)
                 if guardar_real > 0.001: 
                     self.battery.storage.put(guardar_real)
@@ -139,6 +200,14 @@ class Inverter:
             
             
 
+        self.last_shed = 0.0
+        if grid_flow < 0 and self.grid.outage.is_down:
+            # Islanded: load the home cannot cover itself is shed.
+            self.last_shed = -grid_flow
+            home_served -= self.last_shed
+            grid_flow = 0.0
+            self.metrics["unmet_load_events"] += 1
+
         self.metrics["total_load_served"] += home_served
         if grid_flow > 0: self.metrics["total_grid_export"] += grid_flow
         else: self.metrics["total_grid_import"] += abs(grid_flow)
@@ -1,17 +1,26 @@
 from simpy import Environment
-import math
 from components.battery import Battery
 from components.weather import Weather
-from config import MINUTES_PER_TICK, SOLAR_PEAK
+from settings import resolve
+from solar import Sun
+from telemetry import TRACER, DEBUG
 
 class Panel:
-    def __init__(self, env: Environment, battery: Battery, weather: Weather):
+    def __init__(self, env: Environment, battery: Battery, weather: Weather, cfg=None):
         self.env = env
+        self.cfg = resolve(cfg)
         self.battery = battery
         self.weather = weather
         self.generation = 0
+        self.sun = Sun(self.cfg)
+
+    def output(self, now, cloudCoverage, irradiance=None):
+        """Generation (Wh) of the tick starting at simulation hour `now`."""
+        if irradiance is not None:
+            return max(0, self.cfg.SOLAR_PEAK * irradiance / 1000) * self.cfg.MINUTES_PER_TICK / 60
+        return max(0, self.cfg.SOLAR_PEAK * self.sun.panel(now) * (1-cloudCoverage)) * self.cfg.MINUTES_PER_TICK / 60
 
     def update(self, cloudCoverage):
-        sun_angle = (self.env.now % 24 - 6) * (math.pi / 12)
-        self.generation = max(0, SOLAR_PEAK * math.sin(sun_angle) * (1-cloudCoverage)) * MINUTES_PER_TICK / 60
-        print(f"Panel update: {self.generation:.2f} kW generated")
\ No newline at end of file
+        self.generation = self.output(self.env.now, cloudCoverage, self.weather.irradiance)
+        if TRACER.debug:
+            TRACER.emit(DEBUG, self.env.now, "panel", "update", generation_wh=self.generation, cloud=cloudCoverage)
\ No newline at end of file
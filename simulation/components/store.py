@@ -0,0 +1,40 @@
+from simpy import Container
+from config import STORAGE_OPTIONS
+
+class PlainContainer:
+    """
+    Float level with the capacity and floor of a SimPy Container, changed in
+    place by put/get without creating or scheduling events. Only for levels no
+    process waits on: a request that does not fit raises instead of waiting.
+    """
+    __slots__ = ("capacity", "level")
+
+    def __init__(self, capacity, init=0):
+        if capacity <= 0:
+            raise ValueError('"capacity" must be > 0.')
+        if init < 0:
+            raise ValueError('"init" must be >= 0.')
+        if init > capacity:
+            raise ValueError('"init" must be <= "capacity".')
+        self.capacity = capacity
+        self.level = init
+
+    def put(self, amount):
+        if amount <= 0:
+            raise ValueError(f'amount(={amount}) must be > 0.')
+        if self.capacity - self.level < amount:
+            raise ValueError(f'amount(={amount}) exceeds the free capacity ({self.capacity - self.level}).')
+        self.level += amount
+
+    def get(self, amount):
+        if amount <= 0:
+            raise ValueError(f'amount(={amount}) must be > 0.')
+        if self.level < amount:
+            raise ValueError(f'amount(={amount}) exceeds the level ({self.level}).')
+        self.level -= amount
+
+def make_container(env, capacity, init=0, backend=STORAGE_OPTIONS.SIMPY):
+    """SimPy Container or PlainContainer, as chosen by STORAGE_BACKEND."""
+    if backend == STORAGE_OPTIONS.PLAIN:
+        return PlainContainer(capacity, init)
+    return Container(env, capacity, init)
@@ -1,24 +1,62 @@
-import math
 from simpy import Environment
 import random
 from datetime import datetime
-from config import SEASON_PROBABILITY_FACTOR, CLOUD_COVERAGE, WEATHER_TYPES
+from settings import resolve
+from weather_replay import open_replay, derive_cloud, DAYLIGHT
+from recorder import to_minutes
+from solar import Sun
+
+CHUNK_TICKS = 4096
 
 class Weather:
-    def __init__(self, env: Environment):
+    def __init__(self, env: Environment, rng=random, cfg=None):
         self.env = env
+        self.rng = rng
+        self.cfg = resolve(cfg)
         self.cloud_coverage = 0
         self.weather = ""
 
+        # Historical replay: per-tick coverage and irradiance instead of daily draws.
+        self.replay = open_replay(self.cfg.WEATHER_FILE, self.cfg.WEATHER_SITE, self.cfg.WEATHER_CACHE_DIR, self.cfg.MINUTES_PER_TICK) if self.cfg.WEATHER_FILE else None
+        self.irradiance = None
+        self.sun = Sun(self.cfg)
+        self.start = to_minutes(datetime.strptime(self.cfg.DATE_OF_SIMULATION, "%d/%m/%Y"))
+        self.chunk = None
+        self.chunk_start = 0
+
     def update(self, date: datetime):
+        if self.replay is not None:
+            self.weather = "REPLAY"
+            return
+
         month = date.month
         season = "WINTER" if month in (12, 1, 2) else "SPRING" if month in (3, 4, 5) else "SUMMER" if month in (6, 7, 8) else "FALL"
         
-        self.weather = random.choices(
-            population=WEATHER_TYPES,
-            weights=SEASON_PROBABILITY_FACTOR[season],
+        self.weather = self.rng.choices(
+            population=self.cfg.WEATHER_TYPES,
+            weights=self.cfg.SEASON_PROBABILITY_FACTOR[season],
             k=1
         )[0]
 
-        min_c, max_c = CLOUD_COVERAGE[self.weather]
-        self.cloud_coverage = random.uniform(min_c, max_c)
\ No newline at end of file
+        min_c, max_c = self.cfg.CLOUD_COVERAGE[self.weather]
+        self.cloud_coverage = self.rng.uniform(min_c, max_c)
+
+    def observe(self, now):
+        """Replayed coverage and irradiance of the tick at simulation hour `now`."""
+        if self.replay is None:
+            return
+        tick = self.cfg.MINUTES_PER_TICK
+        k = round(now * 60 / tick)
+        if self.chunk is None or not self.chunk_start <= k < self.chunk_start + CHUNK_TICKS:
+            self.chunk_start = k
+            self.chunk = [None if series is None else series.tolist()
+                          for series in self.replay.window(self.start + k * tick, CHUNK_TICKS, tick)]
+        cloud, irradiance = self.chunk
+        i = k - self.chunk_start
+        self.irradiance = None if irradiance is None else irradiance[i]
+        if cloud is not None:
+            self.cloud_coverage = cloud[i]
+        else:
+            sun = self.sun.horizontal(now)
+            if sun > DAYLIGHT:
+                self.cloud_coverage = float(derive_cloud(self.irradiance, sun))
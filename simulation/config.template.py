@@ -13,6 +13,9 @@ BATTERY_CAPACITY = 13500            # Total battery capacity in Wh (e.g., 13.5 k
 BATTERY_FLOOR = 0.05               # Minimum usable state-of-charge (fraction, 0.0–1.0)
 EFFICIENCY = 0.9                    # General system efficiency factor
 ROUND_TRIP_EFFICIENCY = 0.95        # Battery round-trip efficiency (fraction, 0.0–1.0)
+BATTERY_FAULT_PROB = 0.0            # Daily probability of a battery fault (0 disables it, see reliability.py)
+MIN_BATTERY_FAULT_DURATION = 2
+MAX_BATTERY_FAULT_DURATION = 48     # Duration of a battery fault in hours
 
 # ── Inverter ─────────────────────────────────────────────────────────────────
 INVERTER_CLIPPING = 4000            # Max inverter output in W (generation above this is clipped)
@@ -22,32 +25,119 @@ MAX_INVERTER_FAIL_DURATION = 72          # Duration of an inverter failure in ti
 
 # ── Grid ─────────────────────────────────────────────────────────────────────
 GRID_CONSTRAINT = 20000             # Max grid export limit in W
+GRID_OUTAGE_PROB = 0.0              # Daily probability of a grid outage (0 disables it, see reliability.py)
+MIN_GRID_OUTAGE_DURATION = 1
+MAX_GRID_OUTAGE_DURATION = 8        # Duration of a grid outage in hours
 
 # ── Solar Panel ──────────────────────────────────────────────────────────────
 SOLAR_PEAK = 5000                   # Peak solar panel output in W (e.g., 5 kW)
+SOLAR_GEOMETRY = False              # True: solar-position + clear-sky model for the site below; False: 12-hour sine every day
+SITE_LATITUDE = 20.67               # Site latitude in degrees (north positive)
+SITE_LONGITUDE = -103.35            # Site longitude in degrees (east positive)
+SITE_UTC_OFFSET = -6                # Local standard time offset from UTC in hours
+PANEL_TILT = 20                     # Panel tilt from horizontal in degrees
+PANEL_AZIMUTH = 180                 # Direction the panel faces in degrees from north (180 = south)
+GROUND_ALBEDO = 0.2                 # Ground reflectance seen by the tilted panel
 
 # ── Household ────────────────────────────────────────────────────────────────
 BASE_LOAD = 500                     # Base household load in W (constant consumption)
+LOAD_PROFILE = ""                   # Recorded load profile (CSV of timestamp,load_w or .npy cache); empty uses BASE_LOAD
+LOAD_PROFILE_CACHE_DIR = ""         # Where parsed profiles are cached; empty uses .load_cache next to the profile
 
 # ── Economics ────────────────────────────────────────────────────────────────
 IMPORT_COST = 0.75                  # Cost per kWh imported from the grid (currency units)
 EXPORT_COST = 0.90                  # Revenue per kWh exported to the grid (currency units)
 
+# ── Tariffs (tariffs.py) ─────────────────────────────────────────────────────
+# Extra tariffs billed next to the flat IMPORT_COST/EXPORT_COST one (see tariffs.py for the fields).
+TARIFFS = {
+    "TIME_OF_USE": {
+        "import_rate": [0.45] * 7 + [0.75] * 10 + [1.20] * 4 + [0.75] * 2 + [0.45],   # Peak 17:00-21:00
+        "export_rate": 0.60,
+    },
+    "TIERED": {"import_rate": 0.60, "export_rate": 0.60, "tiers": [(150, 0.0), (300, 0.25), (None, 0.60)]},
+    "DEMAND": {"import_rate": 0.55, "export_rate": 0.60, "demand_charge": 40.0, "demand_hours": list(range(17, 21))},
+    "NET_METERING": {"import_rate": 0.75, "export_rate": 0.75, "net_metering": True, "export_limit_w": 3000,
+                     "fixed_charge": 50.0},
+}
+
+# ── Sizing (sizing.py) ───────────────────────────────────────────────────────
+BATTERY_COST_PER_KWH = 300.0        # Installed battery cost per kWh of capacity (currency units)
+SOLAR_COST_PER_KW = 1000.0          # Installed PV cost per kW of peak output (currency units)
+INVERTER_COST_PER_KW = 100.0        # Inverter cost per kW of clipping limit (currency units)
+SYSTEM_LIFETIME_YEARS = 20          # Years over which the installation cost is spread
+
+# ── Fleet (fleet.py) ─────────────────────────────────────────────────────────
+FLEET_HOMES = 1000                  # Homes simulated behind one feeder
+FEEDER_EXPORT_LIMIT = 1500000       # Max net export of the whole feeder in W (None = unlimited)
+FEEDER_IMPORT_LIMIT = 1000000       # Max net import of the whole feeder in W (None = unlimited)
+
+# ── Surrogate (surrogate.py) ─────────────────────────────────────────────────
+SURROGATE_SAMPLES = 256             # Quasi-random training points (each simulated with every strategy)
+SURROGATE_MEMBERS = 2               # Weather seeds averaged per training point
+SURROGATE_RANGES = {                # Trained region; queries outside it are simulated instead
+    "BATTERY_CAPACITY": (0, 20000),
+    "SOLAR_PEAK": (2000, 10000),
+    "INVERTER_CLIPPING": (2000, 8000),
+    "IMPORT_COST": (0.4, 1.2),
+    "EXPORT_COST": (0.4, 1.2),
+}
+
+# ── Live Twin (live.py) ──────────────────────────────────────────────────────
+LIVE_LOOKAHEAD_HOURS = 24           # Hours simulated ahead of every telemetry update
+LIVE_LISTEN = "127.0.0.1:8765"      # host:port the live twin listens on for JSON-lines telemetry
+LIVE_POLL_SECONDS = 0.5             # How often a tailed telemetry file is checked for new lines
+
 # ── Energy Management Strategy ───────────────────────────────────────────────
 class PRIORITY_OPTIONS(Enum):
     """Defines how surplus solar energy is allocated each tick."""
     LOAD = 1                        # Serve household load first, then battery, then export
     CHARGE = 2                      # Charge battery first, then serve load, then export
     PRODUCE = 3                     # Export to grid first, then battery, then serve load
+    OPTIMAL = 4                     # Plan charge/discharge/export over a forecast horizon (planner.py)
 
 CHARGE_PRIORITY = PRIORITY_OPTIONS.LOAD  # Active strategy used by the simulation
+PLANNER_HORIZON_HOURS = 48          # OPTIMAL: forecast horizon planned each day
+PLANNER_BATTERY_LEVELS = 11         # OPTIMAL: battery levels in the plan's grid
+PLANNER_EXPORT_LEVELS = 6           # OPTIMAL: remaining-export levels in the plan's grid
+PLANNER_FLEET_INSTALLATIONS = 64    # OPTIMAL in fleet.py: distinct installations planned exactly; more share this many representatives
 
 # ── Simulation Time ──────────────────────────────────────────────────────────
 SIMULATION_DAYS = 30                # Number of days to simulate
 MINUTES_PER_TICK = 60               # Minutes per simulation tick (60 = 1-hour resolution)
 DATE_OF_SIMULATION = "01/05/2026"   # Simulation start date (dd/mm/yyyy)
+LOG_FILE = "Monthly_Summary.csv"    # Per-tick log written by system.py (.csv, or any other extension for the binary columnar format)
+LOG_CHUNK_ROWS = 4096               # Rows buffered in memory before the log is flushed to disk
+RESULTS_CACHE_DIR = ".results_cache"  # Cached scenario results, keyed by config/seed/code (relative to simulation/); empty disables
+RESULTS_CACHE_MAX_MB = 256          # Least recently used results are evicted above this size
+STATS_HISTOGRAM_BINS = 20           # Fixed bins of the per-run SoC/cloud/load/grid/unmet histograms (online_stats.py)
+STATS_SKETCH_SIZE = 200             # Quantile sketch size per quantity; larger gives closer percentiles
+
+class ENGINE_OPTIONS(Enum):
+    """Defines which engine advances the simulation."""
+    SIMPY = 1                       # Per-tick SimPy process (system.Simulate)
+    BATCH = 2                       # Pre-computed exogenous arrays + dispatch loop (batch.SimulateBatch)
+
+SIMULATION_ENGINE = ENGINE_OPTIONS.SIMPY  # Active engine used by system.py and sym_results.py
+ADAPTIVE_STEPPING = False           # SimPy engine: jump over nights and inverter failures in one event (same results)
+
+class STORAGE_OPTIONS(Enum):
+    """Defines what holds the battery level and the monthly export counter."""
+    SIMPY = 1                       # SimPy Containers (put/get are events other processes can wait on)
+    PLAIN = 2                       # Plain float holders, same capacity/floor checks, no events (same results)
+
+STORAGE_BACKEND = STORAGE_OPTIONS.SIMPY  # Backend used by Battery and Grid in the SimPy engine
+
+# ── Telemetry ────────────────────────────────────────────────────────────────
+TRACE_LEVEL = "OFF"                 # "OFF", "INFO" (daily events, failures) or "DEBUG" (every component, every tick)
+TRACE_SAMPLE_EVERY = 1              # Keep one DEBUG event out of every N per component
+TRACE_FILE = ""                     # JSON-lines trace file; empty prints events to the console
 
 # ── Weather ──────────────────────────────────────────────────────────────────
+WEATHER_FILE = ""                   # Historical weather CSV (timestamp, ghi and/or cloud, optional site); empty draws random daily weather
+WEATHER_SITE = ""                   # Site to replay from a multi-site WEATHER_FILE
+WEATHER_CACHE_DIR = ""              # Where parsed weather files are cached; empty uses .weather_cache next to the file
+
 # Probability weights for each weather type per season.
 # Order must match WEATHER_TYPES: [CLEAR, PARTLY_CLOUDY, MOSTLY_CLOUDY, OVERCAST]
 SEASON_PROBABILITY_FACTOR = {
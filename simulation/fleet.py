@@ -0,0 +1,414 @@
+"""
+Neighborhood (fleet) mode for the Green Grid Digital Twin.
+
+Simulates many households behind one feeder. Every home has its own battery
+capacity, PV peak, inverter clipping, strategy and load scale, but all of them
+see the same weather. Fleet state lives in NumPy arrays (one entry per home)
+and every tick updates all homes at once with the same dispatch rules as the
+batch engine, so there are no per-home SimPy objects.
+
+The feeder adds two shared limits on top of each home's monthly
+GRID_CONSTRAINT: when the net export of the fleet exceeds FEEDER_EXPORT_LIMIT
+the exporting homes are curtailed pro rata (curtailed energy is spilled), and
+when the net import exceeds FEEDER_IMPORT_LIMIT the importing homes shed load
+pro rata.
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+
+SIM_DIR = Path(__file__).resolve().parent
+if str(SIM_DIR) not in sys.path:
+    sys.path.insert(0, str(SIM_DIR))
+
+import config
+from batch import build_exogenous
+from planner import DispatchPlanner
+from reliability import OUTAGE_MODELS, sample_fleet
+from settings import resolve
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class Fleet:
+    """Per-home installation arrays. Scalars are broadcast to every home."""
+
+    def __init__(self, capacity, solar_peak, clipping, priority, load_scale=1.0, initial_charge=0.0):
+        priority = np.asarray([p.value if isinstance(p, config.PRIORITY_OPTIONS) else p
+                               for p in np.atleast_1d(np.asarray(priority, dtype=object))], dtype=np.int8)
+        arrays = np.broadcast_arrays(
+            np.asarray(capacity, dtype=float), np.asarray(solar_peak, dtype=float),
+            np.asarray(clipping, dtype=float), priority,
+            np.asarray(load_scale, dtype=float), np.asarray(initial_charge, dtype=float))
+        self.capacity, self.solar_peak, self.clipping, self.priority, self.load_scale, self.initial_charge = \
+            (np.array(a) for a in arrays)
+
+    def __len__(self):
+        return len(self.capacity)
+
+    @classmethod
+    def uniform(cls, homes, priority=None, cfg=None):
+        """`homes` copies of the installation in the configuration."""
+        cfg = resolve(cfg)
+        priority = priority or cfg.CHARGE_PRIORITY
+        return cls(np.full(homes, float(cfg.BATTERY_CAPACITY)), cfg.SOLAR_PEAK, cfg.INVERTER_CLIPPING, priority)
+
+    @classmethod
+    def sample(cls, homes, rng, cfg=None, spread=0.3, priorities=None):
+        """
+        Random neighborhood: sizes and load drawn uniformly within +-spread of
+        the configuration, strategies drawn from `priorities` (all by default).
+        """
+        cfg = resolve(cfg)
+        priorities = [p.value for p in (priorities or list(config.PRIORITY_OPTIONS))]
+
+        def around(value):
+            return value * rng.uniform(1 - spread, 1 + spread, homes)
+
+        return cls(around(cfg.BATTERY_CAPACITY), around(cfg.SOLAR_PEAK), around(cfg.INVERTER_CLIPPING),
+                   rng.choice(priorities, homes), around(1.0))
+
+
+class FleetResult:
+    """Per-home totals (`homes`) and per-tick feeder series (`feeder`)."""
+
+    def __init__(self, homes, feeder, cfg):
+        self.homes = homes
+        self.feeder = feeder
+        self.cfg = cfg
+
+    @property
+    def net_balance(self):
+        return (self.homes["total_grid_export"] * self.cfg.EXPORT_COST
+                - self.homes["total_grid_import"] * self.cfg.IMPORT_COST) / 1000
+
+    def summary(self):
+        h = self.cfg.MINUTES_PER_TICK / 60
+        balance = self.net_balance
+        totals = {f"{name}_kwh": float(values.sum() / 1000) for name, values in self.homes.items()
+                  if name.startswith("total_")}
+        feeder_net = self.feeder["net_wh"] / h
+        return {
+            "homes": len(balance),
+            **totals,
+            "unmet_load_events": int(self.homes["unmet_load_events"].sum()),
+            "inverter_failures": int(self.homes["fail_count"].sum()),
+            "battery_faults": int(self.homes["battery_faults"].sum()),
+            "grid_outages": int(self.homes["grid_outages"].sum()),
+            "net_balance": float(balance.sum()),
+            "net_balance_per_home": {
+                "mean": float(balance.mean()),
+                "std": float(balance.std()),
+                **{f"p{q}": float(v) for q, v in zip(PERCENTILES, np.percentile(balance, PERCENTILES))},
+            },
+            "feeder": {
+                "peak_export_w": float(max(0.0, feeder_net.max())),
+                "peak_import_w": float(max(0.0, -feeder_net.min())),
+                "curtailed_kwh": float(self.feeder["curtailed_wh"].sum() / 1000),
+                "shed_kwh": float(self.feeder["shed_wh"].sum() / 1000),
+                "curtailment_hours": float(np.count_nonzero(self.feeder["curtailed_wh"]) * h),
+                "shedding_hours": float(np.count_nonzero(self.feeder["shed_wh"]) * h),
+            },
+        }
+
+
+def _limit(value, h):
+    """Feeder limit in W as Wh per tick (None means unlimited)."""
+    return math.inf if value is None else value * h
+
+
+def _serve_load(g, d, c, lv, export_level, export_cap, rte):
+    """LOAD rules (home, battery, export) for a slice of homes: served, flow, loss, level, export level."""
+    to_home = np.minimum(d, g)
+    rem_gen = g - to_home
+    rem_load = d - to_home
+    draw = np.where(rem_load > 0.001, np.minimum(rem_load / rte, lv), 0.0)
+    draw = np.where(draw > 0.001, draw, 0.0)
+    lv = lv - draw
+    rem_load = rem_load - draw * rte
+    imp = np.where(rem_load > 0.001, rem_load, 0.0)
+    served = to_home + draw * rte + imp
+    store = np.where(rem_gen > 0.001, np.minimum(c - lv, rem_gen * rte), 0.0)
+    store = np.where(store > 0.001, store, 0.0)
+    lv = lv + store
+    rem_gen = rem_gen - store / rte
+    export = np.where(rem_gen > 0.001, np.minimum(export_cap - export_level, rem_gen), 0.0)
+    loss = np.where(rem_gen > 0.001, rem_gen - export, 0.0)
+    return served, export - imp, loss, lv, export_level + np.maximum(export, 0.0)
+
+
+def SimulateFleet(fleet, exo, export_limit=None, import_limit=None, rng=None,
+                  shared_failures=False, cfg=None):
+    """
+    Runs every home of `fleet` over the weather of the exogenous trace `exo`.
+
+    Component outages (see reliability.py) are drawn per home from the
+    NumPy generator `rng`, with the same daily probabilities and durations
+    as the single-home model, before the first tick. With `shared_failures`
+    every home follows the outages of the trace instead, which makes a
+    uniform fleet reproduce SimulateTrace exactly.
+    Feeder limits are in W; None means unlimited.
+    """
+    cfg = cfg if cfg is not None else exo["config"]
+    tick = exo["config"].MINUTES_PER_TICK
+    h = tick / 60
+    rte = cfg.ROUND_TRIP_EFFICIENCY
+    rng = rng if rng is not None else np.random.default_rng()
+    export_wh = _limit(export_limit, h)
+    import_wh = _limit(import_limit, h)
+
+    # Homes are grouped by strategy so each rule works on contiguous slices.
+    order = np.argsort(fleet.priority, kind="stable")
+    pri = fleet.priority[order]
+    groups = {p: slice(int(np.searchsorted(pri, p.value, "left")), int(np.searchsorted(pri, p.value, "right")))
+              for p in config.PRIORITY_OPTIONS}
+    cap = fleet.capacity[order]
+    peak = fleet.solar_peak[order]
+    clip = fleet.clipping[order]
+    scale = fleet.load_scale[order]
+    level = fleet.initial_charge[order].copy()
+    n_homes = len(fleet)
+
+    n = len(exo["now"])
+    sun = exo["sun"].tolist()
+    cloud = exo["cloud"].tolist()
+    irradiance = None if exo["irradiance"] is None else exo["irradiance"].tolist()
+    load_series = exo["load"].tolist()
+    resets = {s for s, d in zip(exo["day_starts"].tolist(), exo["month_days"].tolist()) if d == 1}
+
+    export_level = np.zeros(n_homes)
+    export_cap = cfg.GRID_CONSTRAINT
+
+    totals = {name: np.zeros(n_homes) for name in (
+        "total_solar_gen", "total_load_served", "total_grid_export", "total_grid_import",
+        "total_losses", "total_curtailed", "total_load_shed", "full_hours", "empty_hours", "downtime_hours",
+        "battery_fault_hours", "grid_outage_hours")}
+    counts = {name: np.zeros(n_homes, dtype=np.int64) for name in (
+        "unmet_load_events", "unmet_events", "shed_events", "fail_count", "battery_faults", "grid_outages")}
+
+    # Outage flags only change at span edges: edges[k] lists (flags, homes, value).
+    down = {name: np.zeros(n_homes, dtype=bool) for name in OUTAGE_MODELS}
+    failed, battery_down, grid_down = down["inverter"], down["battery"], down["grid"]
+    failed_after = np.zeros(n_homes, dtype=bool)
+    counted = {"inverter": ("fail_count", "downtime_hours"), "battery": ("battery_faults", "battery_fault_hours"),
+               "grid": ("grid_outages", "grid_outage_hours")}
+    edges = {}
+
+    def edge(k, flags, homes, value):
+        if k < n:
+            edges.setdefault(k, []).append((flags, homes, value))
+
+    if shared_failures:
+        spans = {name: [(slice(None), first, end) for first, end in pairs] for name, pairs in exo["spans"].items()}
+        for name, outage in exo["outages"].items():
+            counts[counted[name][0]][:] = outage.count
+            totals[counted[name][1]][:] = outage.downtime
+    else:
+        spans = {}
+        for name, (homes, first, end) in sample_fleet(exo["day_starts"].tolist(), n, h, n_homes, rng, cfg).items():
+            spans[name] = list(zip(homes.tolist(), first.tolist(), end.tolist()))
+            np.add.at(counts[counted[name][0]], homes, 1)
+            np.add.at(totals[counted[name][1]], homes, (np.minimum(end, n) - first) * h)
+    for name, entries in spans.items():
+        for homes, first, end in entries:
+            edge(first, down[name], homes, True)
+            edge(end, down[name], homes, False)
+            if name == "inverter" and end - 1 > first:
+                edge(first, failed_after, homes, True)
+                edge(end - 1, failed_after, homes, False)
+    any_failed = any_battery = any_grid = False
+
+    feeder_net = np.zeros(n)
+    feeder_curtailed = np.zeros(n)
+    feeder_shed = np.zeros(n)
+
+    L = groups[config.PRIORITY_OPTIONS.LOAD]
+    C = groups[config.PRIORITY_OPTIONS.CHARGE]
+    P = groups[config.PRIORITY_OPTIONS.PRODUCE]
+    O = groups[config.PRIORITY_OPTIONS.OPTIMAL]
+    planner = None
+    if O.stop > O.start:
+        planner = DispatchPlanner(cap[O], peak[O], clip[O], scale[O], cfg=cfg, forecast_cfg=exo["config"])
+
+    for k in range(n):
+        if k in resets:
+            export_level[:] = 0
+
+        if k in edges:
+            for flags, homes, value in edges[k]:
+                flags[homes] = value
+            any_failed, any_battery, any_grid = failed.any(), battery_down.any(), grid_down.any()
+
+        if irradiance is None:
+            generation = np.maximum(0, peak * sun[k] * (1 - cloud[k])) * tick / 60
+        else:
+            generation = np.maximum(0, peak * irradiance[k] / 1000) * tick / 60
+        load = load_series[k] * scale
+        real_gen = np.minimum(generation, clip)
+        served = np.zeros(n_homes)
+        flow = np.zeros(n_homes)
+        loss = np.zeros(n_homes)
+        new_level = level.copy()
+        new_export = export_level.copy()
+
+        # Faulted batteries look empty and zero-sized to the dispatch; islanded
+        # homes have no export allowance. Both keep their counters.
+        size, avail, used = cap, level, export_level
+        if any_battery:
+            size = np.where(battery_down, 0.0, cap)
+            avail = np.where(battery_down, 0.0, level)
+        if any_grid:
+            used = np.where(grid_down, export_cap, export_level)
+
+        # ── LOAD: home, battery, export ──────────────────────────────────────
+        served[L], flow[L], loss[L], new_level[L], new_export[L] = _serve_load(
+            real_gen[L], load[L], size[L], avail[L], used[L], export_cap, rte)
+
+        # ── OPTIMAL: planned battery level, LOAD once the allowance is gone ──
+        if planner is not None:
+            served[O], flow[O], loss[O], new_level[O], new_export[O] = _serve_load(
+                real_gen[O], load[O], size[O], avail[O], used[O], export_cap, rte)
+            plan = planner.needed(k, export_cap - used[O])
+            if any_battery:
+                plan &= ~battery_down[O]
+            if plan.any():
+                g, d, lv, left = real_gen[O], load[O], avail[O], export_cap - used[O]
+                change = planner.step(k, lv, left, g, d, cloud[k])
+                x = g - d - np.where(change > 0, change / rte, change * rte)
+                export = np.clip(x, 0.0, left)
+                served[O] = np.where(plan, d, served[O])
+                flow[O] = np.where(plan, np.where(x > 0, export, x), flow[O])
+                loss[O] = np.where(plan, np.maximum(x - export, 0.0), loss[O])
+                new_level[O] = np.where(plan, lv + change, new_level[O])
+                new_export[O] = np.where(plan, used[O] + export, new_export[O])
+
+        # ── CHARGE: battery, home (no export) ────────────────────────────────
+        g, d, c, lv = real_gen[C], load[C], size[C], avail[C]
+        store = np.minimum(c - lv, g * rte)
+        store = np.where(store > 0.001, store, 0.0)
+        lv = lv + store
+        g = g - store / rte
+        to_home = np.minimum(d, g)
+        rem_load = d - to_home
+        imp = np.where(rem_load > 0.001, rem_load, 0.0)
+        served[C] = to_home + imp
+        flow[C] = -imp
+        new_level[C] = lv
+
+        # ── PRODUCE: export, battery, home ───────────────────────────────────
+        g, d, c, lv = real_gen[P], load[P], size[P], avail[P]
+        to_grid = np.minimum(export_cap - used[P], g)
+        rem_gen = g - to_grid
+        store = np.where(rem_gen > 0.001, np.minimum(c - lv, rem_gen * rte), 0.0)
+        lv = lv + np.where(store > 0.001, store, 0.0)
+        to_home = np.minimum(d, rem_gen)
+        rem_load = np.where(to_home > 0.001, d - to_home, d)
+        served[P] = np.where(to_home > 0.001, to_home, 0.0) + rem_load
+        flow[P] = to_grid - rem_load
+        new_level[P] = lv
+
+        if any_battery:
+            new_level = np.where(battery_down, level, new_level)
+        if any_grid:
+            new_export = np.where(grid_down, export_level, new_export)
+
+        # Failed inverters import the whole load and leave the battery alone.
+        if any_failed:
+            served = np.where(failed, 0.0, served)
+            flow = np.where(failed, -load, flow)
+            loss = np.where(failed, 0.0, loss)
+            new_level = np.where(failed, level, new_level)
+            new_export = np.where(failed, export_level, new_export)
+            real_gen = np.where(failed, 0.0, real_gen)
+            counts["unmet_load_events"] += failed
+        # Islanded homes shed what they would have imported.
+        islanded = None
+        if any_grid:
+            islanded = np.where(grid_down, np.maximum(-flow, 0.0), 0.0)
+            flow = flow + islanded
+            served = served - np.where(failed, 0.0, islanded)
+            counts["unmet_load_events"] += ~failed & (islanded > 0)
+        level = new_level
+        export_level = new_export
+
+        # ── Feeder limits ────────────────────────────────────────────────────
+        net = flow.sum()
+        if net > export_wh:
+            out = np.maximum(flow, 0.0)
+            curtail = out * ((net - export_wh) / out.sum())
+            flow = flow - curtail
+            loss = loss + curtail
+            export_level[L] -= curtail[L]
+            export_level[O] -= curtail[O]
+            totals["total_curtailed"] += curtail
+            feeder_curtailed[k] = curtail.sum()
+        elif -net > import_wh:
+            into = np.maximum(-flow, 0.0)
+            shed = into * ((-net - import_wh) / into.sum())
+            flow = flow + shed
+            served = served - np.where(failed, 0.0, shed)
+            totals["total_load_shed"] += shed
+            counts["shed_events"] += shed > 0
+            feeder_shed[k] = shed.sum()
+        feeder_net[k] = flow.sum()
+
+        totals["total_solar_gen"] += real_gen
+        totals["total_load_served"] += served
+        totals["total_grid_export"] += np.maximum(flow, 0.0)
+        totals["total_grid_import"] += np.maximum(-flow, 0.0)
+        totals["total_losses"] += loss
+
+        soc = np.divide(level * 100, cap, out=np.zeros(n_homes), where=cap > 0)
+        totals["full_hours"] += (soc >= 99.9) * h
+        totals["empty_hours"] += (soc <= 0.1) * h
+        if any_failed or any_grid:
+            unmet = failed_after & (load - (generation + level) > 0)
+            if islanded is not None:
+                unmet |= islanded > 0
+            counts["unmet_events"] += unmet
+
+    # Back to the order of the fleet.
+    inverse = np.empty_like(order)
+    inverse[order] = np.arange(n_homes)
+    homes = {name: values[inverse] for name, values in {**totals, **counts}.items()}
+    homes["battery_level"] = level[inverse]
+    feeder = {"net_wh": feeder_net, "curtailed_wh": feeder_curtailed, "shed_wh": feeder_shed}
+    return FleetResult(homes, feeder, cfg)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate a neighborhood of homes sharing one feeder.')
+    parser.add_argument('--homes', type=int, default=config.FLEET_HOMES, help='Number of homes (default: config.FLEET_HOMES)')
+    parser.add_argument('--days', type=int, default=config.SIMULATION_DAYS, help='Days to simulate (default: config.SIMULATION_DAYS)')
+    parser.add_argument('--strategy', choices=['MIXED'] + [p.name for p in config.PRIORITY_OPTIONS], default='MIXED', help='Strategy of every home, or MIXED for a random mix (default: MIXED)')
+    parser.add_argument('--spread', type=float, default=0.3, help='Relative spread of the random home sizes (default: 0.3)')
+    parser.add_argument('--export-limit', type=float, default=config.FEEDER_EXPORT_LIMIT, help='Feeder export limit in W (default: config.FEEDER_EXPORT_LIMIT)')
+    parser.add_argument('--import-limit', type=float, default=config.FEEDER_IMPORT_LIMIT, help='Feeder import limit in W (default: config.FEEDER_IMPORT_LIMIT)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for weather, sizes and failures (default: 42)')
+    parser.add_argument('--output', type=str, default='', help='Optional output JSON file path. If omitted, prints to stdout.')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    priorities = None if args.strategy == 'MIXED' else [config.PRIORITY_OPTIONS[args.strategy]]
+    fleet = Fleet.sample(args.homes, rng, spread=args.spread, priorities=priorities)
+    trace = build_exogenous(config.DATE_OF_SIMULATION, args.days, random.Random(args.seed))
+    result = SimulateFleet(fleet, trace, args.export_limit, args.import_limit, rng)
+    payload = json.dumps(result.summary(), indent=2)
+
+    if args.output:
+        output_path = Path(args.output).expanduser().resolve()
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_text(payload + '\n', encoding='utf-8')
+        print(f'Results written to {output_path}')
+    else:
+        print(payload)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+"""
+Live mode for the Green Grid Digital Twin.
+
+Instead of a fixed offline horizon, the twin follows a stream of site
+telemetry, one JSON object per line:
+
+    {"site": "home-17", "timestamp": "2026-05-11 10:00", "battery_wh": 8200,
+     "grid_w": -350, "inverter_ok": true, "cloud": 0.3}
+
+- battery_wh (or soc, in %): measured battery level
+- export_wh: export used this month, as read from the meter; without it the
+  positive part of grid_w (W, + export / - import) is integrated over time
+- inverter_ok: false while the inverter is down; downtime_h, if known, is the
+  expected time to repair (otherwise the mean of the failure model)
+- cloud: observed cloud coverage (0-1), kept until the next observation
+
+Every message re-synchronizes the site's battery level, export counter,
+inverter failure state and weather, then a SimPy run is started from that
+state (checkpoint.SimulationRun) and simulated LIVE_LOOKAHEAD_HOURS ahead.
+The look-ahead draws later days' weather and failures from a stream seeded
+by site and timestamp, so the same telemetry always gives the same forecast.
+An update costs well under a millisecond per simulated day at hourly ticks,
+so one process can follow hundreds of sites.
+
+Telemetry comes from any async iterable of lines or dicts: tail_file()
+follows a growing file, listen() accepts any number of socket connections,
+and tests can pass a plain async generator.
+
+    python live.py --tail telemetry.jsonl
+    python live.py --listen 0.0.0.0:8765 --lookahead 48
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from time import perf_counter
+
+SIM_DIR = Path(__file__).resolve().parent
+if str(SIM_DIR) not in sys.path:
+    sys.path.insert(0, str(SIM_DIR))
+
+import config
+import numpy as np
+
+from checkpoint import SimulationRun
+from online_stats import RunStats
+from settings import resolve
+
+METRICS = ("total_solar_gen", "total_load_served", "total_grid_export", "total_grid_import", "total_losses")
+
+
+def parse_timestamp(value):
+    return datetime.fromisoformat(str(value))
+
+
+def weather_type(cloud, cfg):
+    """Weather type of the model whose coverage range holds `cloud`."""
+    for name in cfg.WEATHER_TYPES:
+        if cloud <= cfg.CLOUD_COVERAGE[name][1]:
+            return name
+    return cfg.WEATHER_TYPES[-1]
+
+
+class SocWatch:
+    """RunStats collector: first look-ahead ticks with the battery empty and full."""
+
+    def __init__(self):
+        self.empty = None
+        self.full = None
+
+    def update(self, columns, start):
+        soc = columns["soc"]
+        if self.empty is None and (soc <= 0.1).any():
+            self.empty = start + int(np.argmax(soc <= 0.1))
+        if self.full is None and (soc >= 99.9).any():
+            self.full = start + int(np.argmax(soc >= 99.9))
+
+
+class SiteTwin:
+    """Measured state of one site and look-ahead runs from it."""
+
+    def __init__(self, site, cfg=None, priority=None, lookahead_hours=None):
+        self.site = site
+        self.cfg = resolve(cfg)
+        self.priority = priority or self.cfg.CHARGE_PRIORITY
+        self.lookahead = lookahead_hours or self.cfg.LIVE_LOOKAHEAD_HOURS
+        self.dt = None
+        self.level = 0.0
+        self.export_used = 0.0
+        self.failed = False
+        self.downtime = 0.0
+        self.cloud = 0.0
+        self.updates = 0
+
+    def sync(self, message):
+        """
+        Re-synchronizes the measured state from one telemetry message. Every
+        field is parsed before any state changes, so a rejected message
+        leaves the twin as it was.
+        """
+        cfg = self.cfg
+        dt = parse_timestamp(message["timestamp"])
+        elapsed = 0.0
+        export_used = self.export_used
+        if self.dt is not None:
+            elapsed = (dt - self.dt).total_seconds() / 3600
+            if elapsed < 0:
+                raise ValueError(f"{self.site}: telemetry at {dt} is older than {self.dt}")
+            if (dt.year, dt.month) != (self.dt.year, self.dt.month):
+                export_used = 0.0
+
+        if "export_wh" in message:
+            export_used = float(message["export_wh"])
+        elif "grid_w" in message:
+            export_used += max(0.0, float(message["grid_w"])) * elapsed
+        export_used = min(max(0.0, export_used), cfg.GRID_CONSTRAINT)
+
+        level = self.level
+        if "battery_wh" in message:
+            level = float(message["battery_wh"])
+        elif "soc" in message:
+            level = float(message["soc"]) / 100 * cfg.BATTERY_CAPACITY
+        level = min(max(0.0, level), cfg.BATTERY_CAPACITY)
+
+        failed, downtime = False, 0.0
+        if not message.get("inverter_ok", True):
+            if "downtime_h" in message:
+                downtime = float(message["downtime_h"])
+            elif not self.failed:
+                downtime = (cfg.MIN_INVERTER_FAIL_DURATION + cfg.MAX_INVERTER_FAIL_DURATION) / 2
+            else:
+                downtime = self.downtime - elapsed
+            downtime = max(downtime, cfg.MINUTES_PER_TICK / 60)
+            failed = True
+
+        cloud = self.cloud
+        if "cloud" in message:
+            cloud = min(max(0.0, float(message["cloud"])), 1.0)
+
+        self.export_used, self.level = export_used, level
+        self.failed, self.downtime = failed, downtime
+        self.cloud, self.dt = cloud, dt
+        self.updates += 1
+
+    def state(self, rng):
+        """(configuration, checkpoint state) of a run starting at the tick of the last telemetry."""
+        tick = self.cfg.MINUTES_PER_TICK
+        day = self.dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        minutes = self.dt.hour * 60 + self.dt.minute
+        minutes -= minutes % tick
+        cfg = self.cfg.replace(DATE_OF_SIMULATION=day.strftime("%d/%m/%Y"))
+        version, internal, gauss = rng.getstate()
+        return cfg, {
+            "clock": {"dt": (day + timedelta(minutes=minutes)).isoformat(), "now": minutes / 60},
+            "rng": [version, list(internal), gauss],
+            "battery_level": self.level,
+            "grid_export_level": self.export_used,
+            "weather": {"weather": weather_type(self.cloud, self.cfg), "cloud_coverage": self.cloud},
+            "inverter": {"is_failed": self.failed, "downtime_remaining": self.downtime, "fail_count": 0,
+                         "total_downtime": 0, "last_grid_flow": 0.0,
+                         "metrics": {**{name: 0.0 for name in METRICS}, "unmet_load_events": 0}},
+            "stats": RunStats(self.cfg, track=("soc",)).state(),
+        }
+
+    def forecast(self):
+        """Runs the look-ahead from the synced state and summarizes it."""
+        start = perf_counter()
+        cfg, state = self.state(random.Random(f"{self.site}|{self.dt.isoformat()}"))
+        now = state["clock"]["now"]
+        until = now + self.lookahead
+        run = SimulationRun(self.priority, cfg, random.Random(), math.ceil(until / 24), None, state)
+        watch = run.stats.plug("soc", SocWatch())
+        run.run(until / 24)
+        run.stats.flush()
+
+        h = cfg.MINUTES_PER_TICK / 60
+        soc = run.stats.summaries()["soc"]
+        metrics = run.inverter.metrics
+        imp_kwh = metrics["total_grid_import"] / 1000
+        exp_kwh = metrics["total_grid_export"] / 1000
+
+        def hours(tick):
+            return (tick + 1) * h if tick is not None else None
+
+        return {
+            "site": self.site,
+            "timestamp": self.dt.isoformat(sep=" ", timespec="minutes"),
+            "soc": self.level / cfg.BATTERY_CAPACITY * 100,
+            "inverter_ok": not self.failed,
+            "export_left_kwh": (cfg.GRID_CONSTRAINT - self.export_used) / 1000,
+            "lookahead_h": self.lookahead,
+            "soc_end": run.battery.batteryPercentage,
+            "soc_min": soc.min if soc.count else run.battery.batteryPercentage,
+            "hours_to_empty": hours(watch.empty),
+            "hours_to_full": hours(watch.full),
+            "solar_kwh": metrics["total_solar_gen"] / 1000,
+            "grid_import_kwh": imp_kwh,
+            "grid_export_kwh": exp_kwh,
+            "net_balance": exp_kwh * cfg.EXPORT_COST - imp_kwh * cfg.IMPORT_COST,
+            "unmet_events": run.stats.unmet_events,
+            "compute_ms": (perf_counter() - start) * 1000,
+        }
+
+
+class LiveTwin:
+    """
+    Every site seen in the telemetry. `site_configs` ({site: SimulationConfig})
+    gives a site its own installation; the others use `cfg`.
+    """
+
+    def __init__(self, cfg=None, priority=None, lookahead_hours=None, site_configs=None):
+        self.cfg = resolve(cfg)
+        self.priority = priority
+        self.lookahead = lookahead_hours
+        self.site_configs = site_configs or {}
+        self.sites = {}
+        self.rejected = 0
+
+    def site(self, name):
+        twin = self.sites.get(name)
+        if twin is None:
+            twin = self.sites[name] = SiteTwin(name, self.site_configs.get(name, self.cfg), self.priority,
+                                               self.lookahead)
+        return twin
+
+    def update(self, message):
+        """Syncs the message's site and returns its look-ahead forecast."""
+        if not isinstance(message, dict):
+            message = json.loads(message)
+        twin = self.site(str(message.get("site", "")))
+        twin.sync(message)
+        return twin.forecast()
+
+    async def run(self, source, on_forecast=None):
+        """
+        Consumes `source` (async iterable of JSON lines or dicts) until it
+        ends. Malformed messages are counted in `rejected` and skipped.
+        """
+        async for message in source:
+            if isinstance(message, (str, bytes)):
+                if not message.strip():
+                    continue
+            try:
+                forecast = self.update(message)
+            except (KeyError, TypeError, ValueError):
+                self.rejected += 1
+                continue
+            if on_forecast is not None:
+                on_forecast(forecast)
+            # Let other connections and tasks run between updates.
+            await asyncio.sleep(0)
+
+
+# ── Telemetry sources ───────────────────────────────────────────────────────
+async def read_stream(reader):
+    """Lines of an asyncio StreamReader until EOF."""
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        yield line.decode("utf-8")
+
+
+async def tail_file(path, poll=None, follow=True):
+    """Lines of a telemetry file; with `follow`, keeps waiting for new ones like tail -f."""
+    poll = poll if poll is not None else config.LIVE_POLL_SECONDS
+    with open(path, encoding="utf-8") as f:
+        pending = ""
+        while True:
+            pending += f.readline()
+            if pending.endswith("\n"):
+                yield pending
+                pending = ""
+                continue
+            if not follow:
+                if pending:
+                    yield pending
+                return
+            await asyncio.sleep(poll)
+
+
+async def listen(host, port, ready=None):
+    """
+    Lines from every connection to a TCP server on host:port, in arrival
+    order. `ready` (an asyncio.Event) is set once the server accepts
+    connections.
+    """
+    queue = asyncio.Queue()
+
+    async def handle(reader, writer):
+        async for line in read_stream(reader):
+            await queue.put(line)
+        writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    if ready is not None:
+        ready.set()
+    async with server:
+        while True:
+            yield await queue.get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Follow live site telemetry and print look-ahead forecasts as JSON lines.')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--tail', type=str, default='', help='Telemetry file to follow (JSON lines)')
+    source.add_argument('--listen', type=str, default=config.LIVE_LISTEN, help='host:port to accept telemetry on (default: config.LIVE_LISTEN)')
+    parser.add_argument('--no-follow', action='store_true', help='With --tail, stop at the end of the file')
+    parser.add_argument('--lookahead', type=float, default=config.LIVE_LOOKAHEAD_HOURS, help='Hours simulated ahead of each update (default: config.LIVE_LOOKAHEAD_HOURS)')
+    parser.add_argument('--strategy', choices=[p.name for p in config.PRIORITY_OPTIONS], default=config.CHARGE_PRIORITY.name, help='Strategy of the look-ahead runs (default: config.CHARGE_PRIORITY)')
+    args = parser.parse_args()
+
+    twin = LiveTwin(priority=config.PRIORITY_OPTIONS[args.strategy], lookahead_hours=args.lookahead)
+    if args.tail:
+        stream = tail_file(args.tail, follow=not args.no_follow)
+    else:
+        host, _, port = args.listen.rpartition(':')
+        stream = listen(host or '127.0.0.1', int(port))
+        print(f'Listening for telemetry on {args.listen}', file=sys.stderr)
+
+    def emit(forecast):
+        print(json.dumps(forecast), flush=True)
+
+    try:
+        asyncio.run(twin.run(stream, emit))
+    except KeyboardInterrupt:
+        pass
+    updates = sum(t.updates for t in twin.sites.values())
+    print(f'{updates} updates from {len(twin.sites)} sites, {twin.rejected} rejected', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Recorded household load profiles for the Green Grid Digital Twin.
+
+A profile is a smart-meter series of (timestamp, load in W) samples, given as
+a CSV file (timestamp in the first column, load in the second, optional
+header) or as a .npy file in the timeseries layout. The first time a CSV is
+opened it is parsed once into a binary cache file next to it (or in
+LOAD_PROFILE_CACHE_DIR), keyed by path, size and modification time; later
+runs memory-map that file, so they start instantly and only read the pages
+covering the simulated window. Resampling to the tick is done by
+timeseries.TimeSeries.
+"""
+
+import csv
+import hashlib
+from pathlib import Path
+
+import numpy as np
+
+from timeseries import TimeSeries, to_epoch_minutes, write_series
+
+_OPEN = {}
+
+
+def _parse_csv(path):
+    stamps, loads = [], []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if not row:
+                continue
+            try:
+                load = float(row[1])
+            except ValueError:
+                continue                # header
+            stamps.append(row[0].strip())
+            loads.append(load)
+    return to_epoch_minutes(stamps), np.array(loads)
+
+
+def cache_path(path, cache_dir=""):
+    path = Path(path).resolve()
+    st = path.stat()
+    key = hashlib.sha1(f"{path}|{st.st_size}|{st.st_mtime_ns}".encode()).hexdigest()[:16]
+    folder = Path(cache_dir) if cache_dir else path.parent / ".load_cache"
+    return folder / f"{path.stem}-{key}.npy"
+
+
+class LoadProfile(TimeSeries):
+    def __init__(self, path, cache_dir=""):
+        path = Path(path)
+        if path.suffix != ".npy":
+            cached = cache_path(path, cache_dir)
+            if not cached.exists():
+                cached.parent.mkdir(parents=True, exist_ok=True)
+                write_series(*_parse_csv(path), cached)
+            path = cached
+        super().__init__(path)
+
+
+def open_profile(path, cache_dir="", minutes_per_tick=1):
+    """Profile for `path`, shared by every run of the process; it must cover at least one tick."""
+    key = (str(Path(path).resolve()), cache_dir)
+    if key not in _OPEN:
+        _OPEN[key] = LoadProfile(path, cache_dir)
+    return _OPEN[key].check_tick(minutes_per_tick)
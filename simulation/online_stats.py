@@ -0,0 +1,355 @@
+"""
+Constant-memory statistics of a simulation run.
+
+Both engines hand every tick's SoC, cloud coverage, load, grid flow and unmet
+load to a RunStats instead of appending them to history lists. Ticks are
+buffered in blocks of BLOCK and folded with NumPy into one StreamSummary per
+quantity:
+
+- count, mean (exact: the sum is kept as an integer, so it does not depend
+  on block boundaries or merge order), variance (Chan's parallel update),
+  min and max
+- a fixed-bin histogram over the quantity's range (histogram_ranges), with
+  under/overflow counts
+- a quantile sketch (compacting levels, deterministic) for percentiles
+
+Memory does not grow with the horizon or tick size. Summaries merge, so the
+members of an ensemble can be pooled without keeping their series:
+
+    pooled = merge_summaries(result.stats for result in runs)
+    pooled["soc"].quantile(0.05)
+
+Extra per-tick analyses plug in as collectors: any object with
+update(columns, start), called with every folded block ({quantity: array})
+and the index of its first tick. Call flush() at the end of a run before
+reading them; summaries() never needs it.
+"""
+
+import copy
+from fractions import Fraction
+
+import numpy as np
+
+from settings import resolve
+
+QUANTITIES = ("soc", "cloud", "load", "grid", "unmet")
+BLOCK = 4096                # ticks buffered before they are folded (as LOG_CHUNK_ROWS)
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Every finite double is an integer multiple of 2**-1074; frexp mantissas
+# carry 53 more bits.
+SUM_SHIFT = 1074 + 53
+
+
+def exact_sum(values):
+    """Sum of a float array as an integer multiple of 2**-SUM_SHIFT, without rounding."""
+    total = 0
+    for start in range(0, len(values), 1024):
+        frac, exp = np.frexp(values[start:start + 1024])
+        mant = np.ldexp(frac, 53).astype(np.int64)
+        order = np.argsort(exp, kind="stable")
+        exp, mant = exp[order], mant[order]
+        heads = np.flatnonzero(np.r_[True, exp[1:] != exp[:-1]])
+        # At most 1024 mantissas under 2**53 per exponent: no int64 overflow.
+        for e, s in zip(exp[heads].tolist(), np.add.reduceat(mant, heads).tolist()):
+            total += s << (e - 53 + SUM_SHIFT)
+    return total
+
+
+def histogram_ranges(cfg=None):
+    """(low, high) of the fixed histogram bins of every quantity."""
+    cfg = resolve(cfg)
+    power = float(max(cfg.SOLAR_PEAK, cfg.INVERTER_CLIPPING, cfg.BASE_LOAD))
+    return {
+        "soc": (0.0, 100.0),
+        "cloud": (0.0, 1.0),
+        "load": (0.0, power),
+        "grid": (-power, power),
+        "unmet": (0.0, power),
+    }
+
+
+class Histogram:
+    def __init__(self, lo, hi, bins):
+        self.edges = np.linspace(lo, hi, bins + 1)
+        self.counts = np.zeros(bins + 2, dtype=np.int64)    # [below, bins..., above]
+
+    def update(self, values):
+        idx = np.searchsorted(self.edges[:-1], values, side="right")
+        idx[values > self.edges[-1]] = len(self.edges)
+        self.counts += np.bincount(idx, minlength=len(self.counts))
+
+    def merge(self, other):
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Histograms with different bins cannot be merged")
+        self.counts += other.counts
+        return self
+
+    def to_dict(self):
+        return {
+            "edges": self.edges.tolist(),
+            "counts": self.counts[1:-1].tolist(),
+            "below": int(self.counts[0]),
+            "above": int(self.counts[-1]),
+        }
+
+
+class QuantileSketch:
+    """
+    Compacting quantile sketch (KLL-style). Level i holds items of weight
+    2**i; a full level is sorted and every other item moves up a level,
+    alternating the kept half so the result is deterministic and unbiased.
+    Holds about 3 * k items whatever the stream length; rank error ~ 1/k.
+    """
+
+    def __init__(self, k=200):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.offsets = [0]
+
+    def _capacity(self, level):
+        return max(8, int(self.k * (2 / 3) ** (len(self.levels) - 1 - level)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                    self.offsets.append(0)
+                items = np.sort(items)
+                odd = len(items) % 2
+                offset = self.offsets[level]
+                self.offsets[level] ^= 1
+                self.levels[level] = items[:odd]
+                self.levels[level + 1] = np.concatenate((self.levels[level + 1], items[odd + offset::2]))
+            level += 1
+
+    def update(self, values):
+        self.levels[0] = np.concatenate((self.levels[0], values))
+        self._compress()
+
+    def merge(self, other):
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+                self.offsets.append(0)
+            self.levels[level] = np.concatenate((self.levels[level], items))
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        items = np.concatenate(self.levels)
+        if not len(items):
+            return 0.0
+        weights = np.concatenate([np.full(len(level), 2 ** i) for i, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        cum = np.cumsum(weights[order])
+        idx = min(int(np.searchsorted(cum, q * cum[-1], side="left")), len(items) - 1)
+        return float(items[order][idx])
+
+
+class StreamSummary:
+    """Count, exact mean, variance, min/max, histogram and quantile sketch of one quantity."""
+
+    def __init__(self, lo, hi, bins=20, sketch_size=200):
+        self.count = 0
+        self._sum = 0
+        self._mean = 0.0            # running mean/M2 for the variance only
+        self._m2 = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.histogram = Histogram(lo, hi, bins)
+        self.sketch = QuantileSketch(sketch_size)
+
+    def _combine(self, n, total, mean, m2, lo, hi):
+        delta = mean - self._mean
+        count = self.count + n
+        self._mean += delta * n / count
+        self._m2 += m2 + delta * delta * self.count * n / count
+        self.count = count
+        self._sum += total
+        self.min = min(self.min, lo)
+        self.max = max(self.max, hi)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        if not len(values):
+            return
+        mean = float(values.mean())
+        self._combine(len(values), exact_sum(values), mean, float(((values - mean) ** 2).sum()),
+                      float(values.min()), float(values.max()))
+        self.histogram.update(values)
+        self.sketch.update(values)
+
+    def merge(self, other):
+        if other.count:
+            self._combine(other.count, other._sum, other._mean, other._m2, other.min, other.max)
+            self.histogram.merge(other.histogram)
+            self.sketch.merge(other.sketch)
+        return self
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+    @property
+    def total(self):
+        return float(Fraction(self._sum, 1 << SUM_SHIFT))
+
+    @property
+    def mean(self):
+        return float(Fraction(self._sum, self.count << SUM_SHIFT)) if self.count else 0.0
+
+    def var(self, ddof=0):
+        return self._m2 / (self.count - ddof) if self.count > ddof else 0.0
+
+    def std(self, ddof=0):
+        return self.var(ddof) ** 0.5
+
+    def quantile(self, q):
+        return self.sketch.quantile(q)
+
+    def to_dict(self, percentiles=PERCENTILES):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "std": self.std(),
+            "min": self.min,
+            "max": self.max,
+            **{f"p{q}": self.quantile(q / 100) for q in percentiles},
+            "histogram": self.histogram.to_dict(),
+        }
+
+    # ── Plain-value state (checkpoints) ──────────────────────────────────────
+    def state(self):
+        return {
+            "edges": [float(self.histogram.edges[0]), float(self.histogram.edges[-1]), len(self.histogram.edges) - 1],
+            "sketch_size": self.sketch.k,
+            "count": self.count, "sum": self._sum, "mean": self._mean, "m2": self._m2,
+            "min": self.min, "max": self.max,
+            "histogram": self.histogram.counts.tolist(),
+            "levels": [items.tolist() for items in self.sketch.levels],
+            "offsets": list(self.sketch.offsets),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        summary = cls(*state["edges"], state["sketch_size"])
+        summary.count, summary._sum = state["count"], state["sum"]
+        summary._mean, summary._m2 = state["mean"], state["m2"]
+        summary.min, summary.max = state["min"], state["max"]
+        summary.histogram.counts = np.array(state["histogram"], dtype=np.int64)
+        summary.sketch.levels = [np.array(items, dtype=float) for items in state["levels"]]
+        summary.sketch.offsets = list(state["offsets"])
+        return summary
+
+
+def merge_summaries(groups):
+    """Pools {quantity: StreamSummary} dicts (e.g. ensemble members) into new summaries."""
+    pooled = {}
+    for group in groups:
+        for name, summary in (group or {}).items():
+            if name in pooled:
+                pooled[name].merge(summary)
+            else:
+                pooled[name] = summary.copy()
+    return pooled
+
+
+class RunStats:
+    """
+    Per-tick statistics of one run: counters plus a StreamSummary of every
+    quantity in `track` (a subset of QUANTITIES; () keeps only the counters).
+    """
+
+    def __init__(self, cfg=None, track=QUANTITIES):
+        cfg = resolve(cfg)
+        ranges = histogram_ranges(cfg)
+        self.track = tuple(track)
+        self._summaries = {name: StreamSummary(*ranges[name], cfg.STATS_HISTOGRAM_BINS, cfg.STATS_SKETCH_SIZE)
+                           for name in self.track}
+        self.collectors = {}
+        self.full_hours = 0
+        self.empty_hours = 0
+        self.unmet_events = 0
+        self.folded = 0
+        self._buffer = []
+
+    @property
+    def ticks(self):
+        return self.folded + len(self._buffer)
+
+    def plug(self, name, collector):
+        """Adds a collector fed with every block folded from now on."""
+        self.collectors[name] = collector
+        return collector
+
+    def record(self, soc, cloud, load, grid, unmet):
+        self._buffer.append((soc, cloud, load, grid, unmet))
+        if len(self._buffer) >= BLOCK:
+            self.flush()
+
+    def extend(self, soc, cloud, load, grid, unmet):
+        """record() for whole series; blocks end on the same ticks as tick by tick."""
+        columns = np.column_stack([np.asarray(c, dtype=float) for c in (soc, cloud, load, grid, unmet)])
+        if not self.track and not self.collectors:
+            self.folded += len(columns)
+            return
+        i = 0
+        while i < len(columns):
+            if not self._buffer and len(columns) - i >= BLOCK:
+                self._fold(columns[i:i + BLOCK])
+                i += BLOCK
+                continue
+            take = BLOCK - len(self._buffer)
+            self._buffer.extend(map(tuple, columns[i:i + take].tolist()))
+            i += take
+            if len(self._buffer) >= BLOCK:
+                self.flush()
+
+    def flush(self):
+        """Folds the buffered ticks now (collectors only see folded blocks)."""
+        if self._buffer:
+            block = np.array(self._buffer, dtype=float)
+            self._buffer = []
+            self._fold(block)
+
+    def _fold(self, block):
+        columns = {name: block[:, i] for i, name in enumerate(QUANTITIES)}
+        for name, summary in self._summaries.items():
+            summary.update(columns[name])
+        for collector in self.collectors.values():
+            collector.update(columns, self.folded)
+        self.folded += len(block)
+
+    def summaries(self):
+        """{quantity: StreamSummary} including the buffered ticks; the run's own state is not touched."""
+        out = {name: s.copy() for name, s in self._summaries.items()}
+        if self._buffer and out:
+            block = np.array(self._buffer, dtype=float)
+            for i, name in enumerate(QUANTITIES):
+                if name in out:
+                    out[name].update(block[:, i])
+        return out
+
+    # ── Plain-value state (checkpoints) ──────────────────────────────────────
+    def state(self):
+        return {
+            "full_hours": self.full_hours, "empty_hours": self.empty_hours, "unmet_events": self.unmet_events,
+            "folded": self.folded,
+            "buffer": [list(row) for row in self._buffer],
+            "summaries": {name: s.state() for name, s in self._summaries.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state, cfg=None):
+        stats = cls(cfg, track=())
+        stats.full_hours, stats.empty_hours = state["full_hours"], state["empty_hours"]
+        stats.unmet_events, stats.folded = state["unmet_events"], state["folded"]
+        stats._buffer = [tuple(row) for row in state["buffer"]]
+        stats._summaries = {name: StreamSummary.from_state(s) for name, s in state["summaries"].items()}
+        stats.track = tuple(stats._summaries)
+        return stats
@@ -0,0 +1,360 @@
+"""
+Forecast-driven dispatch (PRIORITY_OPTIONS.OPTIMAL) for the Green Grid Digital Twin.
+
+Instead of a fixed ordering, the inverter picks the battery level at the end
+of each tick that maximizes this tick's grid revenue (EXPORT_COST per kWh
+exported within the monthly GRID_CONSTRAINT, minus IMPORT_COST per kWh
+imported, on the net flow of the tick) plus the value of the resulting
+battery level and remaining export allowance over a rolling horizon.
+
+That value comes from a backward dynamic program over the forecast of the
+next PLANNER_HORIZON_HOURS, on a grid of PLANNER_BATTERY_LEVELS battery
+levels x PLANNER_EXPORT_LEVELS remaining-export levels, with the monthly
+reset of the export allowance. The forecast is:
+
+- generation: today's drawn cloud coverage, then the seasonal expectation of
+  the weather model for later days (or the replayed weather, if any)
+- load: BASE_LOAD or the recorded profile
+
+The program is solved once per day, from the day's first tick, and does not
+depend on the battery or export state, so every tick of the day reuses it
+and only evaluates a handful of candidate levels against it (interpolating
+between grid points). Value tables are kept every few stages and the stages
+in between are recomputed on demand, so memory grows with the square root of
+the horizon.
+
+While a home's export allowance is used up and does not reset within the
+horizon, exporting is worthless and serving the load first (LOAD) is optimal,
+so the planner is not consulted (nor solved) at all. That covers most days
+with the default settings.
+
+The same code plans one inverter or a whole fleet. The program is solved
+per installation (capacity, PV peak, clipping, load scale), not per home:
+identical homes share one solution, and a fleet with more than
+PLANNER_FLEET_INSTALLATIONS distinct installations shares the solutions of
+that many representatives (k-means). Each home still picks its own move
+from its actual level, generation and load; only the value of the level it
+moves to is read from its representative's table (same Wh, clipped to that
+battery). Batteries are only charged from the panel.
+
+The objective is the net grid flow of each tick within the monthly export
+allowance. PRODUCE never draws that allowance down (its export is
+effectively unlimited), and with EXPORT_COST above IMPORT_COST exporting
+all generation while importing the load pays more, so PRODUCE can score
+above OPTIMAL.
+"""
+
+import math
+from datetime import datetime
+
+import numpy as np
+
+from settings import resolve
+from solar import Sun
+from recorder import to_minutes
+from load_profile import open_profile
+from weather_replay import open_replay
+
+DAY = 24 * 60
+
+
+def weather_outlook(month, cfg):
+    """(probability, mean cloud coverage) of each weather type of the weather model in `month`."""
+    season = "WINTER" if month in (12, 1, 2) else "SPRING" if month in (3, 4, 5) else "SUMMER" if month in (6, 7, 8) else "FALL"
+    weights = cfg.SEASON_PROBABILITY_FACTOR[season]
+    return [(w / sum(weights), sum(cfg.CLOUD_COVERAGE[t]) / 2) for w, t in zip(weights, cfg.WEATHER_TYPES)]
+
+
+def installations(params, limit):
+    """
+    (kind of every row, parameters of each kind) of the (rows, 4) array
+    `params`: its distinct rows, or `limit` k-means representatives when
+    there are more. Distances are relative to the mean of each column.
+    """
+    kinds, kind = np.unique(params, axis=0, return_inverse=True)
+    kind = kind.reshape(-1)
+    if len(kinds) <= limit:
+        return kind, kinds
+    scale = np.abs(params).mean(axis=0)
+    x = params / np.where(scale > 0, scale, 1.0)
+    # Farthest-point start, then Lloyd iterations.
+    centers = [x[0]]
+    distance = ((x - x[0]) ** 2).sum(axis=1)
+    for _ in range(limit - 1):
+        centers.append(x[int(np.argmax(distance))])
+        distance = np.minimum(distance, ((x - centers[-1]) ** 2).sum(axis=1))
+    centers = np.array(centers)
+    for _ in range(20):
+        kind = ((x[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+        counts = np.bincount(kind, minlength=limit)
+        moved = np.stack([np.bincount(kind, weights=x[:, c], minlength=limit) for c in range(x.shape[1])], axis=1)
+        moved = np.where(counts[:, None] > 0, moved / np.maximum(counts, 1)[:, None], centers)
+        if np.allclose(moved, centers):
+            break
+        centers = moved
+    _, kind = np.unique(kind, return_inverse=True)
+    kinds = np.stack([np.bincount(kind, weights=params[:, c]) for c in range(params.shape[1])], axis=1)
+    return kind.reshape(-1), kinds / np.bincount(kind)[:, None]
+
+
+def expected_cloud(month, cfg):
+    """Mean cloud coverage of the weather model in `month`."""
+    return sum(p * cloud for p, cloud in weather_outlook(month, cfg))
+
+
+class Forecast:
+    """Generation per W of peak and load per tick, as the planner sees them."""
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.tick = cfg.MINUTES_PER_TICK
+        self.start = to_minutes(datetime.strptime(cfg.DATE_OF_SIMULATION, "%d/%m/%Y"))
+        self.sun = Sun(cfg)
+        self.replay = open_replay(cfg.WEATHER_FILE, cfg.WEATHER_SITE, cfg.WEATHER_CACHE_DIR, cfg.MINUTES_PER_TICK) if cfg.WEATHER_FILE else None
+        self.profile = open_profile(cfg.LOAD_PROFILE, cfg.LOAD_PROFILE_CACHE_DIR, cfg.MINUTES_PER_TICK) if cfg.LOAD_PROFILE else None
+
+    def minutes(self, k0, ticks):
+        return self.start + (k0 + np.arange(ticks, dtype=np.int64)) * self.tick
+
+    def generation(self, k0, ticks, cloud_today):
+        """Wh per W of peak of `ticks` ticks from tick `k0` (today's coverage known)."""
+        h = self.tick / 60
+        sun, _ = self.sun.series((k0 + np.arange(ticks)) * h, self.start + k0 * self.tick)
+        if self.replay is not None:
+            cloud, irradiance = self.replay.window(self.start + k0 * self.tick, ticks, self.tick)
+            if irradiance is not None:
+                return np.maximum(0, irradiance / 1000) * h
+        else:
+            minutes = self.minutes(k0, ticks)
+            days = minutes // DAY
+            months = (days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64) % 12) + 1
+            expected = np.array([expected_cloud(m, self.cfg) for m in range(1, 13)])[months - 1]
+            cloud = np.where(days == days[0], cloud_today, expected)
+        return np.maximum(0, sun * (1 - cloud)) * h
+
+    def outlook(self, k0, ticks):
+        """
+        (probability, Wh per W of peak) of each weather type for `ticks` ticks
+        from tick `k0`, in the month of tick `k0`. A replayed window is the
+        only outcome.
+        """
+        if self.replay is not None:
+            return [(1.0, self.generation(k0, ticks, 0.0))]
+        h = self.tick / 60
+        sun, _ = self.sun.series((k0 + np.arange(ticks)) * h, self.start + k0 * self.tick)
+        month = int(np.datetime64(int(self.minutes(k0, 1)[0] // DAY), "D").astype("datetime64[M]").astype(np.int64) % 12) + 1
+        return [(p, np.maximum(0, sun * (1 - cloud)) * h) for p, cloud in weather_outlook(month, self.cfg)]
+
+    def load(self, k0, ticks):
+        if self.profile is not None:
+            return self.profile.window(self.start + k0 * self.tick, ticks, self.tick)
+        return np.full(ticks, float(self.cfg.BASE_LOAD))
+
+    def resets(self, k0, ticks):
+        """True for the ticks that start a month (export allowance reset)."""
+        minutes = self.minutes(k0, ticks)
+        days = (minutes // DAY).astype("datetime64[D]")
+        return (minutes % DAY == 0) & (days == days.astype("datetime64[M]").astype("datetime64[D]"))
+
+    def next_reset(self, k):
+        """Index of the first tick after tick `k` that starts a month."""
+        minute = self.start + k * self.tick
+        day = np.datetime64(minute // DAY, "D")
+        month_start = (day.astype("datetime64[M]") + 1).astype("datetime64[D]").astype(np.int64) * DAY
+        return k + math.ceil((month_start - minute) / self.tick)
+
+
+class DispatchPlanner:
+    def __init__(self, capacity, solar_peak, clipping, load_scale=1.0, cfg=None, forecast_cfg=None):
+        cfg = resolve(cfg)
+        self.cfg = cfg
+        self.forecast = Forecast(forecast_cfg if forecast_cfg is not None else cfg)
+        self.capacity, self.solar_peak, self.clipping, self.load_scale = (
+            np.array(a, dtype=float) for a in np.broadcast_arrays(
+                np.atleast_1d(np.asarray(capacity, dtype=float)), solar_peak, clipping, load_scale))
+        self.rte = cfg.ROUND_TRIP_EFFICIENCY
+        self.import_cost = cfg.IMPORT_COST / 1000
+        self.export_cost = cfg.EXPORT_COST / 1000
+        self.export_cap = float(cfg.GRID_CONSTRAINT)
+
+        tick = self.forecast.tick
+        self.per_day = DAY // tick
+        self.ticks = max(round(cfg.PLANNER_HORIZON_HOURS * 60 / tick), self.per_day + 1)
+        self.stride = max(1, int(math.sqrt(self.ticks)))
+
+        nb, ne = cfg.PLANNER_BATTERY_LEVELS, cfg.PLANNER_EXPORT_LEVELS
+        if nb < 2 or ne < 2:
+            raise ValueError("PLANNER_BATTERY_LEVELS and PLANNER_EXPORT_LEVELS must be at least 2")
+        fractions = np.linspace(0.0, 1.0, nb)
+        self.levels = self.capacity[:, None] * fractions[None, :]                            # (homes, nb)
+        self.db = self.capacity / (nb - 1)
+        self.allowance = np.linspace(0.0, self.export_cap, ne)                                # (ne,)
+        self.de = self.export_cap / (ne - 1) if self.export_cap > 0 else 1.0
+
+        # The program is solved per installation kind; kind[home] picks its tables.
+        self.kind, kinds = installations(
+            np.stack([self.capacity, self.solar_peak, self.clipping, self.load_scale], axis=1),
+            max(1, cfg.PLANNER_FLEET_INSTALLATIONS))
+        self.kind_capacity, self.kind_peak, self.kind_clipping, self.kind_scale = (
+            np.ascontiguousarray(column) for column in kinds.T)
+        kind_levels = self.kind_capacity[:, None] * fractions[None, :]                       # (kinds, nb)
+        # Battery change i -> j and the bus energy it takes (charge) or gives (discharge).
+        self.delta = kind_levels[:, None, :] - kind_levels[:, :, None]                       # (kinds, i, j)
+        self.flow = np.where(self.delta > 0, self.delta / self.rte, self.delta * self.rte)
+        self.kind_levels = kind_levels
+        self.columns = np.arange(nb)
+
+        self.day = None
+        self.reset_day = None
+
+    def __len__(self):
+        return len(self.capacity)
+
+    # ── Plan ─────────────────────────────────────────────────────────────────
+    def needed(self, k, export_left):
+        """Homes for which the plan matters at tick `k` (export still worth something)."""
+        k0 = self.first(k)
+        if self.reset_day is None or self.reset_day[0] != k0:
+            self.reset_day = (k0, self.forecast.next_reset(k0) <= k0 + self.ticks)
+        if self.reset_day[1]:
+            return np.ones(len(self), dtype=bool)
+        return np.atleast_1d(export_left) > 0
+
+    def first(self, k):
+        """First tick of the day of tick `k`."""
+        return k - ((self.forecast.start + k * self.forecast.tick) % DAY) // self.forecast.tick
+
+    def solve(self, k0, cloud_today):
+        unit = self.forecast.generation(k0, self.ticks, cloud_today)
+        self.gen = np.minimum(self.kind_peak[:, None] * unit[None, :], self.kind_clipping[:, None])
+        self.load = self.kind_scale[:, None] * self.forecast.load(k0, self.ticks)[None, :]
+        self.reset = self.forecast.resets(k0, self.ticks + 1)
+
+        # Stored energy ends up covering load. Allowance left at the horizon
+        # is worth the full export price on the surplus the battery cannot
+        # take (spilled once the allowance runs out) expected on the days
+        # before the next reset, averaged over the weather types of the month.
+        days_left = max(0, self.forecast.next_reset(k0 + self.ticks - 1) - (k0 + self.ticks)) / self.per_day
+        load = self.load[:, -self.per_day:]
+        spare = 0.0
+        for p, unit in self.forecast.outlook(k0 + self.ticks - self.per_day, self.per_day):
+            gen = np.minimum(self.kind_peak[:, None] * unit[None, :], self.kind_clipping[:, None])
+            surplus = np.maximum(gen - load, 0).sum(axis=1)
+            deficit = np.maximum(load - gen, 0).sum(axis=1)
+            spare = spare + p * np.maximum(0.0, surplus - np.minimum(self.kind_capacity, deficit / self.rte) / self.rte)
+        terminal = (self.import_cost * self.rte * self.kind_levels[:, None, :]
+                    + self.export_cost * np.minimum(self.allowance[None, :, None], (spare * days_left)[:, None, None]))
+        if self.reset[self.ticks]:
+            terminal = np.broadcast_to(terminal[:, -1:, :], terminal.shape).copy()
+
+        self.day = k0
+        self.saved = {self.ticks: terminal}
+        value = terminal
+        for s in range(self.ticks - 1, -1, -1):
+            value = self._stage(s, value)
+            if s % self.stride == 0:
+                self.saved[s] = value
+        self.segment = {}
+
+    def _stage(self, s, after):
+        """Value of every (allowance, level) state at stage `s` of every kind, given the values after it."""
+        kinds, ne, nb = after.shape
+        x = (self.gen[:, s] - self.load[:, s])[:, None, None] - self.flow                     # (kinds, i, j)
+        feasible = self.delta <= (self.rte * self.gen[:, s])[:, None, None]
+        exported = np.clip(x[:, None], 0.0, self.allowance[None, :, None, None])             # (kinds, e, i, j)
+        reward = self.export_cost * exported - (self.import_cost * np.maximum(-x, 0.0))[:, None]
+
+        pos = (self.allowance[None, :, None, None] - exported) / self.de
+        low = np.minimum(pos.astype(np.int64), ne - 2)
+        frac = pos - low
+        flat = after.reshape(kinds, ne * nb)
+        index = (low * nb + self.columns).reshape(kinds, -1)
+        lo = np.take_along_axis(flat, index, 1).reshape(pos.shape)
+        hi = np.take_along_axis(flat, index + nb, 1).reshape(pos.shape)
+
+        value = np.where(feasible[:, None], reward + lo + frac * (hi - lo), -np.inf).max(axis=3)
+        if self.reset[s]:
+            value = np.broadcast_to(value[:, -1:, :], value.shape).copy()
+        return value
+
+    def value(self, s):
+        """Value table of stage `s`, recomputing its segment from the nearest saved stage."""
+        if s in self.saved:
+            return self.saved[s]
+        if s not in self.segment:
+            top = min(-(-s // self.stride) * self.stride, self.ticks)
+            value = self.saved[top]
+            self.segment = {}
+            for t in range(top - 1, top - self.stride, -1):
+                value = self._stage(t, value)
+                self.segment[t] = value
+        return self.segment[s]
+
+    # ── Dispatch ─────────────────────────────────────────────────────────────
+    def step(self, k, level, export_left, generation, load, cloud_today):
+        """
+        Battery change (Wh, + charge / - discharge) for tick `k`, given the
+        battery level, remaining export allowance, and this tick's
+        generation (after clipping) and load of every home.
+        """
+        k0 = self.first(k)
+        if self.day != k0:
+            self.solve(k0, cloud_today)
+        after = self.value(k - k0 + 1)
+        _, ne, nb = after.shape
+        rte = self.rte
+
+        level, export_left = np.asarray(level, dtype=float), np.asarray(export_left, dtype=float)
+        net = generation - load
+        top = np.minimum(self.capacity, level + rte * generation)
+        candidates = np.concatenate([
+            np.stack([level, top, level + net * rte, level + net / rte,
+                      level + (net - export_left) * rte, level + (net - export_left) / rte], axis=1),
+            self.levels], axis=1)
+        candidates = np.clip(candidates, 0.0, top[:, None])
+
+        delta = candidates - level[:, None]
+        x = net[:, None] - np.where(delta > 0, delta / rte, delta * rte)
+        exported = np.clip(x, 0.0, export_left[:, None])
+        reward = self.export_cost * exported - self.import_cost * np.maximum(-x, 0.0)
+
+        pe = np.clip((export_left[:, None] - exported) / self.de, 0, ne - 1)
+        db = (self.kind_capacity / (nb - 1))[self.kind][:, None]
+        pb = np.divide(candidates, db, out=np.zeros_like(candidates), where=db > 0)
+        pb = np.clip(pb, 0, nb - 1)
+        e0 = np.minimum(pe.astype(np.int64), ne - 2)
+        b0 = np.minimum(pb.astype(np.int64), nb - 2)
+        fe, fb = pe - e0, pb - b0
+        flat = after.reshape(len(after), ne * nb)
+        kind = self.kind[:, None]
+
+        def at(e, b):
+            # Value of the same stored energy in the table of the home's kind.
+            return flat[kind, e * nb + b]
+
+        future = ((1 - fe) * ((1 - fb) * at(e0, b0) + fb * at(e0, b0 + 1))
+                  + fe * ((1 - fb) * at(e0 + 1, b0) + fb * at(e0 + 1, b0 + 1)))
+        # On (near) ties do what LOAD would: serve the load from the battery,
+        # store the surplus.
+        serve = np.clip(np.where(net > 0, level + net * rte, level + net / rte), 0.0, top)
+        best = np.argmax(reward + future - 1e-9 * np.abs(candidates - serve[:, None]), axis=1)
+        change = np.take_along_axis(delta, best[:, None], 1)[:, 0]
+        return np.where(np.abs(change) > 0.001, change, 0.0)
+
+
+def dispatch(change, generation, load, export_left, rte):
+    """
+    Grid flow and spilled energy of one home's tick once the battery has
+    changed by `change`: the net surplus is exported up to the allowance and
+    the rest spilled; a net deficit is imported.
+    """
+    if change > 0:
+        net = generation - load - change / rte
+    elif change < 0:
+        net = generation - load - change * rte
+    else:
+        net = generation - load
+    if net > 0:
+        export = min(export_left, net)
+        return export, net - export
+    return net, 0.0
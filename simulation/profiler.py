@@ -0,0 +1,93 @@
+"""
+Hot-path profiling for the Green Grid Digital Twin.
+
+With PROFILER enabled, Simulate and the batch engine charge the wall time of
+each stage of a run (weather, panel, home, inverter dispatch, SimPy container
+put/get, stats, log writing, SimPy scheduling) to a named counter, together
+with the number of calls. Timed calls made inside another timed call are
+counted under it (`inverter.update/battery.put`), so the report shows where
+the time of each stage goes.
+
+The engines read `PROFILER.enabled` once per run and only then wrap their
+components, so with profiling off the hot path costs one boolean test per
+SimPy step.
+"""
+
+from time import perf_counter
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.stages = {}
+        self.path = ""
+        self.started = perf_counter()
+
+    def configure(self, enabled=False):
+        """Turns profiling on or off and clears the counters."""
+        self.enabled = enabled
+        self.stages = {}
+        self.path = ""
+        self.started = perf_counter()
+
+    def add(self, stage, seconds, calls=1):
+        entry = self.stages.get(stage)
+        if entry is None:
+            self.stages[stage] = [calls, seconds]
+        else:
+            entry[0] += calls
+            entry[1] += seconds
+
+    def lap(self, stage, start):
+        """Charges the time since `start` to `stage` and returns the current time."""
+        end = perf_counter()
+        self.add(stage, end - start)
+        return end
+
+    def timed(self, fn, stage):
+        """
+        `fn` charging its calls to `stage`, nested under whatever timed call
+        is running (so the same method is split by caller).
+        """
+        def timed(*args, **kwargs):
+            parent = self.path
+            self.path = name = f"{parent}/{stage}" if parent else stage
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(name, perf_counter() - start)
+                self.path = parent
+
+        return timed
+
+    def wrap(self, obj, method, stage):
+        """Times every call of `obj.method`; other instances are not affected."""
+        setattr(obj, method, self.timed(getattr(obj, method), stage))
+
+    def report(self):
+        """
+        Table of calls, total and per-call time and share of the wall time
+        since configure(), slowest stage first, nested stages indented under
+        their parent.
+        """
+        wall = perf_counter() - self.started
+        lines = [f"{'Stage':<40}{'Calls':>11}{'Total s':>10}{'us/call':>10}{'% wall':>8}"]
+
+        def walk(parent, depth):
+            children = [s for s in self.stages if s.rpartition("/")[0] == parent]
+            for name in sorted(children, key=lambda s: -self.stages[s][1]):
+                calls, seconds = self.stages[name]
+                label = "  " * depth + name.rpartition("/")[2]
+                lines.append(f"{label:<40}{calls:>11,}{seconds:>10.3f}{seconds / calls * 1e6:>10.2f}"
+                             f"{100 * seconds / wall if wall else 0:>8.1f}")
+                walk(name, depth + 1)
+
+        walk("", 0)
+        other = wall - sum(seconds for s, (_, seconds) in self.stages.items() if "/" not in s)
+        lines.append(f"{'(untracked)':<40}{'':>11}{other:>10.3f}{'':>10}{100 * other / wall if wall else 0:>8.1f}")
+        lines.append(f"{'Wall time':<40}{'':>11}{wall:>10.3f}")
+        return "\n".join(lines)
+
+
+PROFILER = Profiler()
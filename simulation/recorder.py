@@ -0,0 +1,175 @@
+"""
+Columnar per-tick log for the Green Grid Digital Twin.
+
+Rows are kept as typed columns (array module) instead of formatted dicts.
+With a path, full chunks are written out while the simulation runs and the
+buffers are emptied, so memory stays flat for any horizon. Without a path
+everything stays in memory for later analysis.
+
+Output formats, picked by extension:
+- ".csv": same columns and formatting as the original Monthly_Summary.csv
+- anything else: binary columnar file, read back with read_columnar()
+"""
+
+import csv
+import json
+import sys
+from array import array
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+
+# (name, array typecode) in file order. Timestamp is minutes since EPOCH.
+COLUMNS = (
+    ("Timestamp", "q"),
+    ("Solar_Wh", "d"),
+    ("House_Load_Wh", "d"),
+    ("SoC_%", "d"),
+    ("Grid_Net_Wh", "d"),
+    ("Cloud_Cov", "d"),
+    ("Inverter_OK", "b"),
+)
+
+MAGIC = b"GGCOL1\n"
+
+
+def to_minutes(dt):
+    return (dt - EPOCH) // timedelta(minutes=1)
+
+
+class Recorder:
+    def __init__(self, path=None, chunk_rows=4096):
+        self.path = Path(path) if path else None
+        self.chunk_rows = chunk_rows
+        self.buffers = [array(code) for _, code in COLUMNS]
+        self.rows_written = 0
+        self._file = None
+        self._writer = None
+
+    def __len__(self):
+        return self.rows_written + len(self.buffers[0])
+
+    def record(self, minute, solar, load, soc, grid_net, cloud, ok):
+        """Appends one tick. `minute` is minutes since EPOCH (see to_minutes)."""
+        b = self.buffers
+        b[0].append(minute)
+        b[1].append(solar)
+        b[2].append(load)
+        b[3].append(soc)
+        b[4].append(grid_net)
+        b[5].append(cloud)
+        b[6].append(ok)
+        if self.path is not None and len(b[0]) >= self.chunk_rows:
+            self.flush()
+
+    def extend(self, minutes, solar, load, soc, grid_net, cloud, ok):
+        """Appends a whole block of ticks given as sequences or NumPy arrays."""
+        series = [np.asarray(c, dtype=code) for c, (_, code) in
+                  zip((minutes, solar, load, soc, grid_net, cloud, ok), COLUMNS)]
+        step = self.chunk_rows if self.path is not None else max(1, len(series[0]))
+        for start in range(0, len(series[0]), step):
+            for buf, values in zip(self.buffers, series):
+                buf.frombytes(values[start:start + step].tobytes())
+            if self.path is not None and len(self.buffers[0]) >= self.chunk_rows:
+                self.flush()
+
+    def flush(self):
+        if self.path is None or not len(self.buffers[0]):
+            return
+        if self._file is None:
+            self._open()
+        n = len(self.buffers[0])
+        if self._writer is not None:
+            self._write_csv([np.frombuffer(buf, dtype=code).copy() for buf, (_, code) in zip(self.buffers, COLUMNS)])
+        else:
+            self._file.write(np.uint32(n).tobytes())
+            for buf in self.buffers:
+                self._file.write(buf.tobytes())
+        self.rows_written += n
+        for buf in self.buffers:
+            del buf[:]
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self):
+        if self.path.suffix == ".csv":
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow([name for name, _ in COLUMNS])
+        else:
+            self._file = open(self.path, "wb")
+            header = json.dumps({"byteorder": sys.byteorder, "columns": [[name, code] for name, code in COLUMNS]})
+            self._file.write(MAGIC + header.encode("utf-8") + b"\n")
+
+    def _write_csv(self, cols):
+        stamps = np.datetime_as_string(cols[0].astype("datetime64[m]"))
+        text = [[f"{v:.2f}" for v in c.tolist()] for c in cols[1:6]]
+        ok = ["True" if v else "False" for v in cols[6].tolist()]
+        self._writer.writerows(
+            (s.replace("T", " "), *vals, o) for s, *vals, o in zip(stamps.tolist(), *text, ok)
+        )
+
+    def columns(self):
+        """In-memory columns as NumPy arrays (only rows not yet flushed to disk)."""
+        return {name: np.frombuffer(buf, dtype=code).copy() for buf, (name, code) in zip(self.buffers, COLUMNS)}
+
+    def rows(self):
+        """In-memory rows formatted like the original per-tick log dicts."""
+        for m, solar, load, soc, grid_net, cloud, ok in zip(*(buf.tolist() for buf in self.buffers)):
+            yield {
+                "Timestamp": (EPOCH + timedelta(minutes=m)).strftime("%Y-%m-%d %H:%M"),
+                "Solar_Wh": f"{solar:.2f}",
+                "House_Load_Wh": f"{load:.2f}",
+                "SoC_%": f"{soc:.2f}",
+                "Grid_Net_Wh": f"{grid_net:.2f}",
+                "Cloud_Cov": f"{cloud:.2f}",
+                "Inverter_OK": bool(ok),
+            }
+
+
+def read_columnar(path):
+    """Loads a binary columnar log into a dict of NumPy arrays."""
+    with open(path, "rb") as f:
+        if f.readline() != MAGIC:
+            raise ValueError(f"{path} is not a columnar simulation log")
+        header = json.loads(f.readline())
+        order = "<" if header["byteorder"] == "little" else ">"
+        columns = header["columns"]
+        chunks = {name: [] for name, _ in columns}
+        while True:
+            size = f.read(4)
+            if not size:
+                break
+            n = int(np.frombuffer(size, dtype=order + "u4")[0])
+            for name, code in columns:
+                dtype = np.dtype(code).newbyteorder(order)
+                chunks[name].append(np.frombuffer(f.read(n * dtype.itemsize), dtype=dtype))
+    return {name: np.concatenate(parts) if parts else np.array([], dtype=code)
+            for (name, code), parts in zip(columns, chunks.values())}
+
+
+def read_csv(path):
+    """Loads a CSV log written by Recorder into a dict of NumPy arrays (values as rounded in the file)."""
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        if next(reader, None) != [name for name, _ in COLUMNS]:
+            raise ValueError(f"{path} is not a simulation log")
+        rows = list(reader)
+    stamps = np.array([row[0].replace(" ", "T") for row in rows], dtype="datetime64[m]")
+    columns = {"Timestamp": stamps.astype(np.int64)}
+    for i, (name, code) in enumerate(COLUMNS[1:6], start=1):
+        columns[name] = np.array([row[i] for row in rows], dtype=code)
+    columns["Inverter_OK"] = np.array([row[6] == "True" for row in rows], dtype="b")
+    return columns
+
+
+def read_log(path):
+    """Loads a CSV or binary columnar log, picked by extension like Recorder."""
+    return read_csv(path) if Path(path).suffix == ".csv" else read_columnar(path)
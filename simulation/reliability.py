@@ -0,0 +1,168 @@
+"""
+Component outages of the Green Grid Digital Twin.
+
+Every component in OUTAGE_MODELS has the same failure model: while it is
+up, it fails at the start of a day with a fixed probability, and is repaired
+after a whole number of hours drawn uniformly from its duration range
+(settings in SETTINGS). What an outage does to the dispatch:
+
+- inverter: PV and battery are offline and the whole load is imported
+- battery: the battery is isolated and holds its level; the home runs as if
+  it had none (OPTIMAL falls back to the LOAD rules)
+- grid: nothing can be imported or exported; surplus PV is stored or spilled
+  and load the home cannot cover itself is shed
+
+The daily checks draw from the run's random stream right after the day's
+weather, in the order of OUTAGE_MODELS. A model with probability 0 draws
+nothing. SimPy runs draw on demand (Reliability) and hand each inverter
+outage window to system.Simulate as one event span. The batch and fleet
+engines pre-sample the spans of the whole horizon (OutageSchedule,
+sample_fleet), so they only do reliability work at span edges.
+"""
+
+import numpy as np
+
+from telemetry import TRACER, INFO
+
+OUTAGE_MODELS = ("inverter", "battery", "grid")
+
+# (daily probability, min hours, max hours) settings of each model.
+SETTINGS = {
+    "inverter": ("INVERTER_FAIL_PROB", "MIN_INVERTER_FAIL_DURATION", "MAX_INVERTER_FAIL_DURATION"),
+    "battery": ("BATTERY_FAULT_PROB", "MIN_BATTERY_FAULT_DURATION", "MAX_BATTERY_FAULT_DURATION"),
+    "grid": ("GRID_OUTAGE_PROB", "MIN_GRID_OUTAGE_DURATION", "MAX_GRID_OUTAGE_DURATION"),
+}
+
+
+def span_ticks(duration, h):
+    """Ticks an outage of `duration` hours lasts (same rounding as counting it down tick by tick)."""
+    ticks = 0
+    while True:
+        ticks += 1
+        duration -= h
+        if duration <= 0:
+            return ticks
+
+
+class Outage:
+    """Failure state and counters of one component."""
+
+    def __init__(self, name, cfg):
+        self.name = name
+        self.prob, self.min_hours, self.max_hours = (getattr(cfg, setting) for setting in SETTINGS[name])
+        self.is_down = False
+        self.remaining = 0
+        self.count = 0
+        self.downtime = 0
+
+    def check(self, rng):
+        """Daily failure check. True when the component fails now."""
+        if self.is_down or self.prob <= 0 or not rng.random() < self.prob:
+            return False
+        self.is_down = True
+        self.count += 1
+        self.remaining = rng.randint(self.min_hours, self.max_hours)
+        return True
+
+    def advance(self, h):
+        """Counts one tick of downtime. True once the component is repaired."""
+        self.downtime += h
+        self.remaining -= h
+        if self.remaining <= 0:
+            self.is_down = False
+            self.remaining = 0
+            return True
+        return False
+
+    def state(self):
+        return {"is_down": self.is_down, "remaining": self.remaining, "count": self.count, "downtime": self.downtime}
+
+    def load(self, state):
+        self.is_down, self.remaining = state["is_down"], state["remaining"]
+        self.count, self.downtime = state["count"], state["downtime"]
+
+
+class Reliability:
+    """
+    On-demand outages of a SimPy run: day() draws the failures of a new day,
+    advance() counts down the components that are down. Ticks with every
+    component up cost nothing.
+    """
+
+    def __init__(self, outages, rng):
+        self.outages = outages
+        self.rng = rng
+        self.down = [outage for outage in outages if outage.is_down]
+
+    def day(self, now):
+        for outage in self.outages:
+            if outage.check(self.rng):
+                self.down.append(outage)
+                if TRACER.info:
+                    TRACER.emit(INFO, now, outage.name, "failure", duration_h=outage.remaining)
+
+    def advance(self, h, now):
+        for outage in list(self.down):
+            if outage.advance(h):
+                self.down.remove(outage)
+                if TRACER.info:
+                    TRACER.emit(INFO, now, outage.name, "repaired", total_downtime_h=outage.downtime)
+
+
+class OutageSchedule:
+    """
+    Outage spans of a whole horizon of `n` ticks, drawn day by day before
+    the dispatch runs (batch engine). spans[name] holds (first, end) tick
+    pairs; `end` may lie past the horizon.
+    """
+
+    def __init__(self, n, h, cfg):
+        self.n, self.h = n, h
+        self.outages = {name: Outage(name, cfg) for name in OUTAGE_MODELS}
+        self.spans = {name: [] for name in OUTAGE_MODELS}
+
+    def day(self, s, rng, now):
+        """Draws the failures of the day starting at tick `s`."""
+        for name, outage in self.outages.items():
+            spans = self.spans[name]
+            if outage.is_down and s >= spans[-1][1]:
+                outage.is_down = False
+            if not outage.check(rng):
+                continue
+            end = s + span_ticks(outage.remaining, self.h)
+            spans.append((s, end))
+            if TRACER.info:
+                TRACER.emit(INFO, now, name, "failure", duration_h=outage.remaining)
+            for _ in range(min(end, self.n) - s):
+                outage.downtime += self.h
+
+    def mask(self, name, repaired=False):
+        """Per-tick down flags; with `repaired` the last tick of each span counts as up."""
+        down = np.zeros(self.n, dtype=bool)
+        for first, end in self.spans[name]:
+            down[first:end - 1 if repaired else end] = True
+        return down
+
+
+def sample_fleet(day_starts, n, h, homes, rng, cfg):
+    """
+    Outage spans of `homes` independent homes, drawn per day from the NumPy
+    generator `rng`. Returns {name: (home, first, end)} arrays, one entry
+    per outage, in the order they were drawn.
+    """
+    models = {name: tuple(getattr(cfg, setting) for setting in SETTINGS[name]) for name in OUTAGE_MODELS}
+    models = {name: model for name, model in models.items() if model[0] > 0}
+    spans = {name: ([], [], []) for name in OUTAGE_MODELS}
+    ends = {name: np.zeros(homes, dtype=np.int64) for name in models}
+    for k in day_starts:
+        for name, (prob, lo, hi) in models.items():
+            new = (k >= ends[name]) & (rng.random(homes) < prob)
+            if new.any():
+                hours = rng.integers(lo, hi + 1, int(new.sum()))
+                who = np.flatnonzero(new)
+                ends[name][who] = k + np.ceil(hours / h).astype(np.int64)
+                spans[name][0].append(who)
+                spans[name][1].append(np.full(len(who), k))
+                spans[name][2].append(ends[name][who])
+    return {name: tuple(np.concatenate(part) if part else np.zeros(0, dtype=np.int64) for part in parts)
+            for name, parts in spans.items()}
@@ -0,0 +1,151 @@
+"""
+Typed result of one simulation run.
+
+Holds the scalar metrics of a scenario plus its per-tick series as NumPy
+arrays, so analyses work on numbers instead of re-parsing formatted log rows.
+Metrics can still be read like a dict (result['net_balance']).
+"""
+
+import numpy as np
+
+from tariffs import Usage, bill_many
+
+# Upper edges of the cloud-coverage bins used in the report.
+CLOUD_BINS = (
+    ("CLEAR(0.0-0.2)", 0.2),
+    ("PARTLY_CLOUDY(0.2-0.6)", 0.6),
+    ("MOSTLY_CLOUDY(0.6-0.8)", 0.8),
+    ("OVERCAST(0.8-1.0)", float("inf")),
+)
+
+WEEKDAYS = ("MON", "TUE", "WED", "THU", "FRI", "SAT", "SUN")
+
+
+class ScenarioResult:
+    def __init__(self, metrics, columns=None, stats=None):
+        self.metrics = metrics
+        self.columns = columns or {}
+        # {quantity: online_stats.StreamSummary}; kept when the columns are not.
+        self.stats = stats or {}
+
+    # ── Metric access ────────────────────────────────────────────────────────
+    def __getitem__(self, key):
+        return self.metrics[key]
+
+    def __contains__(self, key):
+        return key in self.metrics
+
+    def keys(self):
+        return self.metrics.keys()
+
+    def items(self):
+        return self.metrics.items()
+
+    def to_dict(self):
+        return dict(self.metrics)
+
+    def distributions(self):
+        """Mean, std, min/max, percentiles and histogram of every tracked per-tick quantity."""
+        return {name: summary.to_dict() for name, summary in self.stats.items()}
+
+    def bills(self, tariffs):
+        """Bills of this run under `tariffs` ([tariffs.Tariff]), from its grid series (see tariffs.py)."""
+        return bill_many(Usage.from_columns(self.columns), tariffs)
+
+    # ── Per-tick series ──────────────────────────────────────────────────────
+    def __len__(self):
+        return len(self.columns.get("Solar_Wh", ()))
+
+    @property
+    def timestamps(self):
+        return self.columns["Timestamp"].astype("datetime64[m]")
+
+    @property
+    def solar_wh(self):
+        return self.columns["Solar_Wh"]
+
+    @property
+    def load_wh(self):
+        return self.columns["House_Load_Wh"]
+
+    @property
+    def soc(self):
+        return self.columns["SoC_%"]
+
+    @property
+    def grid_net_wh(self):
+        return self.columns["Grid_Net_Wh"]
+
+    @property
+    def grid_import_wh(self):
+        return np.maximum(0.0, -self.grid_net_wh)
+
+    @property
+    def grid_export_wh(self):
+        return np.maximum(0.0, self.grid_net_wh)
+
+    @property
+    def cloud(self):
+        return self.columns["Cloud_Cov"]
+
+    @property
+    def inverter_ok(self):
+        return self.columns["Inverter_OK"].astype(bool)
+
+    @property
+    def hour(self):
+        return (self.columns["Timestamp"] // 60) % 24
+
+    @property
+    def weekday(self):
+        # 1970-01-01 was a Thursday.
+        return (self.columns["Timestamp"] // (24 * 60) + 3) % 7
+
+    # ── Group-by ─────────────────────────────────────────────────────────────
+    def group_by(self, groups, labels, series=None):
+        """
+        Averages `series` ({name: array}) over ticks grouped by the integer
+        array `groups` (0..len(labels)-1). Returns {label: {'ticks': n, name: mean}}.
+        """
+        if series is None:
+            series = {
+                "solar_wh": self.solar_wh,
+                "load_wh": self.load_wh,
+                "grid_import_wh": self.grid_import_wh,
+                "grid_export_wh": self.grid_export_wh,
+                "soc_percent": self.soc,
+            }
+        counts = np.bincount(groups, minlength=len(labels))
+        sums = {name: np.bincount(groups, weights=values, minlength=len(labels)) for name, values in series.items()}
+        out = {}
+        for i, label in enumerate(labels):
+            out[label] = {"ticks": int(counts[i])}
+            if counts[i]:
+                out[label].update({name: float(s[i] / counts[i]) for name, s in sums.items()})
+        return out
+
+    def cloud_bins(self, bins=CLOUD_BINS):
+        edges = np.array([edge for _, edge in bins[:-1]])
+        return self.group_by(np.searchsorted(edges, self.cloud, side="right"), [label for label, _ in bins])
+
+    def by_hour(self):
+        return self.group_by(self.hour, list(range(24)))
+
+    def by_weekday(self):
+        return self.group_by(self.weekday, WEEKDAYS)
+
+    def cloud_impact(self):
+        """Cloud-bin summary in the layout of the sym_results report."""
+        summary = {}
+        for label, g in self.cloud_bins(bins=CLOUD_BINS).items():
+            if not g["ticks"]:
+                summary[label] = {"hours": 0}
+                continue
+            summary[label] = {
+                "hours": g["ticks"],
+                "avg_solar_wh_per_h": g["solar_wh"],
+                "avg_grid_import_wh_per_h": g["grid_import_wh"],
+                "avg_grid_export_wh_per_h": g["grid_export_wh"],
+                "avg_soc_percent": g["soc_percent"],
+            }
+        return summary
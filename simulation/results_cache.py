@@ -0,0 +1,171 @@
+"""
+On-disk cache of scenario results for the Green Grid Digital Twin.
+
+A scenario is fully determined by its effective configuration, strategy,
+seed, start date and horizon, plus the code and input files that turn them
+into numbers. Their SHA-256 is the key of a pickled ScenarioResult (metrics,
+per-tick statistics and, when it was logged, the per-tick columns) in
+RESULTS_CACHE_DIR, so
+sym_results.py, compare_strats.py and a seeded system.py run only simulate
+what they have not seen before.
+
+Settings that only change how a run is computed or reported (engine, storage
+backend, tracing, log file, cache locations) are left out of the key: both
+engines give identical results. Any edit to a source file of the simulation
+changes the code version and so every key.
+
+Hits refresh the file's modification time; when the cache grows past
+RESULTS_CACHE_MAX_MB the least recently used entries are deleted. Entries
+are written to a temporary file and renamed, so worker processes can share
+the directory.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from enum import Enum
+from functools import lru_cache
+from pathlib import Path
+
+from results import ScenarioResult
+
+SIM_DIR = Path(__file__).resolve().parent
+
+# Settings that do not change the numbers of a run.
+NEUTRAL = frozenset((
+    "SIMULATION_ENGINE", "STORAGE_BACKEND",
+    "TRACE_LEVEL", "TRACE_SAMPLE_EVERY", "TRACE_FILE",
+    "LOG_FILE", "LOG_CHUNK_ROWS",
+    "LOAD_PROFILE_CACHE_DIR", "WEATHER_CACHE_DIR",
+    "RESULTS_CACHE_DIR", "RESULTS_CACHE_MAX_MB",
+    "LIVE_LOOKAHEAD_HOURS", "LIVE_LISTEN", "LIVE_POLL_SECONDS",
+    "SURROGATE_SAMPLES", "SURROGATE_MEMBERS", "SURROGATE_RANGES",
+    "TARIFFS",
+))
+
+
+@lru_cache(maxsize=1)
+def code_version():
+    """Hash of every Python source of the simulation."""
+    digest = hashlib.sha256()
+    for path in sorted(SIM_DIR.rglob("*.py")):
+        digest.update(str(path.relative_to(SIM_DIR)).encode("utf-8"))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def _plain(value):
+    if isinstance(value, Enum):
+        return f"{type(value).__name__}.{value.name}"
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def _input_file(path):
+    """Identity of an input file (path, size, modification time)."""
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return [str(path), None]
+    return [str(Path(path).resolve()), st.st_size, st.st_mtime_ns]
+
+
+def scenario_key(cfg, priority, seed, start_date, days):
+    settings = {name: _plain(value) for name, value in cfg.to_dict().items() if name not in NEUTRAL}
+    settings["DATE_OF_SIMULATION"] = start_date
+    settings["SIMULATION_DAYS"] = days
+    payload = {
+        "settings": settings,
+        "priority": _plain(priority),
+        "seed": seed,
+        "inputs": [_input_file(cfg.LOAD_PROFILE), _input_file(cfg.WEATHER_FILE)],
+        "code": code_version(),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=repr).encode("utf-8")).hexdigest()
+
+
+class ResultsCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return self.directory / f"{key}.pkl"
+
+    def get(self, key, columns=False):
+        """
+        Cached ScenarioResult for `key`, or None. With `columns` an entry
+        stored without its per-tick log does not count.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                metrics, cols, stats = pickle.load(f)
+            os.utime(path)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        if columns and not cols:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return ScenarioResult(metrics, cols if columns else None, stats)
+
+    def put(self, key, result):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump((result.metrics, result.columns, result.stats), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(key))
+        self.evict()
+
+    def evict(self):
+        """Deletes least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for path in self.directory.glob("*.pkl"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for path in self.directory.glob("*.pkl"):
+            path.unlink(missing_ok=True)
+
+
+@lru_cache(maxsize=8)
+def _shared(directory, max_bytes):
+    return ResultsCache(directory, max_bytes)
+
+
+def open_cache(cfg):
+    """
+    ResultsCache of the configuration (one per directory and process), or
+    None when RESULTS_CACHE_DIR is empty. Relative directories are taken from
+    the simulation folder.
+    """
+    if not cfg.RESULTS_CACHE_DIR:
+        return None
+    directory = Path(cfg.RESULTS_CACHE_DIR)
+    if not directory.is_absolute():
+        directory = SIM_DIR / directory
+    return _shared(directory, int(cfg.RESULTS_CACHE_MAX_MB * 2**20))
@@ -0,0 +1,125 @@
+"""
+Dependency-graph scheduler for report generation.
+
+A report is a graph of named nodes: scenario runs, which are independent and
+go to a process pool, and analyses of their results (binning, summaries),
+which run in the calling process as soon as their inputs are ready. Nodes
+registered with the same key are run once and shared under every name, and
+nodes whose value is already known (e.g. from the results cache) are not
+scheduled at all. Every finished node is reported through `on_done`, in
+completion order, so callers can stream partial output.
+
+    graph = TaskGraph()
+    graph.add("load", run_scenario, LOAD, date, key=(LOAD, date))
+    graph.add("bins", lambda r: r.cloud_impact(), deps=("load",), local=True)
+    results = graph.run(workers=8, on_done=print)
+"""
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+class Node:
+    __slots__ = ("name", "fn", "args", "deps", "local")
+
+    def __init__(self, name, fn, args, deps, local):
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.deps = tuple(deps)
+        self.local = local
+
+
+class TaskGraph:
+    def __init__(self):
+        self.nodes = {}
+        self.keys = {}
+        self.aliases = {}           # name -> names sharing its node
+        self.values = {}
+
+    def add(self, name, fn, *args, deps=(), key=None, local=False):
+        """
+        Registers node `name` computing fn(*dep_values, *args). Pool nodes
+        (the default) need a picklable top-level `fn`; `local` nodes run in
+        this process. A node with the `key` of an earlier one is an alias.
+        """
+        if name in self.nodes or name in self.values:
+            raise ValueError(f"Duplicate node: {name}")
+        if key is not None and key in self.keys:
+            self.aliases[self.keys[key]].append(name)
+            return
+        if key is not None:
+            self.keys[key] = name
+        self.aliases[name] = [name]
+        self.nodes[name] = Node(name, fn, args, deps, local)
+
+    def done(self, name, value, key=None):
+        """Registers node `name` as already computed."""
+        if key is not None and key in self.keys:
+            self.aliases[self.keys[key]].append(name)
+            return
+        if key is not None:
+            self.keys[key] = name
+        self.aliases[name] = [name]
+        self.values[name] = value
+
+    def _canonical(self, name):
+        for owner, names in self.aliases.items():
+            if name in names:
+                return owner
+        raise KeyError(f"Unknown node: {name}")
+
+    def run(self, workers=1, on_done=None):
+        """
+        Runs every node and returns {name: value} for all names, aliases
+        included. With `workers` > 1 pool nodes run on that many processes
+        (None: all cores); with 1 everything runs here, in registration order.
+        """
+        for node in self.nodes.values():
+            node.deps = tuple(self._canonical(d) for d in node.deps)
+        values = {}
+        pending = dict(self.nodes)
+
+        def finish(name, value):
+            values[name] = value
+            if on_done is not None:
+                for alias in self.aliases[name]:
+                    on_done(alias, value)
+
+        for name, value in self.values.items():
+            finish(name, value)
+
+        def ready():
+            return [n for n in pending.values() if all(d in values for d in n.deps)]
+
+        def call(node):
+            return node.fn(*(values[d] for d in node.deps), *node.args)
+
+        if workers == 1 or not any(not n.local for n in pending.values()):
+            while pending:
+                batch = ready()
+                if not batch:
+                    raise ValueError(f"Unresolvable dependencies: {sorted(pending)}")
+                for node in batch:
+                    del pending[node.name]
+                    finish(node.name, call(node))
+        else:
+            remote = sum(1 for n in pending.values() if not n.local)
+            with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, remote)) as pool:
+                running = {}
+                while pending or running:
+                    for node in ready():
+                        del pending[node.name]
+                        if node.local:
+                            finish(node.name, call(node))
+                        else:
+                            running[pool.submit(node.fn, *(values[d] for d in node.deps), *node.args)] = node.name
+                    if not running:
+                        if pending and not ready():
+                            raise ValueError(f"Unresolvable dependencies: {sorted(pending)}")
+                        continue
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        finish(running.pop(future), future.result())
+
+        return {alias: values[name] for name, names in self.aliases.items() for alias in names}
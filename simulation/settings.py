@@ -0,0 +1,42 @@
+"""
+Injectable simulation settings.
+
+SimulationConfig snapshots every setting of config.py into an object that is
+passed to the components, Simulate and the batch engine. Runs with different
+parameters can then live in the same process (threads, batched engines)
+without mutating module globals:
+
+    cfg = SimulationConfig(BATTERY_CAPACITY=10000, DATE_OF_SIMULATION="15/07/2026")
+    winter = cfg.replace(DATE_OF_SIMULATION="15/01/2026")
+"""
+
+import config
+
+# Every upper-case setting in config.py except the option enums.
+FIELDS = tuple(name for name, value in vars(config).items()
+               if name.isupper() and not isinstance(value, type))
+
+
+class SimulationConfig:
+    def __init__(self, **overrides):
+        for name in FIELDS:
+            setattr(self, name, getattr(config, name))
+        for name, value in overrides.items():
+            if name not in FIELDS:
+                raise TypeError(f"Unknown setting: {name}")
+            setattr(self, name, value)
+
+    def replace(self, **changes):
+        """Copy of this configuration with some settings changed."""
+        return SimulationConfig(**{**self.to_dict(), **changes})
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in FIELDS}
+
+    def __repr__(self):
+        return f"SimulationConfig({', '.join(f'{k}={v!r}' for k, v in self.to_dict().items())})"
+
+
+def resolve(cfg):
+    """The given configuration, or a fresh snapshot of config.py."""
+    return cfg if cfg is not None else SimulationConfig()
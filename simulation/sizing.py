@@ -0,0 +1,233 @@
+"""
+System-sizing search for the Green Grid Digital Twin.
+
+Searches battery capacity, PV peak and inverter clipping for the size that
+maximizes the net balance, or minimizes the total cost (installation cost
+spread over the horizon minus the net balance). Exogenous traces are built
+once and replayed for every candidate; candidates are evaluated in parallel,
+best optimistic bound first, and any candidate whose bound cannot beat the
+best size found so far is skipped without simulating it. A coarse grid is
+then refined around the best size.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+SIM_DIR = Path(__file__).resolve().parent
+if str(SIM_DIR) not in sys.path:
+    sys.path.insert(0, str(SIM_DIR))
+
+import config
+from batch import SimulateTrace, build_exogenous, solar_generation
+from online_stats import RunStats
+from sym_results import member_seeds
+from settings import resolve
+
+OBJECTIVES = ("balance", "cost")
+
+_TRACES = None
+
+
+def installation_cost(capacity, solar_peak, clipping, days, cfg):
+    """Installation cost charged to a horizon of `days` days."""
+    capex = (capacity / 1000 * cfg.BATTERY_COST_PER_KWH
+             + solar_peak / 1000 * cfg.SOLAR_COST_PER_KW
+             + clipping / 1000 * cfg.INVERTER_COST_PER_KW)
+    return capex * days / (365 * cfg.SYSTEM_LIFETIME_YEARS)
+
+
+def _init_worker(traces):
+    global _TRACES
+    _TRACES = traces
+
+
+def _evaluate(task):
+    capacity, solar_peak, clipping, priority = task
+    runs = []
+    for trace in _TRACES:
+        stats = RunStats(trace["config"], track=())
+        inverter = SimulateTrace(trace, priority, None, stats, capacity=capacity,
+                                 solar_peak=solar_peak, clipping=clipping)
+        imp_kwh = inverter.metrics["total_grid_import"] / 1000
+        exp_kwh = inverter.metrics["total_grid_export"] / 1000
+        cfg = trace["config"]
+        runs.append((imp_kwh, exp_kwh, exp_kwh * cfg.EXPORT_COST - imp_kwh * cfg.IMPORT_COST,
+                     stats.unmet_events))
+    imp_kwh, exp_kwh, balance, unmet = np.mean(runs, axis=0)
+    return {
+        "grid_import_kwh": float(imp_kwh),
+        "grid_export_kwh": float(exp_kwh),
+        "net_balance": float(balance),
+        "unmet_events": float(unmet),
+    }
+
+
+def _axis(lo, hi, points):
+    return sorted({round(float(v), 3) for v in np.linspace(lo, hi, points)})
+
+
+def _refine(values, best, lo, hi):
+    """Halves the spacing of an axis around its best value, staying inside [lo, hi]."""
+    if len(values) < 2:
+        return [best]
+    step = min(b - a for a, b in zip(values, values[1:])) / 2
+    return sorted({round(v, 3) for v in (best - step, best, best + step) if lo <= v <= hi})
+
+
+class SizingSearch:
+    def __init__(self, start_date=None, days=None, seed=42, members=1,
+                 priority=None, objective="balance", workers=None, cfg=None):
+        if objective not in OBJECTIVES:
+            raise ValueError(f"objective must be one of {OBJECTIVES}")
+        self.cfg = resolve(cfg)
+        self.start_date = start_date or self.cfg.DATE_OF_SIMULATION
+        self.days = days or self.cfg.SIMULATION_DAYS
+        self.priority = priority or self.cfg.CHARGE_PRIORITY
+        self.objective = objective
+        self.workers = workers or os.cpu_count() or 1
+        self.traces = [build_exogenous(self.start_date, self.days, random.Random(s), self.cfg)
+                       for s in member_seeds(seed, members)]
+        self.evaluated = {}
+        self.pruned = 0
+        self._bounds = {}
+        self._pool = None
+
+    def score(self, candidate, metrics):
+        """Lower is better."""
+        if self.objective == "balance":
+            return -metrics["net_balance"]
+        return installation_cost(*candidate, self.days, self.cfg) - metrics["net_balance"]
+
+    def bound(self, candidate):
+        """
+        Best score a candidate could reach with a lossless battery of any
+        size: usable solar either serves the load or is exported, and the
+        rest of the load is imported. Needs no dispatch, only the series.
+        """
+        if candidate not in self._bounds:
+            _, solar_peak, clipping = candidate
+            balances = []
+            for t in self.traces:
+                ok = ~t["failed"]
+                # Load during grid outages is shed rather than imported.
+                on_grid = ~t["grid_outage"]
+                solar = np.minimum(solar_generation(t["sun"], t["cloud"], solar_peak, self.cfg.MINUTES_PER_TICK, t["irradiance"]), clipping)[ok].sum() / 1000
+                load = t["load"][on_grid].sum() / 1000
+                load_ok = t["load"][ok & on_grid].sum() / 1000
+                # Import while the inverter works is linear in the balance, so the best is at an end.
+                balances.append(max(
+                    self.cfg.EXPORT_COST * (solar - load_ok + imp) - self.cfg.IMPORT_COST * (load - load_ok + imp)
+                    for imp in (max(0.0, load_ok - solar), load_ok)
+                ))
+            self._bounds[candidate] = self.score(candidate, {"net_balance": float(np.mean(balances))})
+        return self._bounds[candidate]
+
+    def best(self):
+        if not self.evaluated:
+            return None
+        candidate = min(self.evaluated, key=lambda c: self.evaluated[c]["score"])
+        return candidate, self.evaluated[candidate]
+
+    def _run(self, tasks):
+        if self.workers == 1:
+            return list(map(_evaluate, tasks))
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(self.traces,))
+        return list(self._pool.map(_evaluate, tasks))
+
+    def evaluate(self, candidates):
+        """Evaluates new candidates in bound order, skipping those that cannot beat the best."""
+        _init_worker(self.traces)
+        todo = sorted((c for c in set(candidates) if c not in self.evaluated), key=self.bound)
+        batch_size = self.workers * 2
+        while todo:
+            current = self.best()
+            if current is not None:
+                best_score = current[1]["score"]
+                kept = [c for c in todo if self.bound(c) < best_score]
+                self.pruned += len(todo) - len(kept)
+                todo = kept
+            batch, todo = todo[:batch_size], todo[batch_size:]
+            for candidate, metrics in zip(batch, self._run([(*c, self.priority) for c in batch])):
+                metrics["installation_cost"] = installation_cost(*candidate, self.days, self.cfg)
+                metrics["score"] = self.score(candidate, metrics)
+                self.evaluated[candidate] = metrics
+
+    def search(self, capacities, peaks, clippings, refine=2):
+        try:
+            axes = [sorted(capacities), sorted(peaks), sorted(clippings)]
+            limits = [(values[0], values[-1]) for values in axes]
+            for level in range(refine + 1):
+                if level:
+                    best = self.best()[0]
+                    axes = [_refine(values, b, *lim) for values, b, lim in zip(axes, best, limits)]
+                self.evaluate([(c, p, k) for c in axes[0] for p in axes[1] for k in axes[2]])
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+        return self.report()
+
+    def report(self, top=10):
+        ranked = sorted(self.evaluated.items(), key=lambda item: item[1]["score"])
+        rows = [{"battery_capacity_wh": c[0], "solar_peak_w": c[1], "inverter_clipping_w": c[2], **m}
+                for c, m in ranked[:top]]
+        return {
+            "objective": self.objective,
+            "strategy": str(self.priority),
+            "start_date": self.start_date,
+            "days": self.days,
+            "members": len(self.traces),
+            "evaluated": len(self.evaluated),
+            "pruned": self.pruned,
+            "best": rows[0] if rows else None,
+            "top": rows,
+        }
+
+
+def _range(text):
+    """'lo:hi:points' or a single value."""
+    parts = [float(p) for p in text.split(":")]
+    if len(parts) == 1:
+        return [parts[0]]
+    lo, hi, points = parts
+    return _axis(lo, hi, int(points))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search battery, PV and inverter sizes.')
+    parser.add_argument('--capacity', type=_range, default=_range('0:20000:5'), help='Battery capacity Wh as lo:hi:points (default: 0:20000:5)')
+    parser.add_argument('--peak', type=_range, default=_range('2000:10000:5'), help='Solar peak W as lo:hi:points (default: 2000:10000:5)')
+    parser.add_argument('--clipping', type=_range, default=_range('2000:8000:4'), help='Inverter clipping W as lo:hi:points (default: 2000:8000:4)')
+    parser.add_argument('--objective', choices=OBJECTIVES, default='balance', help='Maximize net balance or minimize total cost (default: balance)')
+    parser.add_argument('--strategy', choices=[p.name for p in config.PRIORITY_OPTIONS], default=config.CHARGE_PRIORITY.name, help='Energy management strategy (default: config.CHARGE_PRIORITY)')
+    parser.add_argument('--refine', type=int, default=2, help='Refinement rounds around the best size (default: 2)')
+    parser.add_argument('--members', type=int, default=1, help='Weather traces averaged per candidate (default: 1)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for the weather traces (default: 42)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--output', type=str, default='', help='Optional output JSON file path. If omitted, prints to stdout.')
+    args = parser.parse_args()
+
+    search = SizingSearch(seed=args.seed, members=args.members, priority=config.PRIORITY_OPTIONS[args.strategy],
+                          objective=args.objective, workers=args.workers)
+    payload = json.dumps(search.search(args.capacity, args.peak, args.clipping, refine=args.refine), indent=2)
+
+    if args.output:
+        output_path = Path(args.output).expanduser().resolve()
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_text(payload + '\n', encoding='utf-8')
+        print(f'Results written to {output_path}')
+    else:
+        print(payload)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Sun model for the Green Grid Digital Twin.
+
+Sun gives the clear-sky output of the panel and the clear-sky horizontal
+irradiance of a tick as fractions of 1000 W/m2. By default this is the
+original 12-hour sine (`sin((hour - 6) * pi / 12)`, the same every day of the
+year). With SOLAR_GEOMETRY it is a solar-position and clear-sky model for the
+site (SITE_LATITUDE, SITE_LONGITUDE, SITE_UTC_OFFSET) and panel orientation
+(PANEL_TILT, PANEL_AZIMUTH, GROUND_ALBEDO):
+
+- position: Spencer declination and equation of time, local hour angle
+- clear sky: Kasten-Young air mass, Meinel beam irradiance, diffuse 10% of beam
+- plane of array: beam on the tilted plane, isotropic sky diffuse and ground
+  reflection
+
+The model is evaluated once per (site, orientation, tick size) into a lookup
+table of 366 days x 1440 minutes (value at the middle of the tick starting at
+each minute), shared by every run of the process, so a tick only costs an
+index lookup.
+"""
+
+import math
+from datetime import date, datetime
+from functools import lru_cache
+
+import numpy as np
+
+from recorder import to_minutes
+
+SOLAR_CONSTANT = 1353.0             # W/m2, as used by the Meinel clear-sky model
+DAY = 24 * 60
+
+
+@lru_cache(maxsize=32)
+def lookup_table(latitude, longitude, utc_offset, tilt, azimuth, albedo, minutes_per_tick):
+    """
+    (panel, horizontal) clear-sky tables of shape (366, 1440), as fractions of
+    1000 W/m2, for ticks starting at each minute of each day of the year.
+    """
+    doy = np.arange(1, 367)[:, None]
+    clock = (np.arange(DAY)[None, :] + minutes_per_tick / 2) / 60          # local standard time, hours
+
+    gamma = 2 * np.pi / 365 * (doy - 1 + (clock - 12) / 24)
+    decl = (0.006918 - 0.399912 * np.cos(gamma) + 0.070257 * np.sin(gamma)
+            - 0.006758 * np.cos(2 * gamma) + 0.000907 * np.sin(2 * gamma)
+            - 0.002697 * np.cos(3 * gamma) + 0.00148 * np.sin(3 * gamma))
+    eot = 229.18 * (0.000075 + 0.001868 * np.cos(gamma) - 0.032077 * np.sin(gamma)
+                    - 0.014615 * np.cos(2 * gamma) - 0.040849 * np.sin(2 * gamma))
+    solar_time = clock + (4 * (longitude - 15 * utc_offset) + eot) / 60
+    omega = np.radians(15 * (solar_time - 12))
+    phi = math.radians(latitude)
+
+    cos_z = np.sin(phi) * np.sin(decl) + np.cos(phi) * np.cos(decl) * np.cos(omega)
+    up = cos_z > 0
+    zenith = np.degrees(np.arccos(np.clip(cos_z, -1, 1)))
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        air_mass = 1 / (cos_z + 0.50572 * (96.07995 - zenith) ** -1.6364)
+        dni = np.where(up, SOLAR_CONSTANT * 0.7 ** (air_mass ** 0.678), 0.0)
+    dhi = 0.1 * dni
+    ghi = dni * np.maximum(cos_z, 0) + dhi
+
+    sun_azimuth = np.arctan2(np.sin(omega), np.cos(omega) * np.sin(phi) - np.tan(decl) * np.cos(phi)) + np.pi
+    beta = math.radians(tilt)
+    sin_z = np.sqrt(np.maximum(0, 1 - cos_z ** 2))
+    cos_aoi = cos_z * math.cos(beta) + sin_z * math.sin(beta) * np.cos(sun_azimuth - math.radians(azimuth))
+    poa = (dni * np.maximum(cos_aoi, 0) + dhi * (1 + math.cos(beta)) / 2
+           + ghi * albedo * (1 - math.cos(beta)) / 2)
+
+    panel = np.where(up, poa, 0.0) / 1000
+    horizontal = np.where(up, ghi, 0.0) / 1000
+    panel.setflags(write=False)
+    horizontal.setflags(write=False)
+    return panel, horizontal
+
+
+class Sun:
+    def __init__(self, cfg):
+        self.tick = cfg.MINUTES_PER_TICK
+        self.tables = None
+        if cfg.SOLAR_GEOMETRY:
+            self.tables = lookup_table(float(cfg.SITE_LATITUDE), float(cfg.SITE_LONGITUDE), float(cfg.SITE_UTC_OFFSET),
+                                       float(cfg.PANEL_TILT), float(cfg.PANEL_AZIMUTH), float(cfg.GROUND_ALBEDO),
+                                       self.tick)
+        self.start = to_minutes(datetime.strptime(cfg.DATE_OF_SIMULATION, "%d/%m/%Y"))
+        self._day = None
+        self._row = 0
+
+    def _index(self, now):
+        minute = self.start + round(now * 60 / self.tick) * self.tick
+        day = minute // DAY
+        if day != self._day:
+            self._day = day
+            self._row = date.fromordinal(date(1970, 1, 1).toordinal() + day).timetuple().tm_yday - 1
+        return self._row, minute % DAY
+
+    def panel(self, now):
+        """Clear-sky panel output of the tick at simulation hour `now` (fraction of SOLAR_PEAK)."""
+        if self.tables is None:
+            return math.sin((now % 24 - 6) * (math.pi / 12))
+        return float(self.tables[0][self._index(now)])
+
+    def horizontal(self, now):
+        """Clear-sky horizontal irradiance of the tick (fraction of 1000 W/m2)."""
+        if self.tables is None:
+            return math.sin((now % 24 - 6) * (math.pi / 12))
+        return float(self.tables[1][self._index(now)])
+
+    def series(self, now, start_minute):
+        """(panel, horizontal) arrays for ticks at simulation hours `now` from `start_minute`."""
+        if self.tables is None:
+            sun = np.sin((now % 24 - 6) * (math.pi / 12))
+            return sun, sun
+        minutes = start_minute + np.arange(len(now), dtype=np.int64) * self.tick
+        days = minutes // DAY
+        rows = (days.astype("datetime64[D]") - days.astype("datetime64[D]").astype("datetime64[Y]")).astype(np.int64)
+        cols = minutes % DAY
+        return self.tables[0][rows, cols], self.tables[1][rows, cols]
@@ -0,0 +1,475 @@
+"""
+Surrogate model of the Green Grid Digital Twin for instant what-if queries.
+
+train() simulates SURROGATE_SAMPLES quasi-random points (Halton sequence) of
+the region in SURROGATE_RANGES (battery capacity, PV peak, inverter clipping,
+tariffs) crossed with the start day of the year. Every point is run with
+every strategy and averaged over SURROGATE_MEMBERS weather seeds, the same
+seeds for every point so the response is smooth. A Gaussian process per
+strategy and output (grid import, grid export, unmet events) is fitted on
+the results, with one length scale per input chosen by marginal likelihood.
+
+A query then costs tens of microseconds instead of a simulation:
+
+    model = Surrogate.load("surrogate.npz")
+    model.predict(PRIORITY_OPTIONS.LOAD, "15/07/2026", BATTERY_CAPACITY=10000)
+
+It returns the metrics, their standard error and "source": "surrogate". The
+net balance follows from import and export at the queried tariffs. Queries
+outside the trained region, or less certain than `max_std`, are simulated
+with run_scenario over the same seeds instead ("source": "simulation"). That
+covers a setting out of range or not trained, another horizon and an
+untrained strategy.
+
+sensitivity() reports the leave-one-out error of every model, Sobol
+first-order and total indices of every input, and the swing of each input
+around the configured installation.
+
+    python surrogate.py train --save surrogate.npz
+    python surrogate.py query --model surrogate.npz --strategy LOAD --date 15/07/2026 --set BATTERY_CAPACITY=10000
+    python surrogate.py report --model surrogate.npz
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+
+SIM_DIR = Path(__file__).resolve().parent
+if str(SIM_DIR) not in sys.path:
+    sys.path.insert(0, str(SIM_DIR))
+
+import config
+from checkpoint import _decode, _encode
+from planner import expected_cloud
+from settings import FIELDS, SimulationConfig, resolve
+from sym_results import build_trace, member_seeds, run_scenario
+
+OUTPUTS = ("grid_import_kwh", "grid_export_kwh", "unmet_events")
+METRICS = ("grid_import_kwh", "grid_export_kwh", "net_balance", "unmet_events")
+SEASON = "SEASON"           # the start day of the year, as an input in reports
+PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53)
+LENGTH_SCALES = (0.05, 0.1, 0.2, 0.4, 0.8, 1.6, 3.2, 10.0)
+NOISES = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1)
+
+
+def halton(n, dims, skip=20):
+    """n points of the Halton sequence in [0, 1)**dims."""
+    points = np.empty((n, dims))
+    index = np.arange(skip + 1, skip + n + 1)
+    for d in range(dims):
+        base, i = PRIMES[d], index.copy()
+        f, x = 1.0, np.zeros(n)
+        while i.any():
+            f /= base
+            x += f * (i % base)
+            i //= base
+        points[:, d] = x
+    return points
+
+
+def day_of_year(date):
+    return datetime.strptime(date, "%d/%m/%Y").timetuple().tm_yday - 1
+
+
+def season_table(year, days, cfg):
+    """
+    Model inputs of each start day of the year: mean expected cloud coverage
+    of the weather model over the horizon, share of the horizon before the
+    first monthly export reset, and the time of year on a circle.
+    """
+    table = np.empty((365, 3))
+    for day in range(365):
+        start = datetime(year, 1, 1) + timedelta(days=day)
+        months = [(start + timedelta(days=i)).month for i in range(days)]
+        to_reset = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - start
+        table[day] = (np.mean([expected_cloud(m, cfg) for m in months]),
+                      min(to_reset.days / days, 1.0),
+                      (np.cos(2 * np.pi * day / 365) + 1) / 2)
+    return table
+
+
+class GaussianProcess:
+    """Gaussian process on one standardized output, RBF kernel with a length scale per input."""
+
+    def __init__(self, X, y):
+        self.X = X
+        self.y = y
+        self.y_mean = float(y.mean())
+        self.y_std = float(y.std()) or 1.0
+        target = (y - self.y_mean) / self.y_std
+        self.scales, self.noise = self._fit(target)
+        self._solve(target)
+
+    def _kernel(self, A, B, scales=None):
+        scales = self.scales if scales is None else scales
+        a, b = A / scales, B / scales
+        d2 = (a * a).sum(1)[:, None] + (b * b).sum(1)[None, :] - 2 * a @ b.T
+        return np.exp(-0.5 * np.maximum(d2, 0.0))
+
+    def _nll(self, target, scales, noise):
+        K = self._kernel(self.X, self.X, scales) + noise * np.eye(len(target))
+        try:
+            L = np.linalg.cholesky(K)
+        except np.linalg.LinAlgError:
+            return np.inf
+        z = np.linalg.solve(L, target)
+        return 0.5 * z @ z + np.log(np.diag(L)).sum()
+
+    def _fit(self, target):
+        """Coordinate search of the length scales and noise on a log grid."""
+        scales, noise = np.full(self.X.shape[1], 0.4), 1e-3
+        best = self._nll(target, scales, noise)
+        for _ in range(3):
+            for n in NOISES:
+                value = self._nll(target, scales, n)
+                if value < best:
+                    best, noise = value, n
+            for d in range(len(scales)):
+                for s in LENGTH_SCALES:
+                    trial = scales.copy()
+                    trial[d] = s
+                    value = self._nll(target, trial, noise)
+                    if value < best:
+                        best, scales = value, trial
+        return scales, noise
+
+    def _solve(self, target):
+        self.K_inv = np.linalg.inv(self._kernel(self.X, self.X) + self.noise * np.eye(len(target)))
+        self.alpha = self.K_inv @ target
+
+    def predict(self, X):
+        """(mean, std) at the rows of X, in output units."""
+        k = self._kernel(X, self.X)
+        mean = k @ self.alpha * self.y_std + self.y_mean
+        var = 1.0 + self.noise - ((k @ self.K_inv) * k).sum(1)
+        return mean, np.sqrt(np.maximum(var, 0.0)) * self.y_std
+
+    def loo_residuals(self):
+        """Leave-one-out prediction errors of the training points, in output units."""
+        return self.alpha / np.diag(self.K_inv) * self.y_std
+
+    # ── Saved state ──────────────────────────────────────────────────────────
+    def state(self):
+        meta = {"scales": self.scales.tolist(), "noise": self.noise, "y_mean": self.y_mean, "y_std": self.y_std}
+        return meta, {"y": self.y, "alpha": self.alpha, "K_inv": self.K_inv}
+
+    @classmethod
+    def from_state(cls, X, meta, arrays):
+        gp = cls.__new__(cls)
+        gp.X = X
+        gp.scales, gp.noise = np.array(meta["scales"]), meta["noise"]
+        gp.y_mean, gp.y_std = meta["y_mean"], meta["y_std"]
+        gp.y, gp.alpha, gp.K_inv = arrays["y"], arrays["alpha"], arrays["K_inv"]
+        return gp
+
+
+def _start_date(year, day):
+    return (datetime(year, 1, 1) + timedelta(days=int(day))).strftime("%d/%m/%Y")
+
+
+def _simulate_point(task):
+    """Outputs of one training point for every strategy, averaged over the seeds."""
+    date, settings, seeds, days, priorities, cfg = task
+    cfg = cfg.replace(**settings)
+    sums = {p.name: np.zeros(len(OUTPUTS)) for p in priorities}
+    for seed in seeds:
+        trace = build_trace(date, seed, days, cfg=cfg)
+        for p in priorities:
+            result = run_scenario(p, date, seed=seed, days=days, log=False, trace=trace, cfg=cfg, cache=False)
+            sums[p.name] += [result[name] for name in OUTPUTS]
+    return {name: (values / len(seeds)).tolist() for name, values in sums.items()}
+
+
+class Surrogate:
+    def __init__(self, cfg, ranges, days, seeds, X, models):
+        self.cfg = cfg              # settings of the training runs outside the ranges
+        self.ranges = ranges        # {setting: (lo, hi)}
+        self.days = days
+        self.seeds = seeds
+        self.X = X
+        self.models = models        # {strategy name: {output: GaussianProcess}}
+        self.fallbacks = 0
+        self._lo = np.array([lo for lo, _ in ranges.values()], dtype=float)
+        self._span = np.array([hi - lo for lo, hi in ranges.values()], dtype=float)
+        self._season = season_table(self.year, days, cfg)
+
+    @property
+    def year(self):
+        return datetime.strptime(self.cfg.DATE_OF_SIMULATION, "%d/%m/%Y").year
+
+    def features(self, units, starts):
+        """Model inputs of settings scaled to [0, 1] and start days of the year."""
+        return np.column_stack([units, self._season[np.asarray(starts, dtype=int)]])
+
+    @classmethod
+    def train(cls, samples=None, members=None, priorities=None, seed=42, days=None, workers=None, cfg=None):
+        """Simulates the training points (on `workers` processes, None: all cores) and fits the models."""
+        cfg = resolve(cfg)
+        samples = samples or cfg.SURROGATE_SAMPLES
+        ranges = {name: (float(lo), float(hi)) for name, (lo, hi) in cfg.SURROGATE_RANGES.items()}
+        days = days or cfg.SIMULATION_DAYS
+        priorities = list(priorities or config.PRIORITY_OPTIONS)
+        seeds = member_seeds(seed, members or cfg.SURROGATE_MEMBERS)
+
+        units = halton(samples, len(ranges) + 1)
+        lo = np.array([lo for lo, _ in ranges.values()])
+        span = np.array([hi - lo for lo, hi in ranges.values()])
+        values = lo + units[:, :-1] * span
+        starts = np.floor(units[:, -1] * 365).astype(int)
+        year = datetime.strptime(cfg.DATE_OF_SIMULATION, "%d/%m/%Y").year
+        tasks = [(_start_date(year, day), {name: float(v) for name, v in zip(ranges, row)}, seeds, days, priorities, cfg)
+                 for row, day in zip(values, starts)]
+
+        if workers == 1:
+            results = list(map(_simulate_point, tasks))
+        else:
+            workers = workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_simulate_point, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+
+        X = np.column_stack([units[:, :-1], season_table(year, days, cfg)[starts]])
+        models = {}
+        for p in priorities:
+            Y = np.array([r[p.name] for r in results])
+            models[p.name] = {name: GaussianProcess(X, Y[:, i]) for i, name in enumerate(OUTPUTS)}
+        return cls(cfg, ranges, days, seeds, X, models)
+
+    # ── Queries ──────────────────────────────────────────────────────────────
+    def outside(self, priority, days, settings):
+        """Why a query is outside the trained region, or None."""
+        if priority.name not in self.models:
+            return f"strategy {priority.name} not trained"
+        if days != self.days:
+            return f"trained for {self.days} days"
+        for name, value in settings.items():
+            if name in self.ranges:
+                lo, hi = self.ranges[name]
+                if not lo <= value <= hi:
+                    return f"{name}={value} outside [{lo}, {hi}]"
+            elif name not in FIELDS:
+                raise TypeError(f"Unknown setting: {name}")
+            elif value != getattr(self.cfg, name):
+                return f"{name} not part of the model"
+        return None
+
+    def predict_units(self, priority, units):
+        """
+        {metric: (mean, std)} arrays for rows of `units`: the ranges' settings
+        scaled to [0, 1], then the start day as a fraction of the year.
+        """
+        units = np.atleast_2d(units)
+        values = self._lo + units[:, :-1] * self._span
+        X = self.features(units[:, :-1], np.minimum(units[:, -1] * 365, 364))
+        out = {}
+        for name, gp in self.models[priority.name].items():
+            mean, std = gp.predict(X)
+            out[name] = (np.maximum(mean, 0.0), std)
+        names = list(self.ranges)
+        imp_cost = values[:, names.index("IMPORT_COST")] if "IMPORT_COST" in self.ranges else self.cfg.IMPORT_COST
+        exp_cost = values[:, names.index("EXPORT_COST")] if "EXPORT_COST" in self.ranges else self.cfg.EXPORT_COST
+        (imp, imp_std), (exp, exp_std) = out["grid_import_kwh"], out["grid_export_kwh"]
+        out["net_balance"] = (exp * exp_cost - imp * imp_cost, np.hypot(exp_std * exp_cost, imp_std * imp_cost))
+        return out
+
+    def predict(self, priority, date=None, days=None, max_std=None, **settings):
+        """
+        Metrics of a run of `priority` from `date` with `settings` changed,
+        from the model when the query is inside the trained region and its
+        net balance is known within `max_std`, simulated otherwise.
+        """
+        date = date or self.cfg.DATE_OF_SIMULATION
+        days = days or self.days
+        if self.outside(priority, days, settings) is None:
+            units = [(settings.get(name, getattr(self.cfg, name)) - lo) / (hi - lo) for name, (lo, hi) in self.ranges.items()]
+            out = self.predict_units(priority, [*units, (day_of_year(date) + 0.5) / 365])
+            if max_std is None or out["net_balance"][1][0] <= max_std:
+                return {**{name: float(out[name][0][0]) for name in METRICS},
+                        "std": {name: float(out[name][1][0]) for name in METRICS},
+                        "source": "surrogate"}
+        return self.simulate(priority, date, days, **settings)
+
+    def simulate(self, priority, date, days=None, **settings):
+        """The query answered by run_scenario, averaged over the training seeds."""
+        self.fallbacks += 1
+        cfg = self.cfg.replace(**settings)
+        # Batch engine, as in training: it also takes a battery of 0 Wh.
+        runs = [run_scenario(priority, date, seed=s, days=days or self.days, engine=config.ENGINE_OPTIONS.BATCH,
+                             log=False, cfg=cfg) for s in self.seeds]
+        return {**{name: float(np.mean([r[name] for r in runs])) for name in METRICS},
+                "std": {name: 0.0 for name in METRICS},
+                "source": "simulation"}
+
+    # ── Sensitivity report ───────────────────────────────────────────────────
+    def sensitivity(self, samples=2048):
+        """
+        Leave-one-out error of every model, Sobol indices of every input
+        over the trained region (Saltelli/Jansen estimators on the model)
+        and the swing of each input around the configured installation.
+        """
+        inputs = [*self.ranges, SEASON]
+        k = len(inputs)
+        points = halton(samples, 2 * k)
+        A, B = points[:, :k], points[:, k:]
+        base = [min(max((getattr(self.cfg, name) - lo) / (hi - lo), 0.0), 1.0) for name, (lo, hi) in self.ranges.items()]
+        base.append((day_of_year(self.cfg.DATE_OF_SIMULATION) + 0.5) / 365)
+        months = np.array([(day_of_year(f"15/{m:02d}/{self.year}") + 0.5) / 365 for m in range(1, 13)])
+
+        report = {
+            "model": {
+                "samples": len(self.X),
+                "members": len(self.seeds),
+                "days": self.days,
+                "ranges": {name: list(r) for name, r in self.ranges.items()},
+                "strategies": list(self.models),
+            },
+            "validation": {},
+            "sobol": {},
+            "swing": {},
+        }
+        for name, models in self.models.items():
+            priority = config.PRIORITY_OPTIONS[name]
+            report["validation"][name] = {}
+            for output, gp in models.items():
+                loo = gp.loo_residuals()
+                spread = ((gp.y - gp.y.mean()) ** 2).sum()
+                report["validation"][name][output] = {
+                    "loo_rmse": float(np.sqrt(np.mean(loo ** 2))),
+                    "r2": float(1 - (loo ** 2).sum() / spread) if spread else 1.0,
+                }
+
+            fA, fB = self.predict_units(priority, A), self.predict_units(priority, B)
+            fAB = []
+            for i in range(k):
+                AB = A.copy()
+                AB[:, i] = B[:, i]
+                fAB.append(self.predict_units(priority, AB))
+            report["sobol"][name] = {}
+            for metric in METRICS:
+                a, b = fA[metric][0], fB[metric][0]
+                var = np.concatenate((a, b)).var()
+                report["sobol"][name][metric] = {
+                    inp: {
+                        "first_order": float(np.mean(b * (fAB[i][metric][0] - a)) / var) if var else 0.0,
+                        "total": float(0.5 * np.mean((a - fAB[i][metric][0]) ** 2) / var) if var else 0.0,
+                    }
+                    for i, inp in enumerate(inputs)
+                }
+
+            center = float(self.predict_units(priority, base)["net_balance"][0][0])
+            swing = {"base": center}
+            for i, inp in enumerate(inputs[:-1]):
+                ends = np.array([base, base])
+                ends[:, i] = (0.0, 1.0)
+                low, high = self.predict_units(priority, ends)["net_balance"][0]
+                swing[inp] = {"low": float(low), "high": float(high)}
+            year = np.array([base] * 12)
+            year[:, -1] = months
+            by_month = self.predict_units(priority, year)["net_balance"][0]
+            swing[SEASON] = {"low": float(by_month.min()), "high": float(by_month.max()),
+                             "worst_month": int(by_month.argmin()) + 1, "best_month": int(by_month.argmax()) + 1}
+            report["swing"][name] = swing
+        return report
+
+    # ── Saved model ──────────────────────────────────────────────────────────
+    def save(self, path):
+        meta = {
+            "config": {name: _encode(value) for name, value in self.cfg.to_dict().items()},
+            "ranges": {name: list(r) for name, r in self.ranges.items()},
+            "days": self.days,
+            "seeds": self.seeds,
+            "models": {},
+        }
+        arrays = {"X": self.X}
+        for name, models in self.models.items():
+            meta["models"][name] = {}
+            for output, gp in models.items():
+                meta["models"][name][output], data = gp.state()
+                arrays.update({f"{name}__{output}__{key}": value for key, value in data.items()})
+        np.savez_compressed(path, meta=np.array(json.dumps(meta)), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            X = data["X"]
+            models = {
+                name: {output: GaussianProcess.from_state(X, gp, {key: data[f"{name}__{output}__{key}"]
+                                                                 for key in ("y", "alpha", "K_inv")})
+                       for output, gp in outputs.items()}
+                for name, outputs in meta["models"].items()
+            }
+        cfg = SimulationConfig(**{name: _decode(value) for name, value in meta["config"].items() if name in FIELDS})
+        ranges = {name: tuple(r) for name, r in meta["ranges"].items()}
+        return cls(cfg, ranges, meta["days"], meta["seeds"], X, models)
+
+
+def _setting(text):
+    name, _, value = text.partition("=")
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value
+
+
+def _write(payload, output):
+    if output:
+        output_path = Path(output).expanduser().resolve()
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_text(payload + '\n', encoding='utf-8')
+        print(f'Results written to {output_path}')
+    else:
+        print(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train and query a surrogate model of the simulation.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    train = commands.add_parser('train', help='Simulate the training points, fit the models and print the sensitivity report')
+    train.add_argument('--samples', type=int, default=config.SURROGATE_SAMPLES, help='Training points (default: config.SURROGATE_SAMPLES)')
+    train.add_argument('--members', type=int, default=config.SURROGATE_MEMBERS, help='Weather seeds averaged per point (default: config.SURROGATE_MEMBERS)')
+    train.add_argument('--strategy', action='append', choices=[p.name for p in config.PRIORITY_OPTIONS], help='Strategy to model; repeat for several (default: all)')
+    train.add_argument('--seed', type=int, default=42, help='Base random seed (default: 42)')
+    train.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    train.add_argument('--save', type=str, default='surrogate.npz', help='Where to save the model (default: surrogate.npz)')
+    train.add_argument('--output', type=str, default='', help='Optional output JSON file for the report')
+
+    query = commands.add_parser('query', help='Predict one what-if scenario')
+    query.add_argument('--model', type=str, default='surrogate.npz', help='Saved model (default: surrogate.npz)')
+    query.add_argument('--strategy', choices=[p.name for p in config.PRIORITY_OPTIONS], default=config.CHARGE_PRIORITY.name, help='Strategy (default: config.CHARGE_PRIORITY)')
+    query.add_argument('--date', type=str, default=None, help='Start date dd/mm/yyyy (default: the model\'s DATE_OF_SIMULATION)')
+    query.add_argument('--days', type=int, default=None, help='Horizon in days (default: the model\'s)')
+    query.add_argument('--set', type=_setting, action='append', default=[], metavar='NAME=VALUE', help='Setting to change, e.g. BATTERY_CAPACITY=10000; repeatable')
+    query.add_argument('--max-std', type=float, default=None, help='Simulate when the net balance is less certain than this')
+
+    report = commands.add_parser('report', help='Print the sensitivity report of a saved model')
+    report.add_argument('--model', type=str, default='surrogate.npz', help='Saved model (default: surrogate.npz)')
+    report.add_argument('--samples', type=int, default=2048, help='Points per Sobol matrix (default: 2048)')
+    report.add_argument('--output', type=str, default='', help='Optional output JSON file path')
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        priorities = [config.PRIORITY_OPTIONS[name] for name in args.strategy] if args.strategy else None
+        model = Surrogate.train(args.samples, args.members, priorities, args.seed, workers=args.workers)
+        model.save(args.save)
+        print(f'Model saved to {args.save}', file=sys.stderr)
+        _write(json.dumps(model.sensitivity(), indent=2), args.output)
+    elif args.command == 'query':
+        model = Surrogate.load(args.model)
+        start = perf_counter()
+        result = model.predict(config.PRIORITY_OPTIONS[args.strategy], args.date, args.days, args.max_std, **dict(args.set))
+        result['elapsed_us'] = (perf_counter() - start) * 1e6
+        print(json.dumps(result, indent=2))
+    else:
+        _write(json.dumps(Surrogate.load(args.model).sensitivity(args.samples), indent=2), args.output)
+
+
+if __name__ == '__main__':
+    main()
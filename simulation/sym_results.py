@@ -1,11 +1,12 @@
 import argparse
-import contextlib
-import io
 import json
+import os
 import random
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from statistics import mean
+
+import numpy as np
 
 # Make local imports work no matter where the script is executed from.
 SIM_DIR = Path(__file__).resolve().parent
@@ -21,130 +22,345 @@ from components.weather import Weather
 from components.inverter import Inverter
 from components.grid import Grid
 from components.home import Home
+from batch import SimulateBatch, SimulateTrace, build_exogenous
+from recorder import Recorder
+from results import ScenarioResult
+from online_stats import RunStats, merge_summaries
+from settings import resolve
+from profiler import PROFILER
+from telemetry import TRACER
+from results_cache import open_cache, scenario_key
+from scheduler import TaskGraph
+from tariffs import load_tariffs
 
 
-def run_scenario(priority, start_date, seed=42, days=None):
+def build_trace(start_date, seed=42, days=None, cfg=None):
+    """Exogenous trace (weather, generation, load, failures) shared by every strategy."""
+    cfg = resolve(cfg).replace(DATE_OF_SIMULATION=start_date)
     if days is None:
-        days = config.SIMULATION_DAYS
-
-    random.seed(seed)
-
-    env = simpy.Environment()
-    battery = Battery(env, initial_charge=0, capacity=config.BATTERY_CAPACITY)
-    weather = Weather(env)
-    panel = Panel(env, battery, weather)
-    home = Home(env)
-    grid = Grid()
-    inverter = Inverter(env, panel, battery, home, grid, priority)
-
-    bitacora = []
-    stats = {
-        'soc_history': [], 'cloud_history': [], 'load_history': [],
-        'full_hours': 0, 'empty_hours': 0, 'unmet_events': 0,
-    }
+        days = cfg.SIMULATION_DAYS
+    trace = build_exogenous(start_date, days, random.Random(seed), cfg)
+    # Lets run_scenario look up runs of this trace in the results cache.
+    trace['seed'] = seed
+    trace['days'] = days
+    return trace
+
+
+def run_scenario(priority, start_date, seed=42, days=None, engine=None, log=True, trace=None, cfg=None, cache=True):
+    # A pre-built trace replays its weather and failures with the batch
+    # engine; seed, start_date and days are then taken from the trace.
+    if cfg is None and trace is not None:
+        cfg = trace['config']
+    cfg = resolve(cfg).replace(DATE_OF_SIMULATION=start_date)
+    if days is None:
+        days = cfg.SIMULATION_DAYS
+    if engine is None:
+        engine = cfg.SIMULATION_ENGINE
+
+    store, key = _cache_entry(priority, start_date, seed, days, trace, cfg, cache)
+    if store is not None:
+        hit = store.get(key, columns=log)
+        if hit is not None:
+            return hit
+
+    # Private stream: runs sharing a process do not disturb each other.
+    rng = random.Random(seed)
+
+    bitacora = Recorder() if log else None
+    stats = RunStats(cfg)
+
+    if trace is not None:
+        inverter = SimulateTrace(trace, priority, bitacora, stats, cfg=cfg)
+    elif engine == config.ENGINE_OPTIONS.BATCH:
+        inverter = SimulateBatch(priority, start_date, days, bitacora, stats, rng=rng, cfg=cfg)
+    else:
+        env = simpy.Environment()
+        battery = Battery(env, initial_charge=0, cfg=cfg)
+        weather = Weather(env, rng, cfg)
+        panel = Panel(env, battery, weather, cfg)
+        home = Home(env, cfg)
+        grid = Grid(env, cfg)
+        inverter = Inverter(env, panel, battery, home, grid, priority, rng, cfg)
+
+        env.process(system.Simulate(env, weather, panel, home, inverter, battery, grid, bitacora, stats, cfg, days * 24))
+        env.run(until=days * 24)
+
+    result = ScenarioResult(scenario_metrics(inverter, stats, cfg), bitacora.columns() if log else None,
+                            stats.summaries())
+    if store is not None:
+        store.put(key, result)
+    return result
+
+
+def _cache_entry(priority, start_date, seed, days, trace, cfg, cache=True):
+    """(cache, key) of a run, or (None, None) when it must be simulated."""
+    # Profiled and traced runs always simulate. A trace can only be looked
+    # up when it comes from build_trace (which records its seed) with the
+    # settings of this run.
+    store = open_cache(cfg) if cache and not PROFILER.enabled and not TRACER.info else None
+    if store is not None and trace is not None:
+        if 'seed' in trace:
+            seed, days = trace['seed'], trace['days']
+        if 'seed' not in trace or (scenario_key(trace['config'], priority, seed, start_date, days)
+                                   != scenario_key(cfg, priority, seed, start_date, days)):
+            store = None
+    if store is None:
+        return None, None
+    return store, scenario_key(cfg, priority, seed, start_date, days)
+
+
+def cached_scenario(priority, start_date, seed=42, days=None, log=True, cfg=None):
+    """Result run_scenario would return from the results cache, or None."""
+    cfg = resolve(cfg).replace(DATE_OF_SIMULATION=start_date)
+    if days is None:
+        days = cfg.SIMULATION_DAYS
+    store, key = _cache_entry(priority, start_date, seed, days, None, cfg)
+    return store.get(key, columns=log) if store is not None else None
 
-    old_date = system.DATE_OF_SIMULATION
-    try:
-        system.DATE_OF_SIMULATION = start_date
-        with contextlib.redirect_stdout(io.StringIO()):
-            env.process(system.Simulate(env, weather, panel, home, inverter, battery, grid, bitacora, stats))
-            env.run(until=days * 24)
-    finally:
-        system.DATE_OF_SIMULATION = old_date
 
+def scenario_metrics(inverter, stats, cfg):
+    """Report metrics of a finished run from its Inverter (or BatchResult) and stats."""
     imp_kwh = inverter.metrics['total_grid_import'] / 1000
     exp_kwh = inverter.metrics['total_grid_export'] / 1000
     solar_kwh = inverter.metrics['total_solar_gen'] / 1000
     load_kwh = inverter.metrics['total_load_served'] / 1000
+    summaries = stats.summaries()
+    outages = inverter.outages
 
     return {
-        'avg_soc': mean(stats['soc_history']) if stats['soc_history'] else 0.0,
-        'full_hours': stats['full_hours'],
-        'empty_hours': stats['empty_hours'],
+        'avg_soc': summaries['soc'].mean,
+        'full_hours': stats.full_hours,
+        'empty_hours': stats.empty_hours,
         'solar_kwh': solar_kwh,
         'load_kwh': load_kwh,
         'grid_import_kwh': imp_kwh,
         'grid_export_kwh': exp_kwh,
         'inverter_failures': inverter.fail_count,
         'total_downtime_h': inverter.total_downtime,
-        'avg_cloud': mean(stats['cloud_history']) if stats['cloud_history'] else 0.0,
-        'peak_load_w': max(stats['load_history']) if stats['load_history'] else 0.0,
-        'unmet_events': stats['unmet_events'],
-        'net_balance': exp_kwh * config.EXPORT_COST - imp_kwh * config.IMPORT_COST,
+        'avg_cloud': summaries['cloud'].mean,
+        'peak_load_w': summaries['load'].max if summaries['load'].count else 0.0,
+        'unmet_events': stats.unmet_events,
+        'net_balance': exp_kwh * cfg.EXPORT_COST - imp_kwh * cfg.IMPORT_COST,
         'avg_failure_duration_h': (inverter.total_downtime / inverter.fail_count) if inverter.fail_count else 0.0,
-        'log': bitacora,
+        'battery_faults': outages['battery'].count,
+        'battery_fault_h': outages['battery'].downtime,
+        'grid_outages': outages['grid'].count,
+        'grid_outage_h': outages['grid'].downtime,
     }
 
 
-def build_results(seed=42):
-    base = run_scenario(config.CHARGE_PRIORITY, config.DATE_OF_SIMULATION, seed=seed)
+ENSEMBLE_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def member_seeds(seed, members):
+    """Independent per-member seeds spawned from one base seed."""
+    return [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(members)]
+
+
+def _run_member(task):
+    priority, start_date, seed, days, engine, cfg = task
+    return run_scenario(priority, start_date, seed=seed, days=days, engine=engine, log=False, cfg=cfg)
+
+
+def summarize_ensemble(runs):
+    """
+    Mean, standard deviation and percentile bands of every metric across
+    members, plus the per-tick distributions of all members pooled.
+    """
+    summary = {'members': len(runs)}
+    for key in runs[0].keys():
+        values = np.array([r[key] for r in runs], dtype=float)
+        summary[key] = {
+            'mean': float(values.mean()),
+            'std': float(values.std(ddof=1)) if len(values) > 1 else 0.0,
+            'min': float(values.min()),
+            'max': float(values.max()),
+            **{f'p{q}': float(v) for q, v in zip(ENSEMBLE_PERCENTILES, np.percentile(values, ENSEMBLE_PERCENTILES))},
+        }
+    pooled = merge_summaries(r.stats for r in runs)
+    if pooled:
+        summary['distributions'] = {name: s.to_dict() for name, s in pooled.items()}
+    return summary
+
+
+def run_ensembles(scenarios, seed=42, members=100, days=None, engine=None, workers=None, cfg=None):
+    """
+    Runs `members` seeds of every scenario ({name: (priority, start_date)})
+    on a process pool. Each member gets its own random stream, so results
+    only depend on the base seed, not on the number of workers.
+    """
+    cfg = resolve(cfg)
+    if engine is None:
+        engine = cfg.SIMULATION_ENGINE
+    seeds = member_seeds(seed, members)
+    tasks = [(priority, start_date, s, days, engine, cfg) for priority, start_date in scenarios.values() for s in seeds]
+
+    if workers == 1:
+        runs = list(map(_run_member, tasks))
+    else:
+        workers = workers or os.cpu_count() or 1
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            runs = list(pool.map(_run_member, tasks, chunksize=chunksize))
+
+    return {name: summarize_ensemble(runs[i * members:(i + 1) * members]) for i, name in enumerate(scenarios)}
+
+
+SEASONAL_DATES = {
+    'WINTER': '15/01/2026',
+    'SPRING': '15/04/2026',
+    'SUMMER': '15/07/2026',
+    'FALL': '15/10/2026',
+}
 
-    strategies = {
-        'LOAD_PRIORITY': run_scenario(config.PRIORITY_OPTIONS.LOAD, config.DATE_OF_SIMULATION, seed=seed),
-        'CHARGE_PRIORITY': run_scenario(config.PRIORITY_OPTIONS.CHARGE, config.DATE_OF_SIMULATION, seed=seed),
-        'PRODUCE_PRIORITY': run_scenario(config.PRIORITY_OPTIONS.PRODUCE, config.DATE_OF_SIMULATION, seed=seed),
-    }
 
-    cloud_bins = {
-        'CLEAR(0.0-0.2)': [],
-        'PARTLY_CLOUDY(0.2-0.6)': [],
-        'MOSTLY_CLOUDY(0.6-0.8)': [],
-        'OVERCAST(0.8-1.0)': [],
+def _report_scenario(priority, start_date, seed, engine, cfg, trace=None):
+    return run_scenario(priority, start_date, seed=seed, engine=engine, trace=trace, cfg=cfg)
+
+
+def _cloud_impact(result):
+    return result.cloud_impact()
+
+
+def _tariff_comparison(result, cfg):
+    return {name: bill['net_balance'] for name, bill in result.bills(load_tariffs(cfg=cfg)).items()}
+
+
+def report_scenarios(cfg):
+    """{report section: (priority, start date)} of the runs in the summary report."""
+    date = cfg.DATE_OF_SIMULATION
+    scenarios = {('default_run',): (cfg.CHARGE_PRIORITY, date)}
+    for priority in config.PRIORITY_OPTIONS:
+        scenarios[('strategy_comparison', f'{priority.name}_PRIORITY')] = (priority, date)
+    for season, season_date in SEASONAL_DATES.items():
+        scenarios[('seasonal_comparison', season)] = (cfg.CHARGE_PRIORITY, season_date)
+    return scenarios
+
+
+def build_results(seed=42, engine=None, cfg=None, workers=1, on_section=None):
+    """
+    The summary report as a graph of scenario runs plus the cloud-impact
+    binning of the default run and the net balance of every strategy run
+    under the FLAT and TARIFFS tariffs (see scheduler.py). Identical runs (the
+    default run and the comparison run of CHARGE_PRIORITY) are simulated
+    once, cached ones not at all, and the rest run on `workers` processes
+    (None: all cores). `on_section(path, value)` gets every section as soon
+    as it is ready, e.g. (('strategy_comparison', 'LOAD_PRIORITY'), {...}).
+    """
+    cfg = resolve(cfg)
+    if engine is None:
+        engine = cfg.SIMULATION_ENGINE
+    date = cfg.DATE_OF_SIMULATION
+    # Same seed means same weather for every strategy; with the batch engine
+    # in one process it is also generated only once.
+    trace = None
+    if workers == 1 and engine == config.ENGINE_OPTIONS.BATCH:
+        trace = build_trace(date, seed, cfg=cfg)
+
+    report_config = {
+        'round_trip_efficiency': cfg.ROUND_TRIP_EFFICIENCY,
+        'import_cost': cfg.IMPORT_COST,
+        'export_cost': cfg.EXPORT_COST,
+        'default_strategy': str(cfg.CHARGE_PRIORITY),
+        'date_of_simulation': date,
     }
-    for r in base['log']:
-        cloud = float(r['Cloud_Cov'])
-        solar = float(r['Solar_Wh'])
-        grid_net = float(r['Grid_Net_Wh'])
-        soc = float(r['SoC_%'])
-        row = {'solar_wh': solar, 'grid_import_wh': max(0.0, -grid_net), 'grid_export_wh': max(0.0, grid_net), 'soc': soc}
-        if cloud < 0.2:
-            cloud_bins['CLEAR(0.0-0.2)'].append(row)
-        elif cloud < 0.6:
-            cloud_bins['PARTLY_CLOUDY(0.2-0.6)'].append(row)
-        elif cloud < 0.8:
-            cloud_bins['MOSTLY_CLOUDY(0.6-0.8)'].append(row)
+    if on_section is not None:
+        on_section(('config',), report_config)
+
+    scenarios = report_scenarios(cfg)
+
+    graph = TaskGraph()
+    for section, (priority, start_date) in scenarios.items():
+        hit = cached_scenario(priority, start_date, seed, cfg=cfg)
+        if hit is not None:
+            graph.done(section, hit, key=(priority, start_date))
         else:
-            cloud_bins['OVERCAST(0.8-1.0)'].append(row)
-
-    cloud_summary = {}
-    for k, rows in cloud_bins.items():
-        if not rows:
-            cloud_summary[k] = {'hours': 0}
-            continue
-        cloud_summary[k] = {
-            'hours': len(rows),
-            'avg_solar_wh_per_h': mean(x['solar_wh'] for x in rows),
-            'avg_grid_import_wh_per_h': mean(x['grid_import_wh'] for x in rows),
-            'avg_grid_export_wh_per_h': mean(x['grid_export_wh'] for x in rows),
-            'avg_soc_percent': mean(x['soc'] for x in rows),
-        }
+            graph.add(section, _report_scenario, priority, start_date, seed, engine, cfg,
+                      trace if start_date == date else None, key=(priority, start_date))
+    graph.add(('cloud_impact',), _cloud_impact, deps=[('default_run',)], local=True)
+    for section in scenarios:
+        if section[0] == 'strategy_comparison':
+            graph.add(('tariff_comparison', section[1]), _tariff_comparison, cfg, deps=[section], local=True)
 
-    seasonal_dates = {
-        'WINTER': '15/01/2026',
-        'SPRING': '15/04/2026',
-        'SUMMER': '15/07/2026',
-        'FALL': '15/10/2026',
+    def done(section, value):
+        if on_section is not None:
+            on_section(section, value.to_dict() if isinstance(value, ScenarioResult) else value)
+
+    values = graph.run(workers, done)
+
+    return {
+        'config': report_config,
+        'default_run': values[('default_run',)].to_dict(),
+        'strategy_comparison': {s[1]: values[s].to_dict() for s in scenarios if s[0] == 'strategy_comparison'},
+        'cloud_impact': values[('cloud_impact',)],
+        'seasonal_comparison': {s[1]: values[s].to_dict() for s in scenarios if s[0] == 'seasonal_comparison'},
+        'tariff_comparison': {s[1]: values[('tariff_comparison', s[1])] for s in scenarios if s[0] == 'strategy_comparison'},
     }
-    seasonal = {s: run_scenario(config.CHARGE_PRIORITY, d, seed=seed) for s, d in seasonal_dates.items()}
+
+
+def build_ensemble_results(seed=42, members=100, engine=None, workers=None, cfg=None):
+    cfg = resolve(cfg)
+    date = cfg.DATE_OF_SIMULATION
+    scenarios = {
+        'default_run': (cfg.CHARGE_PRIORITY, date),
+        'LOAD_PRIORITY': (config.PRIORITY_OPTIONS.LOAD, date),
+        'CHARGE_PRIORITY': (config.PRIORITY_OPTIONS.CHARGE, date),
+        'PRODUCE_PRIORITY': (config.PRIORITY_OPTIONS.PRODUCE, date),
+        'OPTIMAL_PRIORITY': (config.PRIORITY_OPTIONS.OPTIMAL, date),
+        'WINTER': (cfg.CHARGE_PRIORITY, '15/01/2026'),
+        'SPRING': (cfg.CHARGE_PRIORITY, '15/04/2026'),
+        'SUMMER': (cfg.CHARGE_PRIORITY, '15/07/2026'),
+        'FALL': (cfg.CHARGE_PRIORITY, '15/10/2026'),
+    }
+    ens = run_ensembles(scenarios, seed=seed, members=members, engine=engine, workers=workers, cfg=cfg)
 
     return {
         'config': {
-            'round_trip_efficiency': config.ROUND_TRIP_EFFICIENCY,
-            'import_cost': config.IMPORT_COST,
-            'export_cost': config.EXPORT_COST,
-            'default_strategy': str(config.CHARGE_PRIORITY),
-            'date_of_simulation': config.DATE_OF_SIMULATION,
+            'round_trip_efficiency': cfg.ROUND_TRIP_EFFICIENCY,
+            'import_cost': cfg.IMPORT_COST,
+            'export_cost': cfg.EXPORT_COST,
+            'default_strategy': str(cfg.CHARGE_PRIORITY),
+            'date_of_simulation': cfg.DATE_OF_SIMULATION,
+            'base_seed': seed,
+            'members': members,
         },
-        'default_run': {k: v for k, v in base.items() if k != 'log'},
-        'strategy_comparison': {k: {kk: vv for kk, vv in v.items() if kk != 'log'} for k, v in strategies.items()},
-        'cloud_impact': cloud_summary,
-        'seasonal_comparison': {k: {kk: vv for kk, vv in v.items() if kk != 'log'} for k, v in seasonal.items()},
+        'default_run': ens['default_run'],
+        'strategy_comparison': {k: ens[k] for k in ('LOAD_PRIORITY', 'CHARGE_PRIORITY', 'PRODUCE_PRIORITY', 'OPTIMAL_PRIORITY')},
+        'seasonal_comparison': {k: ens[k] for k in ('WINTER', 'SPRING', 'SUMMER', 'FALL')},
     }
 
 
 def main():
     parser = argparse.ArgumentParser(description='Generate simulation summary metrics as JSON.')
     parser.add_argument('--seed', type=int, default=42, help='Random seed for reproducible runs (default: 42)')
+    parser.add_argument(
+        '--engine',
+        choices=[e.name.lower() for e in config.ENGINE_OPTIONS],
+        default=config.SIMULATION_ENGINE.name.lower(),
+        help='Simulation engine to use (default: from config.SIMULATION_ENGINE)'
+    )
+    parser.add_argument(
+        '--members',
+        type=int,
+        default=1,
+        help='Seeds per scenario. Above 1, reports mean/std/percentile bands instead of a single run (default: 1)'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Worker processes for the scenario runs (default: all cores)'
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Print each report section as a JSON line as soon as it is ready (single-seed report only)'
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Print time and calls per simulation stage to stderr. Runs --members in this process.'
+    )
     parser.add_argument(
         '--output',
         type=str,
@@ -153,7 +369,19 @@ def main():
     )
     args = parser.parse_args()
 
-    out = build_results(seed=args.seed)
+    engine = config.ENGINE_OPTIONS[args.engine.upper()]
+    PROFILER.configure(args.profile)
+    # Worker processes would keep their timings to themselves.
+    workers = 1 if args.profile else args.workers
+    if args.members > 1:
+        out = build_ensemble_results(seed=args.seed, members=args.members, engine=engine, workers=workers)
+    else:
+        def stream(section, value):
+            print(json.dumps({'section': list(section), 'value': value}), flush=True)
+
+        out = build_results(seed=args.seed, engine=engine, workers=workers, on_section=stream if args.stream else None)
+        if args.stream and not args.output:
+            return
     payload = json.dumps(out, indent=2)
 
     if args.output:
@@ -164,6 +392,9 @@ def main():
     else:
         print(payload)
 
+    if PROFILER.enabled:
+        print(PROFILER.report(), file=sys.stderr)
+
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -1,5 +1,6 @@
-import csv
+import argparse
 from datetime import datetime, timedelta
+from time import perf_counter
 from simpy import Environment
 from config import *
 
@@ -9,105 +10,236 @@ from components.weather import Weather
 from components.inverter import Inverter
 from components.grid import Grid
 from components.home import Home
+from batch import SimulateBatch
+from telemetry import TRACER, INFO, configure_from_config
+from recorder import Recorder, COLUMNS, to_minutes
+from settings import SimulationConfig, resolve
+from online_stats import RunStats
+from reliability import Reliability
+from profiler import PROFILER
 
-def Simulate(env, weather, panel, home, inverter, battery, grid, bitacora, stats):
-    dt = datetime.strptime(DATE_OF_SIMULATION, "%d/%m/%Y")
+class Clock:
+    """
+    Date and env time of the next tick Simulate will run (kept for checkpoints).
+    `stop` is the env time the caller runs to when it stops before the horizon
+    (env.run(until=...)); event spans end there.
+    """
+
+    def __init__(self, dt, now=0.0, stop=None):
+        self.dt = dt
+        self.now = now
+        self.stop = stop
+
+def instrument(weather, panel, home, inverter, battery, grid, bitacora):
+    """Times the component calls Simulate makes (see profiler.py)."""
+    for obj, methods, prefix in ((weather, ("update", "observe"), "weather"),
+                                 (panel, ("update", "output"), "panel"),
+                                 (home, ("update",), "home"),
+                                 (inverter, ("update", "bypass"), "inverter"),
+                                 (battery, ("update",), "battery"),
+                                 (battery.storage, ("put", "get"), "battery"),
+                                 (grid, ("update",), "grid"),
+                                 (grid.exportLimit, ("put", "get"), "grid")):
+        if not hasattr(obj, "__dict__"):
+            continue                # slotted PlainContainer: its put/get stay in the caller's time
+        for method in methods:
+            PROFILER.wrap(obj, method, f"{prefix}.{method}")
+    if bitacora is not None:
+        PROFILER.wrap(bitacora, "record", "log.record")
+        PROFILER.wrap(bitacora, "flush", "log.flush")
+
+def Simulate(env, weather, panel, home, inverter, battery, grid, bitacora, stats, cfg=None, until=None, clock=None):
+    cfg = resolve(cfg)
+    tick = cfg.MINUTES_PER_TICK
+    h = tick / 60
+    if clock is None:
+        clock = Clock(datetime.strptime(cfg.DATE_OF_SIMULATION, "%d/%m/%Y"), env.now)
+    dt = clock.dt
+    minute = to_minutes(dt)
+    if until is None:
+        until = cfg.SIMULATION_DAYS * 24
+
+    reliability = Reliability((inverter.outage, battery.outage, grid.outage), inverter.rng)
+
+    def account():
+        unmet = max(0, home.totalLoad - (panel.generation + battery.level)) if inverter.is_failed else 0
+        if inverter.last_shed > unmet:
+            unmet = inverter.last_shed
+        stats.record(battery.batteryPercentage, weather.cloud_coverage, home.totalLoad, inverter.last_grid_flow, unmet)
+        
+        if battery.batteryPercentage >= 99.9: stats.full_hours += tick / 60
+        if battery.batteryPercentage <= 0.1: stats.empty_hours += tick / 60
+        
+        if unmet > 0: stats.unmet_events += 1
+
+        if bitacora is not None:
+            bitacora.record(minute, panel.generation, home.totalLoad, battery.batteryPercentage,
+                            inverter.last_grid_flow, weather.cloud_coverage, not inverter.is_failed)
+
+    def quiet(now):
+        # Nights need no per-tick event.
+        weather.observe(now)
+        return panel.output(now, weather.cloud_coverage, weather.irradiance) == 0
+
+    profile = PROFILER.enabled
+    if profile:
+        instrument(weather, panel, home, inverter, battery, grid, bitacora)
+        account = PROFILER.timed(account, "stats")
+        quiet = PROFILER.timed(quiet, "quiet")
     
     while True:
-        if env.now % 24 == 0:
+        weather.observe(env.now)
+        if dt.hour == 0 and dt.minute == 0:
             weather.update(dt)
-            inverter.updateCondition()
+            reliability.day(env.now)
             grid.update(dt.day)
+            if TRACER.info:
+                TRACER.emit(INFO, env.now, "weather", "update", weather=weather.weather, cloud=weather.cloud_coverage)
+
+        now = env.now
+        steps = 0
+        # Spans never book ticks past the point the caller stops at.
+        end = until if clock.stop is None else min(until, clock.stop)
+        if inverter.is_failed and not TRACER.debug:
+            # Outage window: one event span up to the repair (or the next
+            # midnight, where the day's weather and failures are drawn). The
+            # home just draws from the grid, so only the exogenous series and
+            # the accounting are stepped.
+            while now < end and inverter.is_failed and not (steps and dt.hour == 0 and dt.minute == 0):
+                weather.observe(now)
+                panel.generation = panel.output(now, weather.cloud_coverage, weather.irradiance)
+                home.update(now)
+                inverter.bypass(home.totalLoad)
+                reliability.advance(h, now)
+                account()
+                dt += timedelta(minutes=tick)
+                minute += tick
+                now += h
+                steps += 1
+
+        elif cfg.ADAPTIVE_STEPPING and not TRACER.debug:
+            # Coalesce a quiet stretch up to the next midnight into one event.
+            # The ticks are still dispatched one by one (same arithmetic, so
+            # identical aggregates and log rows), only the SimPy round trips
+            # and component updates are skipped.
+            while now < end and quiet(now) and not (steps and dt.hour == 0 and dt.minute == 0):
+                weather.observe(now)
+                panel.generation = panel.output(now, weather.cloud_coverage, weather.irradiance)
+                home.update(now)
+                inverter.update(panel.generation, home.totalLoad, now)
+                if reliability.down:
+                    reliability.advance(h, now)
+                account()
+                dt += timedelta(minutes=tick)
+                minute += tick
+                now += h
+                steps += 1
+
+        if steps:
+            clock.dt, clock.now = dt, now
+            if profile:
+                start = perf_counter()
+            if env.now + (now - env.now) == now:
+                yield env.timeout(now - env.now)
+            else:
+                # Keep env.now on the same float sequence as plain ticks.
+                for _ in range(steps):
+                    yield env.timeout(h)
+            if profile:
+                PROFILER.lap("simpy", start)
+            continue
 
         panel.update(weather.cloud_coverage)
         home.update()
         inverter.update(panel.generation, home.totalLoad)
         battery.update()
-        
-        stats["soc_history"].append(battery.batteryPercentage)
-        stats["cloud_history"].append(weather.cloud_coverage)
-        stats["load_history"].append(home.totalLoad)
-        
-        if battery.batteryPercentage >= 99.9: stats["full_hours"] += MINUTES_PER_TICK / 60
-        if battery.batteryPercentage <= 0.1: stats["empty_hours"] += MINUTES_PER_TICK / 60
-        
-        unmet = max(0, home.totalLoad - (panel.generation + battery.level)) if inverter.is_failed else 0
-        if unmet > 0: stats["unmet_events"] += 1
-
-       
-        bitacora.append({
-            "Timestamp": dt.strftime("%Y-%m-%d %H:%M"),
-            "Solar_Wh": f"{panel.generation:.2f}",
-            "House_Load_Wh": f"{home.totalLoad:.2f}",
-            "SoC_%": f"{battery.batteryPercentage:.2f}",
-            "Grid_Net_Wh": f"{inverter.last_grid_flow:.2f}",
-            "Cloud_Cov": f"{weather.cloud_coverage:.2f}",
-            "Inverter_OK": not inverter.is_failed
-        })
-
-        dt += timedelta(minutes=MINUTES_PER_TICK)
-        yield env.timeout(MINUTES_PER_TICK / 60)
+        if reliability.down:
+            reliability.advance(h, env.now)
+        account()
+
+        dt += timedelta(minutes=tick)
+        minute += tick
+        clock.dt, clock.now = dt, env.now + tick / 60
+        if profile:
+            start = perf_counter()
+        yield env.timeout(tick / 60)
+        if profile:
+            PROFILER.lap("simpy", start)
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description='Run the simulation and print the technical report.')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed; seeded runs are reproducible and served from the results cache')
+    parser.add_argument('--profile', action='store_true', help='Print time and calls per simulation stage after the report')
+    args = parser.parse_args()
+
     print(f"\n--- GREEN GRID DIGITAL TWIN | INICIANDO SIMULACIÓN MENSUAL ---")
-    env = Environment()
-    
+    configure_from_config()
+    PROFILER.configure(args.profile)
+    cfg = SimulationConfig()
+    # Imported here: sym_results imports this module.
+    from sym_results import run_scenario, scenario_metrics
 
-    battery = Battery(env, initial_charge=0, capacity=BATTERY_CAPACITY)
-    weather = Weather(env)
-    panel = Panel(env, battery, weather)
-    home = Home(env)
-    grid = Grid(env)
-    inverter = Inverter(env, panel, battery, home, grid, CHARGE_PRIORITY)
-    
-  
-    bitacora = []
-    stats = {
-        "soc_history": [], "cloud_history": [], "load_history": [],
-        "full_hours": 0, "empty_hours": 0, "unmet_events": 0
-    }
-    
+    bitacora = Recorder(cfg.LOG_FILE, cfg.LOG_CHUNK_ROWS)
 
-    env.process(Simulate(env, weather, panel, home, inverter, battery, grid, bitacora, stats))
-    env.run(until=SIMULATION_DAYS * 24)
+    if args.seed is not None:
+        # Same scenario as sym_results' comparison run: cached, then written out.
+        result = run_scenario(cfg.CHARGE_PRIORITY, cfg.DATE_OF_SIMULATION, seed=args.seed, cfg=cfg)
+        bitacora.extend(*(result.columns[name] for name, _ in COLUMNS))
+        metrics = result.metrics
+    else:
+        stats = RunStats(cfg)
 
-    
-    avg_soc = sum(stats["soc_history"]) / len(stats["soc_history"])
-    avg_cloud = sum(stats["cloud_history"]) / len(stats["cloud_history"])
-    peak_load = max(stats["load_history"])
-    
+        if cfg.SIMULATION_ENGINE == ENGINE_OPTIONS.BATCH:
+            # BatchResult exposes the same metrics/outage counters as Inverter
+            inverter = SimulateBatch(cfg.CHARGE_PRIORITY, cfg.DATE_OF_SIMULATION, cfg.SIMULATION_DAYS, bitacora, stats, cfg=cfg)
+        else:
+            env = Environment()
+
+            battery = Battery(env, initial_charge=0, cfg=cfg)
+            weather = Weather(env, cfg=cfg)
+            panel = Panel(env, battery, weather, cfg)
+            home = Home(env, cfg)
+            grid = Grid(env, cfg)
+            inverter = Inverter(env, panel, battery, home, grid, cfg.CHARGE_PRIORITY, cfg=cfg)
 
-    total_import_kwh = inverter.metrics['total_grid_import'] / 1000
-    total_export_kwh = inverter.metrics['total_grid_export'] / 1000
-    gasto = total_import_kwh * IMPORT_COST
-    ganancia = total_export_kwh * EXPORT_COST
+            env.process(Simulate(env, weather, panel, home, inverter, battery, grid, bitacora, stats, cfg, cfg.SIMULATION_DAYS * 24))
+            env.run(until=cfg.SIMULATION_DAYS * 24)
+        metrics = scenario_metrics(inverter, stats, cfg)
+    TRACER.close()
+
+    gasto = metrics['grid_import_kwh'] * cfg.IMPORT_COST
+    ganancia = metrics['grid_export_kwh'] * cfg.EXPORT_COST
     balance_neto = ganancia - gasto
 
  
     print("\n" + "="*55)
     print("        TECHNICAL REPORT - SIMULATION SUMMARY (30 DAYS)        ")
     print("="*55)
-    print(f"1. Average Monthly SoC:           {avg_soc:.2f}%")
-    print(f"2. Hours Battery Full:            {stats['full_hours']} hrs")
-    print(f"3. Hours Battery Empty:           {stats['empty_hours']} hrs")
-    print(f"4. Total Solar Energy:            {inverter.metrics['total_solar_gen']/1000:.2f} kWh")
-    print(f"5. Total Household Consumption:   {inverter.metrics['total_load_served']/1000:.2f} kWh")
-    print(f"6. Inverter Failures:             {inverter.fail_count} events")
-    print(f"7. Total Downtime:                {inverter.total_downtime} hrs")
-    print(f"8. Average Cloud Coverage:        {avg_cloud:.2f}")
-    print(f"9. Peak Load Demand:              {peak_load:.2f} W")
-    print(f"10. Unmet Load Events:            {stats['unmet_events']}")
+    print(f"1. Average Monthly SoC:           {metrics['avg_soc']:.2f}%")
+    print(f"2. Hours Battery Full:            {metrics['full_hours']} hrs")
+    print(f"3. Hours Battery Empty:           {metrics['empty_hours']} hrs")
+    print(f"4. Total Solar Energy:            {metrics['solar_kwh']:.2f} kWh")
+    print(f"5. Total Household Consumption:   {metrics['load_kwh']:.2f} kWh")
+    print(f"6. Inverter Failures:             {metrics['inverter_failures']} events")
+    print(f"7. Total Downtime:                {metrics['total_downtime_h']} hrs")
+    print(f"8. Average Cloud Coverage:        {metrics['avg_cloud']:.2f}")
+    print(f"9. Peak Load Demand:              {metrics['peak_load_w']:.2f} W")
+    print(f"10. Unmet Load Events:            {metrics['unmet_events']}")
+    print(f"11. Battery Faults:               {metrics['battery_faults']} events ({metrics['battery_fault_h']} hrs)")
+    print(f"12. Grid Outages:                 {metrics['grid_outages']} events ({metrics['grid_outage_h']} hrs)")
     print("-" * 55)
     print(f">> ECONOMIC BALANCE: {balance_neto:.2f} cents")
     print(f"   (Cost: -{gasto:.2f} | Credit: +{ganancia:.2f})")
     print("="*55)
 
-    with open('Monthly_Summary.csv', 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=bitacora[0].keys())
-        writer.writeheader()
-        writer.writerows(bitacora)
-    
-    print(f"\n>>> Simulation finished. Log with {len(bitacora)} records saved.")
+    bitacora.close()
+    print(f"\n>>> Simulation finished. Log with {len(bitacora)} records saved to {cfg.LOG_FILE}.")
+
+    if PROFILER.enabled:
+        print("\n" + "="*55)
+        print("        PROFILE - TIME PER STAGE        ")
+        print("="*55)
+        print(PROFILER.report())
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
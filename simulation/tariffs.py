@@ -0,0 +1,269 @@
+"""
+Tariff engine of the Green Grid Digital Twin.
+
+Bills a run from its per-tick grid series (Grid_Net_Wh) under any number of
+tariffs at once, without simulating again. A tariff can combine:
+
+- import/export prices per kWh: one number, 24 hourly prices or 7x24
+  (Monday first) for time-of-use rates
+- tiers: surcharges per kWh on top of the import price by block of the
+  month's import, e.g. ((200, 0.0), (None, 0.25))
+- a demand charge per kW of the month's peak import, optionally only
+  counting the hours in `demand_hours`
+- a monthly export cap in kWh, with the excess paid at `excess_export_rate`
+- net metering: the month's export credit is at most its energy charges
+- an export limit in W: power above it is not paid
+- a fixed charge per calendar month
+
+A run is reduced once to its billing determinants (Usage: energy per month
+and hour of the week, monthly peaks per hour of day), then every tariff is
+priced with a few array operations, so hundreds of tariffs cost
+milliseconds. Billing does not feed back into the dispatch: OPTIMAL still
+plans with the flat IMPORT_COST/EXPORT_COST.
+
+    python tariffs.py --strategy OPTIMAL
+    python tariffs.py --log Monthly_Summary.csv --tariffs my_tariffs.json
+"""
+
+import argparse
+import json
+import math
+import sys
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+
+SIM_DIR = Path(__file__).resolve().parent
+if str(SIM_DIR) not in sys.path:
+    sys.path.insert(0, str(SIM_DIR))
+
+import config
+from recorder import read_log
+from settings import resolve
+
+WEEK = 7 * 24
+FIELDS = ("import_rate", "export_rate", "tiers", "demand_charge", "demand_hours", "export_cap_kwh",
+          "excess_export_rate", "net_metering", "export_limit_w", "fixed_charge")
+
+
+def week_rates(rate):
+    """Price of every hour of the week (Monday 00:00 first) from a number, 24 hourly or 7x24 prices."""
+    table = np.asarray(rate, dtype=float)
+    if table.ndim == 0 or table.shape == (24,):
+        return np.broadcast_to(table, (7, 24)).reshape(WEEK).copy()
+    if table.shape == (7, 24):
+        return table.reshape(WEEK).copy()
+    raise ValueError(f"rates must be a number, 24 hourly or 7x24 prices, got shape {table.shape}")
+
+
+class Tariff:
+    def __init__(self, name, import_rate=0.0, export_rate=0.0, tiers=(), demand_charge=0.0, demand_hours=None,
+                 export_cap_kwh=None, excess_export_rate=0.0, net_metering=False, export_limit_w=None,
+                 fixed_charge=0.0):
+        self.name = name
+        self.import_rate = week_rates(import_rate)
+        self.export_rate = week_rates(export_rate)
+        # (upper kWh of the month's import, surcharge per kWh); None is open-ended.
+        self.tiers = [(math.inf if upto is None else float(upto), float(price)) for upto, price in tiers]
+        self.demand_charge = demand_charge
+        self.demand_hours = np.ones(24, dtype=bool) if demand_hours is None else np.isin(np.arange(24), demand_hours)
+        self.export_cap_kwh = export_cap_kwh
+        self.excess_export_rate = excess_export_rate
+        self.net_metering = net_metering
+        self.export_limit_w = export_limit_w
+        self.fixed_charge = fixed_charge
+
+    @classmethod
+    def flat(cls, cfg=None):
+        """The flat IMPORT_COST/EXPORT_COST tariff the metrics use."""
+        cfg = resolve(cfg)
+        return cls("FLAT", cfg.IMPORT_COST, cfg.EXPORT_COST)
+
+    @classmethod
+    def from_dict(cls, name, spec):
+        unknown = set(spec) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"tariff {name}: unknown fields {sorted(unknown)}")
+        return cls(name, **spec)
+
+
+def load_tariffs(tariffs=None, cfg=None):
+    """FLAT plus the tariffs of {name: spec or Tariff} (default: config.TARIFFS)."""
+    cfg = resolve(cfg)
+    if tariffs is None:
+        tariffs = cfg.TARIFFS
+    return [Tariff.flat(cfg)] + [spec if isinstance(spec, Tariff) else Tariff.from_dict(name, spec)
+                                 for name, spec in tariffs.items()]
+
+
+class Usage:
+    """
+    Billing determinants of one run: import and export kWh per month and
+    hour of the week, peak import W per month and hour of day, plus the
+    per-tick export for tariffs where the order of exports matters.
+    """
+
+    def __init__(self, timestamps, grid_net_wh, minutes_per_tick=None):
+        minutes = np.asarray(timestamps, dtype=np.int64)
+        net = np.asarray(grid_net_wh, dtype=float)
+        if minutes_per_tick is None:
+            minutes_per_tick = int(minutes[1] - minutes[0]) if len(minutes) > 1 else 60
+        self.h = minutes_per_tick / 60
+        self.months, self.month = np.unique(minutes.astype("datetime64[m]").astype("datetime64[M]"),
+                                            return_inverse=True)
+        self.month = self.month.reshape(-1)
+        hour = (minutes // 60) % 24
+        # 1970-01-01 was a Thursday.
+        self.slot = ((minutes // (24 * 60) + 3) % 7) * 24 + hour
+        self.cell = self.month * WEEK + self.slot
+        self.import_wh = np.maximum(0.0, -net)
+        self.export_wh = np.maximum(0.0, net)
+        self.import_kwh = self._bins(self.import_wh)
+        self.export_kwh = self._bins(self.export_wh)
+        peaks = np.zeros(len(self.months) * 24)
+        np.maximum.at(peaks, self.month * 24 + hour, self.import_wh / self.h)
+        self.peak_w = peaks.reshape(-1, 24)
+        self._limited = {}
+
+    @classmethod
+    def from_columns(cls, columns, minutes_per_tick=None):
+        return cls(columns["Timestamp"], columns["Grid_Net_Wh"], minutes_per_tick)
+
+    def _bins(self, wh):
+        return np.bincount(self.cell, weights=wh, minlength=len(self.months) * WEEK).reshape(-1, WEEK) / 1000
+
+    def exports(self, limit_w=None):
+        """(per-tick Wh, kWh per month and hour of the week) of the export paid under a limit in W."""
+        if limit_w is None:
+            return self.export_wh, self.export_kwh
+        if limit_w not in self._limited:
+            wh = np.minimum(self.export_wh, limit_w * self.h)
+            self._limited[limit_w] = (wh, self._bins(wh))
+        return self._limited[limit_w]
+
+    def paid_before(self, wh):
+        """Wh exported earlier in the same month, per tick."""
+        before = np.cumsum(wh) - wh
+        starts = np.flatnonzero(np.r_[True, self.month[1:] != self.month[:-1]])
+        return before - before[starts][self.month]
+
+
+def _capped_credit(usage, tariff, wh, kwh):
+    """Monthly export credit of a tariff with an export cap."""
+    cap = tariff.export_cap_kwh
+    monthly = kwh.sum(axis=1)
+    excess = np.maximum(0.0, monthly - cap) * tariff.excess_export_rate
+    rates = tariff.export_rate
+    if np.all(rates == rates[0]):
+        return np.minimum(monthly, cap) * rates[0] + excess
+    # Time-of-use export: the first `cap` kWh of each month are paid at their hour's price.
+    paid = np.clip(cap * 1000 - usage.paid_before(wh), 0.0, wh)
+    return np.bincount(usage.month, weights=paid * rates[usage.slot], minlength=len(usage.months)) / 1000 + excess
+
+
+def bill_many(usage, tariffs):
+    """
+    Bills of one run (Usage) under every tariff. Returns {name: bill} with
+    the charge components, the total and `net_balance` (credits minus
+    charges, like the scenario metric), each also per month.
+    """
+    n_months = len(usage.months)
+    import_rates = np.stack([t.import_rate for t in tariffs])
+    export_rates = np.stack([t.export_rate for t in tariffs])
+    energy = usage.import_kwh @ import_rates.T
+
+    # Tier blocks padded to the longest tier list (empty blocks cost nothing).
+    blocks = max(1, max(len(t.tiers) for t in tariffs))
+    lower = np.zeros((len(tariffs), blocks))
+    upper = np.zeros((len(tariffs), blocks))
+    surcharge = np.zeros((len(tariffs), blocks))
+    for i, t in enumerate(tariffs):
+        bottom = 0.0
+        for j, (upto, price) in enumerate(t.tiers):
+            lower[i, j], upper[i, j], surcharge[i, j] = bottom, upto, price
+            bottom = upto
+    monthly_import = usage.import_kwh.sum(axis=1)
+    in_block = np.clip(monthly_import[:, None, None] - lower, 0.0, upper - lower)
+    tiers = (in_block * surcharge).sum(axis=2)
+
+    demand_hours = np.stack([t.demand_hours for t in tariffs])
+    peak_kw = np.where(demand_hours, usage.peak_w[:, None, :], 0.0).max(axis=2) / 1000
+    demand = peak_kw * np.array([t.demand_charge for t in tariffs], dtype=float)
+
+    fixed = np.broadcast_to(np.array([t.fixed_charge for t in tariffs], dtype=float), (n_months, len(tariffs)))
+
+    credit = np.zeros((n_months, len(tariffs)))
+    by_limit = {}
+    for i, t in enumerate(tariffs):
+        by_limit.setdefault(t.export_limit_w, []).append(i)
+    for limit, members in by_limit.items():
+        wh, kwh = usage.exports(limit)
+        credit[:, members] = kwh @ export_rates[members].T
+        for i in members:
+            if tariffs[i].export_cap_kwh is not None:
+                credit[:, i] = _capped_credit(usage, tariffs[i], wh, kwh)
+    net_metering = np.array([t.net_metering for t in tariffs], dtype=bool)
+    credit = np.where(net_metering, np.minimum(credit, energy + tiers), credit)
+
+    parts = {
+        "import_charges": energy,
+        "tier_charges": tiers,
+        "demand_charges": demand,
+        "fixed_charges": fixed,
+        "export_credit": credit,
+    }
+    total = energy + tiers + demand + fixed - credit
+    months = [str(month) for month in usage.months]
+    bills = {}
+    for i, t in enumerate(tariffs):
+        bill = {name: float(values[:, i].sum()) for name, values in parts.items()}
+        bill["peak_import_kw"] = float(peak_kw[:, i].max()) if n_months else 0.0
+        bill["total"] = float(total[:, i].sum())
+        bill["net_balance"] = -bill["total"]
+        bill["monthly_total"] = dict(zip(months, total[:, i].tolist()))
+        bills[t.name] = bill
+    return bills
+
+
+def bill(usage, tariff):
+    return bill_many(usage, [tariff])[tariff.name]
+
+
+def main():
+    # Imported here: sym_results imports this module through results.py.
+    from sym_results import run_scenario
+
+    parser = argparse.ArgumentParser(description='Bill one run under many tariffs without re-simulating.')
+    parser.add_argument('--log', type=str, default='', help='Recorded log to bill (.csv or columnar); default: simulate --strategy')
+    parser.add_argument('--strategy', choices=[p.name for p in config.PRIORITY_OPTIONS], default=config.CHARGE_PRIORITY.name, help='Strategy to simulate (default: config.CHARGE_PRIORITY)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed of the simulated run (default: 42)')
+    parser.add_argument('--tariffs', type=str, default='', help='JSON file of {name: tariff}; default: config.TARIFFS')
+    parser.add_argument('--output', type=str, default='', help='Optional output JSON file path')
+    args = parser.parse_args()
+
+    if args.log:
+        columns = read_log(args.log)
+        source = args.log
+    else:
+        columns = run_scenario(config.PRIORITY_OPTIONS[args.strategy], config.DATE_OF_SIMULATION, seed=args.seed).columns
+        source = f'{args.strategy}_PRIORITY'
+    specs = json.loads(Path(args.tariffs).read_text(encoding='utf-8')) if args.tariffs else None
+
+    start = perf_counter()
+    bills = bill_many(Usage.from_columns(columns), load_tariffs(specs))
+    out = {'source': source, 'ticks': len(columns['Timestamp']), 'elapsed_ms': (perf_counter() - start) * 1000,
+           'bills': bills}
+    payload = json.dumps(out, indent=2)
+
+    if args.output:
+        output_path = Path(args.output).expanduser().resolve()
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_text(payload + '\n', encoding='utf-8')
+        print(f'Results written to {output_path}')
+    else:
+        print(payload)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Structured tracing for the Green Grid Digital Twin.
+
+Components report what they do as events (time, level, component, event,
+fields) instead of printing. Events only reach the sinks attached to the
+tracer, and a component checks `TRACER.debug` / `TRACER.info` before building
+one, so with tracing off the hot path does no formatting or I/O at all.
+"""
+
+import json
+from collections import deque
+
+DEBUG = 10                          # Per-tick state (battery level, generation, load)
+INFO = 20                           # Daily and state changes (weather draw, inverter failure/repair)
+OFF = 100
+
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "OFF": OFF}
+
+
+class Tracer:
+    def __init__(self):
+        self.sinks = []
+        self.level = OFF
+        self.sample_every = 1
+        self._counters = {}
+        self._refresh()
+
+    def configure(self, level=OFF, sinks=(), sample_every=1):
+        """Replaces level, sinks and sampling in place, so components holding TRACER see the change."""
+        self.level = LEVELS[level] if isinstance(level, str) else level
+        self.sinks = list(sinks)
+        self.sample_every = max(1, int(sample_every))
+        self._counters = {}
+        self._refresh()
+
+    def _refresh(self):
+        active = bool(self.sinks)
+        self.debug = active and self.level <= DEBUG
+        self.info = active and self.level <= INFO
+
+    def emit(self, level, time, component, event, **fields):
+        """
+        Sends an event to every sink. DEBUG events are sampled: only one in
+        every `sample_every` of each (component, event) pair goes through.
+        """
+        if level < self.level:
+            return
+        if level == DEBUG and self.sample_every > 1:
+            key = (component, event)
+            seen = self._counters.get(key, 0)
+            self._counters[key] = seen + 1
+            if seen % self.sample_every:
+                return
+        record = (time, level, component, event, fields)
+        for sink in self.sinks:
+            sink(record)
+
+    def close(self):
+        for sink in self.sinks:
+            if hasattr(sink, "close"):
+                sink.close()
+
+
+def format_record(record):
+    time, level, component, event, fields = record
+    values = " ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in fields.items())
+    return f"[{time:8.2f}h] {component}.{event} {values}"
+
+
+class RingBufferSink:
+    """Keeps the last `maxlen` events in memory."""
+
+    def __init__(self, maxlen=10000):
+        self.records = deque(maxlen=maxlen)
+
+    def __call__(self, record):
+        self.records.append(record)
+
+
+class ConsoleSink:
+    def __call__(self, record):
+        print(format_record(record))
+
+
+class FileSink:
+    """Writes one JSON object per event."""
+
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8")
+
+    def __call__(self, record):
+        time, level, component, event, fields = record
+        self.file.write(json.dumps({"t": time, "level": level, "component": component, "event": event, **fields}) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class CallbackSink:
+    def __init__(self, callback):
+        self.callback = callback
+
+    def __call__(self, record):
+        self.callback(*record)
+
+
+TRACER = Tracer()
+
+
+def configure_from_config():
+    """Sets up TRACER from TRACE_LEVEL / TRACE_FILE / TRACE_SAMPLE_EVERY in config.py."""
+    from config import TRACE_LEVEL, TRACE_FILE, TRACE_SAMPLE_EVERY
+    if LEVELS[TRACE_LEVEL] >= OFF:
+        TRACER.configure()
+        return
+    sink = FileSink(TRACE_FILE) if TRACE_FILE else ConsoleSink()
+    TRACER.configure(TRACE_LEVEL, [sink], TRACE_SAMPLE_EVERY)
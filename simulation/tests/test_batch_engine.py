@@ -0,0 +1,42 @@
+"""The batch engine must agree with SimPy on the same seed and settings."""
+
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+SIM_DIR = Path(__file__).resolve().parents[1]
+if str(SIM_DIR) not in sys.path:
+    sys.path.insert(0, str(SIM_DIR))
+
+import config
+from settings import SimulationConfig
+from sym_results import run_scenario
+
+
+@pytest.fixture
+def load_profile(tmp_path):
+    # 15-minute smart-meter samples with a daily shape, a few days either side of the run.
+    start = datetime(2026, 4, 28)
+    path = tmp_path / "load.csv"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("timestamp,load_w\n")
+        for k in range(12 * 24 * 4):
+            dt = start + timedelta(minutes=15 * k)
+            load = 400 + 300 * np.sin(np.pi * (dt.hour + dt.minute / 60) / 24) ** 2 + 50 * (k % 7)
+            f.write(f"{dt:%Y-%m-%d %H:%M},{load:.1f}\n")
+    return path
+
+
+@pytest.mark.parametrize("priority", list(config.PRIORITY_OPTIONS))
+def test_batch_matches_simpy_with_load_profile(load_profile, tmp_path, priority):
+    cfg = SimulationConfig(LOAD_PROFILE=str(load_profile), LOAD_PROFILE_CACHE_DIR=str(tmp_path / "cache"))
+    runs = {engine: run_scenario(priority, "01/05/2026", seed=7, days=5, engine=engine, cfg=cfg, cache=False)
+            for engine in (config.ENGINE_OPTIONS.SIMPY, config.ENGINE_OPTIONS.BATCH)}
+    simpy, batch = runs[config.ENGINE_OPTIONS.SIMPY], runs[config.ENGINE_OPTIONS.BATCH]
+
+    assert batch.to_dict() == pytest.approx(simpy.to_dict())
+    np.testing.assert_allclose(batch.load_wh, simpy.load_wh)
+    assert np.ptp(batch.load_wh) > 0
@@ -0,0 +1,79 @@
+"""Event spans (inverter outages, adaptive nights) must stop where the caller stops."""
+
+import math
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+SIM_DIR = Path(__file__).resolve().parents[1]
+if str(SIM_DIR) not in sys.path:
+    sys.path.insert(0, str(SIM_DIR))
+
+import config
+from checkpoint import SimulationRun
+from live import SiteTwin
+from settings import SimulationConfig
+
+
+def _twin(cfg, lookahead, inverter_ok, hour=20):
+    twin = SiteTwin("site", cfg=cfg, lookahead_hours=lookahead)
+    twin.sync({"timestamp": f"2026-05-10 {hour:02d}:00", "soc": 10, "inverter_ok": inverter_ok, "downtime_h": 30})
+    return twin
+
+
+def _stepped(twin):
+    """The look-ahead of twin.forecast(), advanced one tick per env.run call."""
+    cfg, state = twin.state(random.Random(f"{twin.site}|{twin.dt.isoformat()}"))
+    now = state["clock"]["now"]
+    until = now + twin.lookahead
+    run = SimulationRun(twin.priority, cfg, random.Random(), math.ceil(until / 24), None, state)
+    h = cfg.MINUTES_PER_TICK / 60
+    while run.env.now < until:
+        run.run(min(run.env.now + h, until) / 24)
+    return run
+
+
+@pytest.mark.parametrize("tick", [15, 60])
+@pytest.mark.parametrize("lookahead", [2, 24])
+def test_outage_lookahead_matches_tick_stepping(tick, lookahead):
+    cfg = SimulationConfig(MINUTES_PER_TICK=tick, BASE_LOAD=500, LOAD_PROFILE="")
+    twin = _twin(cfg, lookahead, inverter_ok=False)
+    forecast = twin.forecast()
+    run = _stepped(twin)
+
+    # The whole load is imported while the inverter is down (metrics add one load per tick).
+    assert forecast["grid_import_kwh"] == pytest.approx(0.5 * lookahead * 60 / tick)
+    assert forecast["grid_import_kwh"] == pytest.approx(run.inverter.metrics["total_grid_import"] / 1000)
+    assert forecast["unmet_events"] == run.stats.unmet_events
+    assert forecast["soc_end"] == pytest.approx(run.battery.batteryPercentage)
+
+
+@pytest.mark.parametrize("lookahead", [2, 6])
+def test_adaptive_night_lookahead_matches_tick_stepping(lookahead):
+    cfg = SimulationConfig(INVERTER_FAIL_PROB=0.0, BASE_LOAD=500, LOAD_PROFILE="")
+    plain = _twin(cfg.replace(ADAPTIVE_STEPPING=False), lookahead, inverter_ok=True, hour=21).forecast()
+    twin = _twin(cfg.replace(ADAPTIVE_STEPPING=True), lookahead, inverter_ok=True, hour=21)
+    forecast = twin.forecast()
+    run = _stepped(twin)
+
+    assert run.inverter.metrics["total_load_served"] == pytest.approx(500 * lookahead)
+    for name in ("grid_import_kwh", "soc_end", "soc_min", "unmet_events"):
+        assert forecast[name] == pytest.approx(plain[name])
+    assert forecast["grid_import_kwh"] == pytest.approx(run.inverter.metrics["total_grid_import"] / 1000)
+    assert forecast["soc_end"] == pytest.approx(run.battery.batteryPercentage)
+
+
+@pytest.mark.parametrize("adaptive", [False, True])
+def test_fractional_run_pauses_at_requested_time(adaptive):
+    cfg = SimulationConfig(ADAPTIVE_STEPPING=adaptive, INVERTER_FAIL_PROB=0.5, MINUTES_PER_TICK=60)
+    whole = SimulationRun(config.PRIORITY_OPTIONS.LOAD, cfg, random.Random(3), days=4).run()
+
+    run = SimulationRun(config.PRIORITY_OPTIONS.LOAD, cfg, random.Random(3), days=4)
+    for day in (0.3, 1.55, 2.9):
+        run.run(day)
+        # Paused on the first tick at or after the requested time, as plain ticks do.
+        assert run.clock.now == math.ceil(day * 24)
+        run = SimulationRun.restore(run.checkpoint())
+    assert run.run().metrics() == pytest.approx(whole.metrics())
@@ -0,0 +1,75 @@
+"""Live twin fed from an async telemetry stream."""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+SIM_DIR = Path(__file__).resolve().parents[1]
+if str(SIM_DIR) not in sys.path:
+    sys.path.insert(0, str(SIM_DIR))
+
+from live import LiveTwin
+from settings import SimulationConfig
+
+CFG = SimulationConfig(GRID_CONSTRAINT=20000, BATTERY_CAPACITY=10000, LOAD_PROFILE="", WEATHER_FILE="")
+
+ACCEPTED = [
+    {"site": "a", "timestamp": "2026-05-31 10:00", "grid_w": 0, "battery_wh": 5000, "cloud": 0.2},
+    # 1000 W exported for 2 h.
+    {"site": "a", "timestamp": "2026-05-31 12:00", "grid_w": 1000, "battery_wh": 6000},
+    # New month: the export counter starts over.
+    {"site": "a", "timestamp": "2026-06-01 01:00", "grid_w": 0, "soc": 40, "inverter_ok": False, "downtime_h": 3},
+]
+REJECTED = [
+    # Same reading as the second accepted message but a bad battery field.
+    {"site": "a", "timestamp": "2026-05-31 12:00", "grid_w": 1000, "battery_wh": "bad"},
+    # Older than the last accepted message.
+    {"site": "a", "timestamp": "2026-05-31 11:00", "grid_w": 1000, "battery_wh": 1000},
+]
+
+
+async def stream(messages):
+    for message in messages:
+        yield json.dumps(message) + "\n"
+
+
+def run(messages):
+    twin = LiveTwin(CFG, lookahead_hours=6)
+    forecasts = []
+    asyncio.run(twin.run(stream(messages), forecasts.append))
+    return twin, forecasts
+
+
+def _comparable(forecast):
+    return {name: value for name, value in forecast.items() if name != "compute_ms"}
+
+
+def test_rejected_messages_leave_no_trace():
+    messages = [ACCEPTED[0], REJECTED[0], ACCEPTED[1], REJECTED[1], ACCEPTED[2]]
+    twin, forecasts = run(messages)
+    _, clean = run(ACCEPTED)
+
+    assert twin.rejected == 2
+    assert [f["timestamp"] for f in forecasts] == ["2026-05-31 10:00", "2026-05-31 12:00", "2026-06-01 01:00"]
+    assert [_comparable(f) for f in forecasts] == [_comparable(f) for f in clean]
+
+    # The export of the rejected message is counted once.
+    assert forecasts[1]["export_left_kwh"] == pytest.approx(18.0)
+    assert forecasts[1]["soc"] == pytest.approx(60.0)
+
+
+def test_month_rollover_resets_export_and_keeps_failure():
+    twin, forecasts = run(ACCEPTED)
+    site = twin.sites["a"]
+    last = forecasts[-1]
+
+    assert site.export_used == 0.0
+    assert last["export_left_kwh"] == pytest.approx(20.0)
+    assert last["soc"] == pytest.approx(40.0)
+    assert last["inverter_ok"] is False
+    # Night with the inverter down: the whole 6 h look-ahead is imported.
+    assert last["grid_import_kwh"] > 0 and last["solar_kwh"] == pytest.approx(0.0)
+    assert last["lookahead_h"] == 6
@@ -0,0 +1,61 @@
+"""OPTIMAL planning per installation kind in fleets."""
+
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+SIM_DIR = Path(__file__).resolve().parents[1]
+if str(SIM_DIR) not in sys.path:
+    sys.path.insert(0, str(SIM_DIR))
+
+import config
+from batch import build_exogenous
+from fleet import Fleet, SimulateFleet
+from planner import installations
+from settings import SimulationConfig
+from sym_results import run_scenario
+
+OPTIMAL = config.PRIORITY_OPTIONS.OPTIMAL
+# A large export allowance keeps the planner in charge all month.
+CFG = SimulationConfig(GRID_CONSTRAINT=400000, INVERTER_FAIL_PROB=0.0)
+
+
+def test_installations_are_exact_up_to_the_limit():
+    params = np.array([[1.0, 2, 3, 1], [5, 6, 7, 1], [1, 2, 3, 1]])
+    kind, kinds = installations(params, 2)
+    np.testing.assert_array_equal(kinds[kind], params)
+
+    rng = np.random.default_rng(0)
+    params = rng.uniform(0.7, 1.3, (500, 4)) * [13500, 5000, 4000, 1]
+    kind, kinds = installations(params, 16)
+    assert len(kinds) <= 16 and kind.max() == len(kinds) - 1
+    # Representatives are the means of their homes.
+    np.testing.assert_allclose(kinds[3], params[kind == 3].mean(axis=0))
+
+
+def test_uniform_fleet_matches_single_home():
+    trace = build_exogenous(CFG.DATE_OF_SIMULATION, 10, random.Random(4), CFG)
+    single = run_scenario(OPTIMAL, CFG.DATE_OF_SIMULATION, trace=trace, cfg=CFG, log=False, cache=False)
+    fleet = SimulateFleet(Fleet.uniform(50, OPTIMAL, CFG), trace, shared_failures=True, cfg=CFG)
+
+    for name in ("total_grid_import", "total_grid_export"):
+        np.testing.assert_allclose(fleet.homes[name], single[name.replace("total_", "") + "_kwh"] * 1000)
+
+
+def test_shared_plans_keep_most_of_the_gain_over_load():
+    trace = build_exogenous(CFG.DATE_OF_SIMULATION, 10, random.Random(4), CFG)
+    fleet = Fleet.sample(300, np.random.default_rng(3), CFG, priorities=[OPTIMAL])
+
+    def balance(priority, cfg):
+        homes = Fleet(fleet.capacity, fleet.solar_peak, fleet.clipping, np.full(len(fleet), priority.value),
+                      fleet.load_scale)
+        return SimulateFleet(homes, trace, rng=np.random.default_rng(1), cfg=cfg).net_balance.sum()
+
+    load = balance(config.PRIORITY_OPTIONS.LOAD, CFG)
+    exact = balance(OPTIMAL, CFG.replace(PLANNER_FLEET_INSTALLATIONS=len(fleet)))
+    shared = balance(OPTIMAL, CFG.replace(PLANNER_FLEET_INSTALLATIONS=16))
+    assert exact > load
+    assert shared - load == pytest.approx(exact - load, rel=0.1)
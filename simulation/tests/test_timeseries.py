@@ -0,0 +1,58 @@
+"""Resampling of recorded series inside and outside their range."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+SIM_DIR = Path(__file__).resolve().parents[1]
+if str(SIM_DIR) not in sys.path:
+    sys.path.insert(0, str(SIM_DIR))
+
+from load_profile import open_profile
+from timeseries import WEEK, TimeSeries, write_series
+
+DAY = 24 * 60
+FIRST = 1_000_000
+
+
+def _ramp(tmp_path, days):
+    """Hourly samples whose value is the minutes since the first sample."""
+    minutes = FIRST + np.arange(0, days * DAY + 1, 60)
+    write_series(minutes, minutes - FIRST, tmp_path / "ramp.npy")
+    return TimeSeries(tmp_path / "ramp.npy")
+
+
+def test_tail_after_last_full_week_is_not_wrapped(tmp_path):
+    series = _ramp(tmp_path, 10)
+    # Days 8 and 9 lie past the last whole week but inside the recording.
+    start = 8 * DAY
+    values = series.window(FIRST + start, 48, 60)
+    np.testing.assert_allclose(values, start + np.arange(48) * 60 + 30)
+
+
+def test_outside_range_repeats_whole_weeks(tmp_path):
+    series = _ramp(tmp_path, 10)
+    after = 12 * DAY
+    np.testing.assert_allclose(series.window(FIRST + after, 24, 60), series.window(FIRST + after - WEEK, 24, 60))
+    before = -2 * DAY
+    np.testing.assert_allclose(series.window(FIRST + before, 24, 60), series.window(FIRST + before + WEEK, 24, 60))
+
+
+def test_tick_across_the_end_is_continuous(tmp_path):
+    series = _ramp(tmp_path, 10)
+    # Half the tick is the last recorded half hour, half the repeat of the week before.
+    (value,) = series.window(FIRST + 10 * DAY - 30, 1, 60)
+    assert value == pytest.approx(((10 * DAY - 15) + (3 * DAY + 15)) / 2)
+
+
+def test_spans_shorter_than_a_tick_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        write_series(np.array([FIRST, FIRST]), np.array([1.0, 2.0]), tmp_path / "flat.npy")
+
+    path = tmp_path / "short.csv"
+    path.write_text("timestamp,load_w\n2026-05-01 00:00,500\n2026-05-01 00:30,600\n", encoding="utf-8")
+    assert open_profile(path, str(tmp_path / "cache"), 15).span == 30
+    with pytest.raises(ValueError):
+        open_profile(path, str(tmp_path / "cache"), 60)
@@ -0,0 +1,107 @@
+"""
+Resampling of recorded time series (load profiles, weather replay).
+
+A series is stored as a structured NumPy array in a .npy file: sample time
+(minutes since recorder.EPOCH), value, and the integral of the value since
+the first sample. Files are memory-mapped, so only the pages around the
+simulated window are read.
+
+Samples are treated as a piecewise-linear curve and the value of a tick is
+its exact average over the tick, so series finer than MINUTES_PER_TICK are
+averaged and coarser ones interpolated. Times inside the recorded range
+always use the recording itself. Times after it repeat its last whole weeks
+and times before it its first ones, so weekdays stay aligned (a recording
+shorter than a week repeats as a whole).
+"""
+
+import os
+from pathlib import Path
+
+import numpy as np
+
+from recorder import EPOCH
+
+DTYPE = np.dtype([("minute", "<i8"), ("value", "<f8"), ("integral", "<f8")])
+
+WEEK = 7 * 24 * 60
+
+
+def to_epoch_minutes(stamps):
+    """Timestamp strings (ISO-like, e.g. '2024-01-01 00:00') to minutes since EPOCH."""
+    return (np.array(stamps, dtype="datetime64[m]") - np.datetime64(EPOCH, "m")).astype(np.int64)
+
+
+def write_series(minutes, values, path):
+    """Sorts samples, writes them in the series layout and returns them memory-mapped."""
+    if len(minutes) < 2 or np.min(minutes) == np.max(minutes):
+        raise ValueError("A time series needs at least two samples at different times")
+    order = np.argsort(minutes, kind="stable")
+    minutes, values = np.asarray(minutes)[order], np.asarray(values, dtype=float)[order]
+    data = np.empty(len(minutes), dtype=DTYPE)
+    data["minute"] = minutes
+    data["value"] = values
+    data["integral"][0] = 0.0
+    np.cumsum(np.diff(minutes) * (values[1:] + values[:-1]) / 2, out=data["integral"][1:])
+    tmp = Path(f"{path}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, data)
+    os.replace(tmp, path)
+    return np.load(path, mmap_mode="r")
+
+
+class TimeSeries:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.data = np.load(self.path, mmap_mode="r")
+        if self.data.dtype != DTYPE:
+            raise ValueError(f"{self.path} is not a time series file")
+        self.minutes = self.data["minute"]
+        self.values = self.data["value"]
+        self.integral = self.data["integral"]
+        self.first = int(self.minutes[0])
+        self.span = int(self.minutes[-1]) - self.first
+        if self.span <= 0:
+            raise ValueError(f"{self.path} covers no time (all samples at one timestamp)")
+        # Length of the stretch repeated outside the recorded range.
+        self.period = self.span - self.span % WEEK if self.span >= WEEK else self.span
+
+    def __len__(self):
+        return len(self.minutes)
+
+    def check_tick(self, minutes_per_tick):
+        """Rejects recordings shorter than one tick."""
+        if self.span < minutes_per_tick:
+            raise ValueError(f"{self.path} covers {self.span} min, less than one {minutes_per_tick}-min tick")
+        return self
+
+    def _integral(self, x):
+        """Integral from the first sample to `x` minutes after it (0 <= x <= span)."""
+        t = x + self.first
+        i = np.clip(np.searchsorted(self.minutes, t, side="right") - 1, 0, len(self.minutes) - 2)
+        t0 = self.minutes[i]
+        f0 = self.values[i]
+        fx = f0 + (self.values[i + 1] - f0) * (t - t0) / (self.minutes[i + 1] - t0)
+        return self.integral[i] + (t - t0) * (f0 + fx) / 2
+
+    def _extended(self, x):
+        """
+        Integral from the first sample to `x` (any offset) of the recording
+        extended by repeating its last `period` minutes after it and its
+        first `period` minutes before it.
+        """
+        span, period = self.span, self.period
+        end = self._integral(np.float64(span))
+        tail = end - self._integral(np.float64(span - period))
+        head = self._integral(np.float64(period))
+        after = np.maximum(x - span, 0)
+        q, r = np.divmod(after, period)
+        right = end + q * tail + self._integral(span - period + r) - self._integral(np.float64(span - period))
+        q, r = np.divmod(np.maximum(-x, 0), period)
+        left = -(q * head + head - self._integral(period - r))
+        inside = self._integral(np.clip(x, 0, span))
+        return np.where(x > span, right, np.where(x < 0, left, inside))
+
+    def window(self, start_minute, ticks, minutes_per_tick):
+        """Average value of `ticks` ticks from `start_minute` (minutes since recorder.EPOCH)."""
+        u = np.int64(start_minute) - self.first + np.arange(ticks, dtype=np.int64) * minutes_per_tick
+        return (self._extended(u + minutes_per_tick) - self._extended(u)) / minutes_per_tick
@@ -0,0 +1,145 @@
+"""
+Historical weather replay for the Green Grid Digital Twin.
+
+Feeds Weather and Panel from measured or typical-meteorological-year data
+instead of the daily random draw. The file is a CSV with a header row:
+
+- a timestamp column (`timestamp`, `time` or the first column)
+- `ghi`: global horizontal irradiance in W/m2, and/or
+- `cloud`: cloud coverage, 0.0 to 1.0
+- optionally `site`, for archives holding many sites in one file
+
+With `ghi` the panel produces SOLAR_PEAK * ghi / 1000; with only `cloud` the
+usual sun-angle model uses the replayed coverage, which may now change within
+the day. When only `ghi` is given the logged coverage is derived from it in
+daylight and held through the night.
+
+The file is streamed once and split into one timeseries file per site and
+column, stored under WEATHER_CACHE_DIR (.weather_cache next to the file by
+default) in a folder named after the file's content hash. The hash itself is
+remembered per path, size and modification time, so unchanged archives are
+neither parsed nor re-hashed by later runs.
+"""
+
+import csv
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from timeseries import TimeSeries, to_epoch_minutes, write_series
+
+COLUMNS = ("ghi", "cloud")
+TIME_COLUMNS = ("timestamp", "time", "datetime", "date")
+ALL_SITES = "_"
+BLOCK_ROWS = 65536
+
+# Sun elevation factor (sin) above which the coverage is derived from GHI.
+DAYLIGHT = 0.1
+
+_OPEN = {}
+
+
+def cache_folder(path, cache_dir=""):
+    return Path(cache_dir) if cache_dir else Path(path).resolve().parent / ".weather_cache"
+
+
+def file_hash(path, cache_dir=""):
+    """Content hash of `path`, memoized per path, size and mtime in the cache index."""
+    path = Path(path).resolve()
+    st = path.stat()
+    stamp = f"{path}|{st.st_size}|{st.st_mtime_ns}"
+    folder = cache_folder(path, cache_dir)
+    index_path = folder / "index.json"
+    index = json.loads(index_path.read_text()) if index_path.exists() else {}
+    if stamp not in index:
+        sha = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        index[stamp] = sha.hexdigest()
+        folder.mkdir(parents=True, exist_ok=True)
+        tmp = folder / f"index.json.{os.getpid()}"
+        tmp.write_text(json.dumps(index, indent=1))
+        os.replace(tmp, index_path)
+    return index[stamp]
+
+
+def parse(path, folder):
+    """Streams the CSV into one timeseries file per (site, column) in `folder`."""
+    folder.mkdir(parents=True, exist_ok=True)
+    chunks = {}
+
+    def flush(block):
+        for (site, column), (stamps, values) in block.items():
+            part = chunks.setdefault((site, column), ([], []))
+            part[0].append(to_epoch_minutes(stamps))
+            part[1].append(np.array(values))
+
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = [h.strip().lower() for h in next(reader)]
+        time_col = next((header.index(c) for c in TIME_COLUMNS if c in header), 0)
+        value_cols = [(c, header.index(c)) for c in COLUMNS if c in header]
+        site_col = header.index("site") if "site" in header else None
+        if not value_cols:
+            raise ValueError(f"{path} has neither a 'ghi' nor a 'cloud' column")
+
+        block, rows = {}, 0
+        for row in reader:
+            if not row:
+                continue
+            site = row[site_col].strip() if site_col is not None else ALL_SITES
+            for column, i in value_cols:
+                if row[i].strip():
+                    stamps, values = block.setdefault((site, column), ([], []))
+                    stamps.append(row[time_col].strip())
+                    values.append(float(row[i]))
+            rows += 1
+            if rows % BLOCK_ROWS == 0:
+                flush(block)
+                block = {}
+        flush(block)
+
+    sites = {}
+    for (site, column), (minutes, values) in chunks.items():
+        write_series(np.concatenate(minutes), np.concatenate(values), folder / f"{site}-{column}.npy")
+        sites.setdefault(site, []).append(column)
+    (folder / "sites.json").write_text(json.dumps(sites))
+
+
+class WeatherReplay:
+    def __init__(self, path, site="", cache_dir=""):
+        folder = cache_folder(path, cache_dir) / file_hash(path, cache_dir)
+        if not (folder / "sites.json").exists():
+            parse(path, folder)
+        sites = json.loads((folder / "sites.json").read_text())
+        site = site or ALL_SITES
+        if site not in sites:
+            raise ValueError(f"Site {site!r} not in {path} (sites: {', '.join(sorted(sites))})")
+        self.series = {column: TimeSeries(folder / f"{site}-{column}.npy") for column in sites[site]}
+
+    def window(self, start_minute, ticks, minutes_per_tick):
+        """
+        Cloud coverage and irradiance (W/m2) of `ticks` ticks from
+        `start_minute`; either is None when the file lacks that column.
+        """
+        return tuple(self.series[c].window(start_minute, ticks, minutes_per_tick) if c in self.series else None
+                     for c in ("cloud", "ghi"))
+
+
+def derive_cloud(irradiance, sun):
+    """Cloud coverage implied by GHI against the panel's clear-sky model (daylight only)."""
+    return np.clip(1 - irradiance / (1000 * sun), 0.0, 1.0)
+
+
+def open_replay(path, site="", cache_dir="", minutes_per_tick=1):
+    """Replay for `path`, shared by every run of the process; it must cover at least one tick."""
+    key = (str(Path(path).resolve()), site, cache_dir)
+    if key not in _OPEN:
+        _OPEN[key] = WeatherReplay(path, site, cache_dir)
+    for series in _OPEN[key].series.values():
+        series.check_tick(minutes_per_tick)
+    return _OPEN[key]